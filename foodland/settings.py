@@ -38,12 +38,15 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     'main.apps.MainConfig',
     'django_extensions',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.QueryBudgetMiddleware',
+    'main.middleware.ReplicaStickyMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,17 +78,54 @@ WSGI_APPLICATION = 'foodland.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# The connections are kept open by every worker thread for CONN_MAX_AGE
+# seconds, the values can be set by the environment of the deployment
+# and the main.postgresql backend counts the opened connections
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'foodland_db',
-        'USER': 'postgres',
-        'PASSWORD': 'A13742301374230a',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'ENGINE': 'main.postgresql',
+        'NAME': os.environ.get('DATABASE_NAME', 'foodland_db'),
+        'USER': os.environ.get('DATABASE_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', 'A13742301374230a'),
+        'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+        'PORT': os.environ.get('DATABASE_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            'connect_timeout': int(
+                os.environ.get('DATABASE_CONNECT_TIMEOUT', 5)
+            ),
+        },
     }
 }
 
+# The catalog reads and the reports go to the read replica
+# when its host is set, a client that wrote reads the primary
+# for REPLICA_STICKY_SECONDS, see the main.routers madule
+
+if os.environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=os.environ.get('DATABASE_REPLICA_NAME', DATABASES['default']['NAME']),
+        HOST=os.environ['DATABASE_REPLICA_HOST'],
+        PORT=os.environ.get('DATABASE_REPLICA_PORT', DATABASES['default']['PORT']),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['main.routers.PrimaryReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Probing the kept connections before reusing them,
+# only the connections that were idle for the seconds are probed
+DATABASE_HEALTH_CHECKS = os.environ.get(
+    'DATABASE_HEALTH_CHECKS', 'true'
+).lower() in ('1', 'true', 'yes')
+
+DATABASE_HEALTH_CHECK_IDLE = int(
+    os.environ.get('DATABASE_HEALTH_CHECK_IDLE', 10)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -144,4 +184,47 @@ GRAPH_MODELS = {
 }
 
 # Define the user model that is authenticated in project
-AUTH_USER_MODEL = "main.User"
\ No newline at end of file
+AUTH_USER_MODEL = "main.User"
+
+# The version counters of the cached data, the sessions and the logged in
+# users are shared by every worker, so the cache is a memcached server.
+# CACHE_LOCATION is its address like 127.0.0.1:11211 (several are separated
+# by commas), without it every process has its own local memory cache
+# which is only allowed with DEBUG, see the ready of the main app
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ.get(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.memcached.MemcachedCache'
+            ),
+            'LOCATION': CACHE_LOCATION,
+            'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'foodland'),
+            'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+        }
+    }
+
+# The sessions and the logged in users are read from the cache,
+# the database is only queried when they are missing from it
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['main.accounts.CachedModelBackend']
+
+# Buffering the last logins and writing them together every
+# LAST_LOGIN_FLUSH_INTERVAL seconds, the logins within
+# LAST_LOGIN_GRANULARITY seconds of the stored one are not written
+LAST_LOGIN_BATCHING = os.environ.get(
+    'LAST_LOGIN_BATCHING', 'false'
+).lower() in ('1', 'true', 'yes')
+
+LAST_LOGIN_FLUSH_INTERVAL = int(
+    os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 30)
+)
+
+LAST_LOGIN_GRANULARITY = int(os.environ.get('LAST_LOGIN_GRANULARITY', 60))
+
+# The number of queries that every admin view may run
+# before a warning is logged by the QueryBudgetMiddleware
+QUERY_BUDGET = 20
@@ -0,0 +1,99 @@
+# Create the cached users in this madule
+# the logged in user and the branches of its staff are read from the cache
+# so an authenticated request does not query the users table,
+# the cached user is keyed by its version and the version of the scopes
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from . import models, routers
+from .cache import bump_version, get_version
+
+USER_CACHE_TIMEOUT = getattr(settings, 'USER_CACHE_TIMEOUT', 60 * 60)
+
+
+def user_key(user_id):
+    return "user:{0}:{1}:{2}".format(
+        user_id, get_version('user', user_id), get_version('scopes', 'all')
+    )
+
+
+def resolve_scope(user):
+    """
+    Sets the food collection and the branches that the user manages
+    or works in, the customers and the admins have no scope
+    """
+
+    collection_id, branch_ids = None, ()
+
+    if user.user_type == 2:
+        collection_id = models.FoodCollection.objects.filter(
+            manager=user
+        ).values_list('pk', flat=True).first()
+        if collection_id is not None:
+            branch_ids = tuple(models.Branch.objects.filter(
+                foodCollection=collection_id
+            ).order_by('pk').values_list('pk', flat=True))
+
+    elif user.user_type in (3, 4):
+        field = 'branchManager' if user.user_type == 3 else 'branchCashier'
+        branch = models.Branch.objects.filter(**{field: user}).values_list(
+            'pk', 'foodCollection_id'
+        ).first()
+        if branch is not None:
+            collection_id, branch_ids = branch[1], (branch[0],)
+
+    user.collection_id = collection_id
+    user.branch_ids = branch_ids
+    return user
+
+
+def get_user(user_id):
+    """
+    Returns the user of the primary key with its scope,
+    the user is read from the cache and cached when it is missing
+    """
+
+    key = user_key(user_id)
+    user = cache.get(key)
+
+    if user is None:
+        with routers.primary():
+            user = models.User._default_manager.filter(pk=user_id).first()
+            if user is None:
+                return None
+            resolve_scope(user)
+        cache.set(key, user, timeout=USER_CACHE_TIMEOUT)
+
+    return user
+
+
+def invalidate_users(user_ids):
+    """
+    Bumps the versions of the users
+    after the current transaction is committed
+    """
+
+    user_ids = list(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_version('user', user_id)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_scopes():
+    transaction.on_commit(lambda: bump_version('scopes', 'all'))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    The ModelBackend of Django that reads
+    the user of the session from the cache
+    """
+
+    def get_user(self, user_id):
+        user = get_user(user_id)
+        return user if user and self.user_can_authenticate(user) else None
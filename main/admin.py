@@ -1,14 +1,171 @@
-from django.contrib import admin
-from . import models
+from django.contrib import admin, messages
+from . import (
+    accounts, api, buckets, exports, forms, jalali, menu_import, models,
+    paginators, reservations, sales, scoping
+)
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.admin.options import IncorrectLookupParameters
 from django.contrib.auth.models import Group
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+import jdatetime
+
+# Define the mixin of the big changelists
+# their counts are estimated and the deep pages are seeked
+# on the keyset that must be the unique ordering of the changelist
+
+
+class KeysetPaginationMixin:
+
+    keyset = ('-pk',)
+    paginator = paginators.KeysetPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            keyset=self.keyset
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return paginators.KeysetChangeList
+
+# Define the mixin of the exported changelists
+# the selected rows are streamed to a csv or a json lines file
+
+
+class ExportActionsMixin:
+
+    export_kind = None
+    actions = ('exportCsv', 'exportJsonl')
+
+    def exportCsv(self, request, queryset):
+        return exports.streaming_response(self.export_kind, queryset, 'csv')
+    exportCsv.short_description = "خروجی CSV"
+
+    def exportJsonl(self, request, queryset):
+        return exports.streaming_response(self.export_kind, queryset, 'jsonl')
+    exportJsonl.short_description = "خروجی JSON Lines"
+
+# Define the mixin of the admins of the branch data
+# the staff of a food collection only see and choose
+# the rows of their own branches
+
+
+class BranchScopeMixin:
+
+    def get_queryset(self, request):
+        return scoping.scope(super().get_queryset(request), request.user)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if scoping.is_scoped(db_field.related_model):
+            kwargs['queryset'] = scoping.scope(
+                db_field.related_model._default_manager.all(), request.user
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if scoping.is_scoped(db_field.related_model):
+            kwargs['queryset'] = scoping.scope(
+                db_field.related_model._default_manager.all(), request.user
+            )
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+# Define the mixin of the changelists with a jalali date hierarchy
+# the hierarchy is drilled down by the jalali calendar
+# and its choices are read from the date buckets
+
+
+class JalaliHierarchyMixin:
+
+    def get_changelist(self, request, **kwargs):
+        return buckets.jalali_changelist(
+            super().get_changelist(request, **kwargs)
+        )
+
+# Define the jalali date list filter
+# its years and months are read from the date buckets
+# and they are filtered by the gregorian range of the field
+
+
+class JalaliDateListFilter(admin.FieldListFilter):
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg_year = '%s__jyear' % field_path
+        self.lookup_kwarg_month = '%s__jmonth' % field_path
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+        self.lookup_val_year = self.used_parameters.get(self.lookup_kwarg_year)
+        self.lookup_val_month = self.used_parameters.get(
+            self.lookup_kwarg_month
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg_year, self.lookup_kwarg_month]
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.lookup_val_year is None:
+            return queryset
+
+        try:
+            return queryset.filter(**buckets.range_lookups(
+                self.field, int(self.lookup_val_year),
+                None if self.lookup_val_month is None
+                else int(self.lookup_val_month),
+                field_path=self.field_path
+            ))
+        except ValueError as e:
+            raise IncorrectLookupParameters(e) from e
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val_year is None,
+            'query_string': changelist.get_query_string(
+                remove=self.expected_parameters()
+            ),
+            'display': 'همه',
+        }
+
+        model, name = self.field.model, self.field.name
+        for year, count in reversed(buckets.counts(model, name)):
+            selected = self.lookup_val_year == str(year)
+            yield {
+                'selected': selected and self.lookup_val_month is None,
+                'query_string': changelist.get_query_string(
+                    {self.lookup_kwarg_year: year}, [self.lookup_kwarg_month]
+                ),
+                'display': "{0} ({1})".format(year, count),
+            }
+
+            if not selected:
+                continue
+
+            for month, count in buckets.counts(model, name, year):
+                yield {
+                    'selected': self.lookup_val_month == str(month),
+                    'query_string': changelist.get_query_string({
+                        self.lookup_kwarg_year: year,
+                        self.lookup_kwarg_month: month,
+                    }),
+                    'display': "- {0} ({1})".format(
+                        jdatetime.date.j_months_fa[month - 1], count
+                    ),
+                }
 
 # Register the custom User model
 # it inherit from the internal creation UserAdmin model
 
 
 @admin.register(models.User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(JalaliHierarchyMixin, KeysetPaginationMixin, BaseUserAdmin):
 
     # The fields to be used in displaying the User model.
     # These override the definitions on the base UserAdmin
@@ -18,7 +175,9 @@ class UserAdmin(BaseUserAdmin):
         'dateJoined','user_type', 'is_active'
     )
 
-    list_filter = ('is_active', 'date_joined', 'user_type')
+    list_filter = (
+        'is_active', ('date_joined', JalaliDateListFilter), 'user_type'
+    )
 
     fieldsets = (
         ('اطلاعات کاربری', {'fields': ('username', 'email', 'password')}),
@@ -38,7 +197,9 @@ class UserAdmin(BaseUserAdmin):
     )
 
     search_fields = ('username', 'person__first_name', 'person__last_name')
+    list_select_related = ('person',)
     ordering = ('username', 'date_joined', 'last_login')
+    keyset = ('username',)
     filter_horizontal = ()
     actions = ('activate', 'deactivate')
     date_hierarchy = 'last_login'
@@ -54,24 +215,34 @@ class UserAdmin(BaseUserAdmin):
 
     # Define this method to return the last_login data in a custom form
     def lastLogin(self, obj):
-        return obj.last_login.strftime("%Y/%m/%d - %H:%M:%S")
+        return jalali.format_datetime(obj.last_login)
     lastLogin.short_description = 'آخرین بازدید'
 
     # Define this method to return the date_joied data in a custom form
     def dateJoined(self, obj):
-        return obj.date_joined.strftime("%Y/%m/%d")
+        return jalali.format_date(obj.date_joined)
     dateJoined.short_description = 'تاریخ ثبت نام'
 
+    # the update sends no signals so the cached users are invalidated here,
+    # the versions are bumped after the update is committed
+    def set_active(self, queryset, is_active):
+        with transaction.atomic():
+            user_ids = list(queryset.values_list('pk', flat=True))
+            models.User.objects.filter(pk__in=user_ids).update(
+                is_active=is_active
+            )
+            accounts.invalidate_users(user_ids)
+
     # for set an action to the change list page
     # this action is for activating the user
     def activate(self, request, queryset):
-        queryset.update(is_active=True)
+        self.set_active(queryset, True)
     activate.short_description = "فعال کردن"
 
     # for set an action to the change list page
     # this action is for deactivating the user
     def deactivate(self, request, queryset):
-        queryset.update(is_active=False)
+        self.set_active(queryset, False)
     deactivate.short_description = "غیر فعال کردن"
 
 # Unregister the Group model from admin
@@ -93,6 +264,7 @@ class CustomerAdmin(admin.ModelAdmin):
     )
 
     list_filter = ('user__is_active', 'province__name')
+    list_select_related = ('user',)
     actions = ('activate', 'deactivate')
 
     # this method return the username of related User
@@ -102,29 +274,40 @@ class CustomerAdmin(admin.ModelAdmin):
 
     # Define this method to return the last_login data in a custom form
     def lastLogin(self, obj):
-        return obj.user.last_login.strftime("%Y/%m/%d - %H:%M:%S")
+        return jalali.format_datetime(obj.user.last_login)
     lastLogin.short_description = 'آخرین ورود'
 
     # Define this method to return the date_joied data in a custom form
     def dateJoined(self, obj):
-        return obj.user.date_joined.strftime("%Y/%m/%d")
+        return jalali.format_date(obj.user.date_joined)
     dateJoined.short_description = 'تاریخ ثبت نام'
 
     # return the related province name 
     def related_address(self, obj):
-        return obj.province.name, obj.city.name
+        return obj.province_name, obj.city_name
     related_address.short_description = 'مکان'
 
+    # the related users are updated before their versions are bumped
+    def set_active(self, queryset, is_active):
+        with transaction.atomic():
+            user_ids = list(models.User.objects.filter(
+                customer__in=queryset
+            ).values_list('pk', flat=True))
+            models.User.objects.filter(pk__in=user_ids).update(
+                is_active=is_active
+            )
+            accounts.invalidate_users(user_ids)
+
     # for set an action to the change list page
     # this action is for activating the related user
     def activate(self, request, queryset):
-        queryset.update(user__is_active=True)
+        self.set_active(queryset, True)
     activate.short_description = "فعال کردن"
 
     # for set an action to the change list page
     # this action is for deactivating the related user
     def deactivate(self, request, queryset):
-        queryset.update(user__is_active=False)
+        self.set_active(queryset, False)
     deactivate.short_description = "غیر فعال کردن"
 
 # Register the Person Model there
@@ -155,7 +338,8 @@ class BranchInline(admin.StackedInline):
 class FoodCollectionAdmin(admin.ModelAdmin):
 
     list_display = ('full_name', 'manager', 'guild_id', 'expiration_date')
-    list_filter = ('expiration_date',)
+    list_filter = (('expiration_date', JalaliDateListFilter),)
+    list_select_related = ('manager',)
     search_fields = ('full_name', 'guild_id')
     fields = (
         ('full_name', 'guild_id'),
@@ -174,7 +358,7 @@ class FoodCollectionAdmin(admin.ModelAdmin):
 class CollaborationRequestAdmin(admin.ModelAdmin):
 
     list_display = ('date', 'applicant_name', 'applicant_nationalcode')
-    list_filter = ('date',)
+    list_filter = (('date', JalaliDateListFilter),)
     search_fields = (
         'applicant_firstname', 'aplicant_lastname', 'guild_id'
     )
@@ -199,7 +383,7 @@ class CollaborationRequestAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.Branch)
-class BranchAdmin(admin.ModelAdmin):
+class BranchAdmin(BranchScopeMixin, admin.ModelAdmin):
 
     list_display = (
         'name', 'foodCollection', 'branchManager', 'branchCashier'
@@ -211,11 +395,20 @@ class BranchAdmin(admin.ModelAdmin):
     )
 
     search_fields = ('name', 'foodCollection__full_name')
+    list_select_related = ('foodCollection', 'branchManager', 'branchCashier')
     fieldsets = (
         (None, {'fields':
         ('name', 'foodCollection', 'branchManager', 'branchCashier'),
         }),
     )
+    actions = ('importMenu',)
+
+    # define the importing of a menu file for the selected branches
+    def importMenu(self, request, queryset):
+        url = reverse('admin:main_food_import')
+        branches = ','.join(str(pk) for pk in queryset.values_list('pk', flat=True))
+        return redirect('{0}?branches={1}'.format(url, branches))
+    importMenu.short_description = 'ورود منو از فایل'
 
 # Register the CallContact model
 
@@ -229,6 +422,7 @@ class CallContactAdmin(admin.ModelAdmin):
 
     list_filter = ()
     search_fields = ('branch__name',)
+    list_select_related = ('branch',)
     fields = (
         'branch', ('phoneNumber1', 'phoneNumber2'), 'mobileNumber'
     )
@@ -247,6 +441,7 @@ class LocationAdmin(admin.ModelAdmin):
     search_fields = (
         'branch__name', 'province__name', 'city__name'
     )
+    list_select_related = ('branch',)
 
     fields = (
         'branch', ('province', 'city'), 'address'
@@ -259,12 +454,12 @@ class LocationAdmin(admin.ModelAdmin):
 
     # this method return the name of province
     def showProvince(self, obj):
-        return obj.province.name
+        return obj.province_name
     showProvince.short_description = 'استان مربوطه'
     
     # this method return the name of city
     def showCity(self, obj):
-        return obj.city.name
+        return obj.city_name
     showCity.short_description = 'شهر مربوطه'
 
 
@@ -281,7 +476,7 @@ class CityAdmin(admin.ModelAdmin):
     
     # this method return the name of provinces
     def showProvince(self, obj):
-        return obj.province.name
+        return obj.province_name
     showProvince.short_description = 'استان مربوطه'
 
 # Define the CityInline for inlining to Province
@@ -304,18 +499,33 @@ class ProvinceAdmin(admin.ModelAdmin):
     fields = ('name',)
     inlines = (CityInline,)
 
+# Define the customer list filter
+# the default filter reads the user of every customer separately
+
+
+class CustomerListFilter(admin.RelatedFieldListFilter):
+
+    def field_choices(self, field, request, model_admin):
+        return list(
+            models.Customer.objects.order_by('user__username').values_list(
+                'pk', 'user__username'
+            )
+        )
+
 # Register the Rate model
 
 
 @admin.register(models.Rate)
-class RateAdmin(admin.ModelAdmin):
+class RateAdmin(BranchScopeMixin, ExportActionsMixin, KeysetPaginationMixin,
+                admin.ModelAdmin):
 
     list_display = (
-        '__str__', 'title', 'datetime'
+        '__str__', 'title', 'score', 'datetime'
     )
 
     list_filter = (
-        'title', 'datetime', 'customer',
+        'title', ('datetime', JalaliDateListFilter),
+        ('customer', CustomerListFilter),
         'branch__name'
     )
 
@@ -323,9 +533,15 @@ class RateAdmin(admin.ModelAdmin):
         'title', 'customer__user__username', 'branch__name'
     )
 
+    # the __str__ of Rate reads the username and the branch name
+    list_select_related = ('customer__user', 'branch')
+    ordering = ('-datetime',)
+    keyset = ('-datetime', '-pk')
+    export_kind = 'rates'
+
     fieldsets = (
         (None, {
-            'fields': (('datetime', 'title'), ('text')),
+            'fields': (('datetime', 'title'), ('score', 'text')),
             'classes': ('wide', 'extrapretty'),
             }
         ),
@@ -344,7 +560,7 @@ class RateAdmin(admin.ModelAdmin):
     add_fieldsets = (
         (None, {
             'fields': (
-            ('datetime', 'title'), 'text', ('customer', 'branch')
+            ('datetime', 'title'), ('score', 'text'), ('customer', 'branch')
             ), 
             'classes': ('wide', 'extrapretty'),
             }
@@ -365,7 +581,7 @@ class RateAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.Table)
-class TableAdmin(admin.ModelAdmin):
+class TableAdmin(BranchScopeMixin, admin.ModelAdmin):
 
     list_display = (
         'name', 'capacity', 'state', 'branch'
@@ -373,41 +589,163 @@ class TableAdmin(admin.ModelAdmin):
 
     list_filter = ('capacity', 'state', 'branch')
     search_fields = ('name', 'branch__name')
+    list_select_related = ('branch',)
     fields = ('name', 'capacity', 'state', 'branch')
     actions = ('changeStateToReserved','changeStateToUnreserved')
 
+    # the update sends no saving signal,
+    # so the tables of the changed branches are invalidated here
+    def changeState(self, queryset, state):
+        branch_ids = set(queryset.values_list('branch_id', flat=True))
+        queryset.update(state=state)
+        for branch_id in branch_ids:
+            api.invalidate_tables(branch_id)
+
     # define the state changer to reserved
     def changeStateToReserved(self, request, queryset):
-        queryset.update(state=2)
+        self.changeState(queryset, 2)
     changeStateToReserved.short_description = 'رزرو'
 
     # define the state changer to unreserved
     def changeStateToUnreserved(self, request, queryset):
-        queryset.update(state=1)
+        self.changeState(queryset, 1)
     changeStateToUnreserved.short_description = 'آزاد'
 
+# Register the Reservation model
+# reservations are saved by the reservations madule
+# that locks the row of the reserved table
+
+
+@admin.register(models.Reservation)
+class ReservationAdmin(BranchScopeMixin, admin.ModelAdmin):
+
+    list_display = (
+        'table', 'branch', 'party_size', 'start', 'end', 'state'
+    )
+
+    list_filter = ('state', 'branch')
+    search_fields = ('table__name', 'branch__name', 'customer__user__username')
+    list_select_related = ('table', 'branch')
+    fields = ('table', 'customer', 'party_size', ('start', 'end'), 'state')
+    actions = ('cancel',)
+
+    def save_model(self, request, obj, form, change):
+        reservations.save_reservation(obj)
+
+    # define the canceling of the selected reservations
+    def cancel(self, request, queryset):
+        for reservation in queryset.active():
+            reservations.cancel(reservation)
+    cancel.short_description = 'لغو رزرو'
+
 # Register the Food Model
 
 
 @admin.register(models.Food)
-class FoodAdmin(admin.ModelAdmin):
+class FoodAdmin(BranchScopeMixin, admin.ModelAdmin):
 
     list_display = ('name', 'price', 'branch')
     list_filter = ('branch',)
+    list_select_related = ('branch',)
     search_fields = ('name', 'branch__name')
     fields = ('name', 'price', 'branch')
 
+    def get_urls(self):
+        return [
+            path(
+                'import/', self.admin_site.admin_view(self.import_menu),
+                name='main_food_import'
+            ),
+        ] + super().get_urls()
+
+    # the page of importing the foods from a csv or xlsx file
+    def import_menu(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        errors = []
+        branches = scoping.scope(models.Branch.objects.all(), request.user)
+
+        if request.method == 'POST':
+            form = forms.MenuImportForm(request.POST, request.FILES)
+            form.fields['branches'].queryset = branches
+            if form.is_valid():
+                uploaded = form.cleaned_data['file']
+                branch_ids = [
+                    branch.pk for branch in form.cleaned_data['branches']
+                ]
+                try:
+                    foods = menu_import.import_foods(
+                        menu_import.read_rows(uploaded, uploaded.name),
+                        branch_ids, branches=branches
+                    )
+                except ValidationError as error:
+                    errors = error.messages
+                else:
+                    self.message_user(
+                        request, "{0} غذا ثبت شد".format(len(foods)),
+                        messages.SUCCESS
+                    )
+                    return redirect('admin:main_food_changelist')
+        else:
+            selected = request.GET.get('branches', '')
+            form = forms.MenuImportForm(initial={
+                'branches': [pk for pk in selected.split(',') if pk.isdigit()]
+            })
+            form.fields['branches'].queryset = branches
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta, title='ورود منو از فایل',
+            form=form, errors=errors,
+        )
+        return TemplateResponse(
+            request, 'admin/main/food/import_menu.html', context
+        )
+
 # Register the Order models of customers
 # every customer can order many time from a Branch
 
 
 @admin.register(models.Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(BranchScopeMixin, ExportActionsMixin, KeysetPaginationMixin,
+                 admin.ModelAdmin):
 
     list_display = (
-        'customer', 'branch', 'title', 'datetime', 'table'
+        'customer', 'branch', 'title', 'datetime', 'table', 'total_price'
     )
-    list_filter = ('datetime', 'title')
+    list_filter = (('datetime', JalaliDateListFilter), 'title')
     search_fields = ('customer__user__username', 'branch__name')
-    fields = ('datetime', 'title', 'customer', 'branch', 'foods')
-    readonly_fields = ('datetime',)
\ No newline at end of file
+    list_select_related = ('customer__user', 'branch', 'table')
+    ordering = ('-datetime',)
+    keyset = ('-datetime', '-pk')
+    export_kind = 'orders'
+    fields = (
+        'datetime', 'title', 'customer', 'branch', 'foods', 'total_price'
+    )
+    readonly_fields = ('datetime', 'total_price')
+
+    # the foods are saved after the order row itself
+    # so the stored total is recomputed when the relations are in place
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        sales.refresh_totals(models.Order.objects.filter(pk=form.instance.pk))
+
+# Register the DailySales model
+# the rollups are maintained by the sales madule and only shown there
+
+
+@admin.register(models.DailySales)
+class DailySalesAdmin(BranchScopeMixin, admin.ModelAdmin):
+
+    list_display = ('branch', 'day', 'order_type', 'orders', 'revenue')
+    list_filter = ('year', 'month', 'order_type', 'branch')
+    list_select_related = ('branch',)
+    ordering = ('-day',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
@@ -0,0 +1,69 @@
+# Create the async view helpers in this madule
+# the ORM is synchronous, so the async views run their database work
+# in a bounded pool of threads and the event loop keeps serving clients
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed
+from . import pooling, routers
+
+# every thread of the pool keeps its own database connection,
+# so the size of the pool bounds the connections of an ASGI worker
+DATABASE_THREADS = getattr(settings, 'ASYNC_DATABASE_THREADS', 8)
+
+pool = ThreadPoolExecutor(
+    max_workers=DATABASE_THREADS, thread_name_prefix='foodland-db'
+)
+
+
+def call(func, args, kwargs):
+    """
+    Calls the function in a thread of the pool, the connection
+    of the thread is checked before and the expired one is closed after
+    """
+
+    pooling.checkout()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(func, *args, **kwargs):
+    """
+    Runs the synchronous function in the pool
+    and waits for its result without blocking the event loop,
+    the function sees the context of the request like its router pinning
+    """
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    result = await loop.run_in_executor(
+        pool, functools.partial(context.run, call, func, args, kwargs)
+    )
+
+    # the writes in the pool pin the request to the primary database
+    if context.get(routers.wrote):
+        routers.wrote.set(True)
+        routers.pinned.set(True)
+
+    return result
+
+
+def require_GET(view):
+    """
+    The require_GET of Django for the async views,
+    the wrapper must stay a coroutine function for Django
+    """
+
+    @functools.wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        return await view(request, *args, **kwargs)
+
+    return inner
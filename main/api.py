@@ -0,0 +1,254 @@
+# Create the read only json api in this madule
+# every response is cached under the versions of the data it reads
+# and its strong ETag is made from the same versions,
+# so a repeated request is answered with 304 before touching the database
+
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from . import gazetteer, models, routers
+from .cache import bump_version, get_version
+
+API_CACHE_TIMEOUT = getattr(settings, 'API_CACHE_TIMEOUT', 60 * 60)
+
+PAGE_SIZE = getattr(settings, 'API_PAGE_SIZE', 50)
+
+MAX_PAGE_SIZE = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+
+
+class Field:
+    """
+    A public field of a resource that names the columns it reads,
+    or a prefetch that reads the values of a page in one query
+    """
+
+    def __init__(self, *paths, serialize=None, prefetch=None):
+        self.paths = paths
+        self.prefetch = prefetch
+        self.serialize = serialize or (lambda row: row[paths[0]])
+
+
+class Resource:
+    """
+    The public fields of a model, the selected fields plan
+    the columns, the joins and the prefetches of the query
+    """
+
+    def __init__(self, queryset, fields):
+        self.queryset = queryset
+        self.fields = fields
+
+    def selected(self, value):
+        if not value:
+            return list(self.fields)
+
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValidationError(
+                "فیلدهای نامعتبر: {0}".format(", ".join(unknown)),
+                code="فیلد نامعتبر"
+            )
+        return names
+
+    def serialize(self, queryset, names):
+        """
+        Returns the primary keys and the serialized rows of the queryset
+        """
+
+        fields = [self.fields[name] for name in names]
+        paths = {path for field in fields for path in field.paths}
+        rows = list(queryset.values('pk', *sorted(paths)))
+
+        prefetched = {
+            name: self.fields[name].prefetch([row['pk'] for row in rows])
+            for name in names if self.fields[name].prefetch
+        }
+
+        return [(row['pk'], {
+            name: prefetched[name].get(row['pk'], [])
+            if name in prefetched else self.fields[name].serialize(row)
+            for name in names
+        }) for row in rows]
+
+    def page(self, params, **filters):
+        """
+        Returns a page of the rows after the 'after' primary key,
+        the page is seeked on the primary key so deep pages stay cheap
+        """
+
+        try:
+            limit = min(
+                max(int(params.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE
+            )
+            after = int(params.get('after', 0))
+        except ValueError:
+            raise ValidationError(
+                "مقادیر صفحه بندی نادرست است", code="صفحه نامعتبر"
+            )
+
+        names = self.selected(params.get('fields'))
+        queryset = self.queryset.filter(pk__gt=after, **filters).order_by('pk')
+        rows = self.serialize(queryset[:limit + 1], names)
+
+        return {
+            'results': [item for pk, item in rows[:limit]],
+            'next': rows[limit - 1][0] if len(rows) > limit else None,
+        }
+
+    def get(self, params, pk):
+        """
+        Returns the serialized row of the primary key or None
+        """
+
+        names = self.selected(params.get('fields'))
+        rows = self.serialize(self.queryset.filter(pk=pk), names)
+        return rows[0][1] if rows else None
+
+
+def collection_branches(collection_ids):
+    branches = {}
+    for row in models.Branch.objects.filter(
+        foodCollection__in=collection_ids
+    ).order_by('pk').values('pk', 'name', 'foodCollection_id'):
+        branches.setdefault(row['foodCollection_id'], []).append(
+            {'id': row['pk'], 'name': row['name']}
+        )
+    return branches
+
+
+def branch_contact(row):
+    if row['callcontact__phoneNumber1'] is None:
+        return None
+
+    return {
+        'phone_numbers': [
+            number for number in (
+                row['callcontact__phoneNumber1'],
+                row['callcontact__phoneNumber2'],
+            ) if number
+        ],
+        'mobile_number': row['callcontact__mobileNumber'],
+    }
+
+
+def branch_location(row):
+    if row['location__address'] is None:
+        return None
+
+    names = gazetteer.get()
+    return {
+        'province': names.province_name(row['location__province_id']),
+        'city': names.city_name(row['location__city_id']),
+        'address': row['location__address'],
+    }
+
+
+collections = Resource(models.FoodCollection.objects.all(), {
+    'id': Field('pk'),
+    'name': Field('full_name'),
+    'branches': Field(prefetch=collection_branches),
+})
+
+branches = Resource(models.Branch.objects.all(), {
+    'id': Field('pk'),
+    'name': Field('name'),
+    'collection': Field('foodCollection_id'),
+    'contact': Field(
+        'callcontact__phoneNumber1', 'callcontact__phoneNumber2',
+        'callcontact__mobileNumber', serialize=branch_contact
+    ),
+    'location': Field(
+        'location__province_id', 'location__city_id', 'location__address',
+        serialize=branch_location
+    ),
+})
+
+TABLE_STATES = dict(models.Table.STATE_CHOICES)
+
+tables = Resource(models.Table.objects.all(), {
+    'id': Field('pk'),
+    'name': Field('name'),
+    'capacity': Field('capacity'),
+    'state': Field('state', serialize=lambda row: TABLE_STATES[row['state']]),
+})
+
+
+def make_etag(request, versions):
+    """
+    Returns the ETag of the path, the query and the versions,
+    equal ETags always have equal bodies
+    """
+
+    key = "{0}?{1}|{2}".format(
+        request.path, sorted(request.GET.lists()), versions
+    )
+    return '"{0}"'.format(hashlib.md5(key.encode()).hexdigest())
+
+
+def versioned_response(request, versions, build):
+    """
+    Returns 304 when the ETag of the versions is matched,
+    otherwise the json of build that is cached under the ETag,
+    build returns None for missing objects and raises ValidationError
+    for invalid parameters
+    """
+
+    etag = make_etag(request, versions)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    key = "api:{0}".format(etag.strip('"'))
+    payload = cache.get(key)
+
+    if payload is None:
+        try:
+            with routers.primary():
+                payload = {'data': build()}
+        except ValidationError as e:
+            return JsonResponse({'error': " ".join(e.messages)}, status=400)
+        cache.set(key, payload, timeout=API_CACHE_TIMEOUT)
+
+    if payload['data'] is None:
+        return JsonResponse({'error': "یافت نشد"}, status=404)
+
+    response = JsonResponse(payload['data'], safe=False)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def branch_versions(branch_id):
+    return (get_version('branch', branch_id), get_version('gazetteer', 'all'))
+
+
+def list_versions(name):
+    return (get_version('api', name), get_version('gazetteer', 'all'))
+
+
+def invalidate_branch(branch_id):
+    """
+    Bumps the versions of the branch and the lists
+    after the current transaction is committed
+    """
+
+    def bump():
+        bump_version('branch', branch_id)
+        bump_version('api', 'branches')
+        bump_version('api', 'collections')
+
+    transaction.on_commit(bump)
+
+
+def invalidate_tables(branch_id):
+    transaction.on_commit(lambda: bump_version('branch', branch_id))
+
+
+def invalidate_collections():
+    transaction.on_commit(lambda: bump_version('api', 'collections'))
@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class MainConfig(AppConfig):
     name = 'main'
+
+    # connect the signal receivers of the signals madule
+    # and the last login writer that moves the buckets,
+    # the versioned caches need a cache that is shared by the workers
+    def ready(self):
+        from . import cache, logins, signals
+
+        if not settings.DEBUG and not cache.is_shared():
+            raise ImproperlyConfigured(
+                "The cache must be shared by the workers, set CACHE_LOCATION"
+            )
+
+        logins.install()
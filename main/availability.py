@@ -0,0 +1,115 @@
+# Create the table availability structure in this madule
+# every day is divided into fixed time slots and the reserved slots
+# of a table are kept as a bitmap in the TableAvailability model,
+# so searching the free tables never reads the reservations
+
+import datetime
+from django.db.models import F
+from django.utils import timezone
+from . import models
+from .jalali import as_gregorian
+
+SLOT_MINUTES = 30
+
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+
+def day_masks(start, end):
+    """
+    Returns a dictionary of local day to the bitmap of the slots
+    that have an intersection with [start, end)
+    """
+
+    start = timezone.localtime(as_gregorian(start))
+    end = timezone.localtime(as_gregorian(end))
+
+    masks = {}
+    day = start.date()
+
+    while day <= end.date():
+        first = 0
+        last = SLOTS_PER_DAY
+
+        if day == start.date():
+            first = (start.hour * 60 + start.minute) // SLOT_MINUTES
+
+        if day == end.date():
+            minutes = end.hour * 60 + end.minute + (end.second > 0)
+            last = -(-minutes // SLOT_MINUTES)
+
+        if last > first:
+            masks[day] = ((1 << last) - 1) ^ ((1 << first) - 1)
+
+        day += datetime.timedelta(days=1)
+
+    return masks
+
+
+def mark(reservation):
+    """
+    Sets the slots of a new active reservation in the bitmaps of its table,
+    it is called while the row of the table is locked
+    """
+
+    for day, mask in day_masks(reservation.start, reservation.end).items():
+        updated = models.TableAvailability.objects.filter(
+            table_id=reservation.table_id, day=day
+        ).update(busy=F('busy').bitor(mask))
+
+        if not updated:
+            models.TableAvailability.objects.create(
+                table_id=reservation.table_id,
+                branch_id=reservation.branch_id,
+                day=day, busy=mask
+            )
+
+
+def rebuild(table, days):
+    """
+    Recomputes the bitmaps of the table in the given days
+    from its active reservations, it is called after canceling
+    or moving a reservation while the row of the table is locked
+    """
+
+    for day in days:
+        day_start = timezone.make_aware(
+            datetime.datetime.combine(day, datetime.time())
+        )
+        day_end = day_start + datetime.timedelta(days=1)
+
+        busy = 0
+        intervals = models.Reservation.objects.active().filter(
+            table=table
+        ).overlapping(day_start, day_end).values_list('start', 'end')
+
+        for start, end in intervals:
+            busy |= day_masks(start, end).get(day, 0)
+
+        models.TableAvailability.objects.update_or_create(
+            table_id=table.pk, day=day,
+            defaults={'branch_id': table.branch_id, 'busy': busy}
+        )
+
+
+def free_tables(branch, party_size, start, end):
+    """
+    Returns the tables of the branch that have enough capacity
+    and are free in [start, end), the smallest tables come first
+    """
+
+    masks = day_masks(start, end)
+
+    tables = models.Table.objects.filter(
+        branch=branch, capacity__gte=party_size
+    ).order_by('capacity', 'pk').values('id', 'name', 'capacity')
+
+    busy_tables = set()
+    availabilities = models.TableAvailability.objects.filter(
+        branch=branch, day__in=list(masks)
+    ).values_list('table_id', 'day', 'busy')
+
+    for table_id, day, busy in availabilities:
+        if busy & masks.get(day.togregorian(), 0):
+            busy_tables.add(table_id)
+
+    return [table for table in tables if table['id'] not in busy_tables]
@@ -0,0 +1,208 @@
+# Create the jalali date buckets in this madule
+# the values of the bucket_fields of the models are counted per jalali day
+# so the admin drill-downs and date filters never group the whole table
+
+import functools
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest, TruncDate
+from . import jalali, models
+
+HIERARCHY_PARTS = ('year', 'month', 'day')
+
+
+def label_of(model):
+    return model._meta.label_lower
+
+
+def is_bucketed(field):
+    return field.name in getattr(field.model, 'bucket_fields', ())
+
+
+def apply(model, field, day, count):
+    """
+    Adds the count to the bucket of the day in one UPDATE statement,
+    the bucket is created when it is missing
+    """
+
+    if day is None or not count:
+        return
+
+    rows = models.DateBucket.objects.filter(
+        model=label_of(model), field=field, day=day
+    )
+
+    # the buckets of the lazy fields may be behind until they are rebuilt,
+    # so a removed value never makes a negative count
+    new_count = Greatest(F('count') + count, 0)
+
+    if not rows.update(count=new_count) and count > 0:
+        models.DateBucket.objects.get_or_create(
+            model=label_of(model), field=field, day=day,
+            defaults={'year': day.year, 'month': day.month}
+        )
+        rows.update(count=new_count)
+
+
+def instance_saved(instance, created, update_fields=None):
+    """
+    Moves the saved values from the buckets of their loaded days
+    to the new ones, the fields that were not loaded and the changes
+    of the lazy fields are left to the rebuild command
+    """
+
+    loaded = getattr(instance, '_loaded_buckets', {})
+    lazy = type(instance).lazy_bucket_fields
+
+    for name in type(instance).bucket_fields:
+        if update_fields is not None and name not in update_fields:
+            continue
+        if not created and (name not in loaded or name in lazy):
+            continue
+
+        current = jalali.as_date(instance.__dict__.get(name))
+        previous = None if created else jalali.as_date(loaded[name])
+
+        if current != previous:
+            apply(type(instance), name, previous, -1)
+            apply(type(instance), name, current, 1)
+
+        loaded[name] = instance.__dict__.get(name)
+
+    instance._loaded_buckets = loaded
+
+
+def instance_deleted(instance):
+    loaded = getattr(instance, '_loaded_buckets', {})
+
+    for name in type(instance).bucket_fields:
+        value = loaded[name] if name in loaded else instance.__dict__.get(name)
+        apply(type(instance), name, jalali.as_date(value), -1)
+
+
+def counts(model, field, year=None, month=None):
+    """
+    Returns the (number, count) pairs of the years, the months of the year
+    or the days of the month that have values
+    """
+
+    rows = models.DateBucket.objects.filter(
+        model=label_of(model), field=field, count__gt=0
+    )
+
+    if month is not None:
+        rows = rows.filter(year=year, month=month).order_by('day')
+        return [(day.day, count) for day, count in rows.values_list(
+            'day', 'count'
+        )]
+
+    if year is not None:
+        rows = rows.filter(year=year)
+        part = 'month'
+    else:
+        part = 'year'
+
+    return list(rows.order_by(part).values(part).annotate(
+        total=Sum('count')
+    ).values_list(part, 'total'))
+
+
+def range_lookups(field, year, month=None, day=None, field_path=None):
+    """
+    Returns the lookups of the jalali year, month or day on the field,
+    the datetimes are compared with the gregorian local bounds
+    so the index of the field is used
+    """
+
+    start, end = jalali.bounds(year, month, day)
+
+    if field.get_internal_type() == 'DateTimeField':
+        start, end = jalali.day_start(start), jalali.day_start(end)
+
+    field_path = field_path or field.name
+    return {
+        '%s__gte' % field_path: start,
+        '%s__lt' % field_path: end,
+    }
+
+
+def rebuild(model, fields=None, batch_size=1000):
+    """
+    Recounts the buckets of the fields of the model from its table
+    and returns the number of the written rows
+    """
+
+    objects = []
+
+    for name in fields or model.bucket_fields:
+        rows = model._default_manager.order_by().exclude(**{name: None})
+
+        # the local gregorian date is grouped in the database
+        # and every gregorian date is exactly one jalali day
+        if model._meta.get_field(name).get_internal_type() == 'DateTimeField':
+            rows = rows.annotate(bucket_day=TruncDate(name))
+        else:
+            rows = rows.annotate(bucket_day=F(name))
+
+        for bucket_day, count in rows.values('bucket_day').annotate(
+            total=Count('pk')
+        ).values_list('bucket_day', 'total'):
+            day = jalali.as_date(bucket_day)
+            objects.append(models.DateBucket(
+                model=label_of(model), field=name, day=day,
+                year=day.year, month=day.month, count=count
+            ))
+
+    with transaction.atomic():
+        models.DateBucket.objects.filter(
+            model=label_of(model), field__in=fields or model.bucket_fields
+        ).delete()
+        models.DateBucket.objects.bulk_create(objects, batch_size=batch_size)
+
+    return len(objects)
+
+
+class JalaliHierarchyMixin:
+    """
+    A changelist mixin that filters the date hierarchy
+    by the jalali year, month and day
+    """
+
+    hierarchy_values = (None, None, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+
+        if self.date_hierarchy and params is None:
+            self.hierarchy_values = tuple(
+                lookup_params.pop('%s__%s' % (self.date_hierarchy, part), None)
+                for part in HIERARCHY_PARTS
+            )
+
+        return lookup_params
+
+    def get_filters(self, request):
+        filters = super().get_filters(request)
+        year, month, day = self.hierarchy_values
+
+        if year is not None:
+            try:
+                filters[2].update(range_lookups(
+                    self.model._meta.get_field(self.date_hierarchy),
+                    int(year),
+                    None if month is None else int(month),
+                    None if day is None else int(day),
+                ))
+            except ValueError as e:
+                raise IncorrectLookupParameters(e) from e
+
+        return filters
+
+
+@functools.lru_cache(maxsize=None)
+def jalali_changelist(changelist_class):
+    return type(
+        'Jalali' + changelist_class.__name__,
+        (JalaliHierarchyMixin, changelist_class), {}
+    )
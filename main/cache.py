@@ -0,0 +1,86 @@
+# Create the caching tools in this madule
+# cached data is keyed by a version counter that lives in Django's cache
+# and every write bumps the version instead of deleting the keys
+
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class LocalLRUCache:
+    """
+    A small thread safe in-process cache that evicts
+    the least recently used key when it is full
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def is_shared():
+    """
+    Returns False when the cache lives in the memory of the process,
+    then a bumped version is not seen by the other workers
+    """
+
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def version_key(namespace, key):
+    return "version:{0}:{1}".format(namespace, key)
+
+
+def get_version(namespace, key):
+    """
+    Returns the current version of the key in the namespace,
+    a missing version starts from the current time in milliseconds
+    so an evicted counter never repeats an old version
+    """
+
+    name = version_key(namespace, key)
+    version = cache.get(name)
+
+    if version is None:
+        cache.add(name, int(time.time() * 1000), timeout=None)
+        version = cache.get(name)
+
+    return version
+
+
+def bump_version(namespace, key):
+    """
+    Increments the version of the key in the namespace,
+    so everything cached with the previous version is not read anymore
+    """
+
+    name = version_key(namespace, key)
+
+    try:
+        return cache.incr(name)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(name, version, timeout=None)
+        return version
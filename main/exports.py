@@ -0,0 +1,160 @@
+# Create the streaming exports of orders and rates in this madule
+# the rows are read by a server side cursor in chunks
+# and written one by one, so a year of orders runs in constant memory
+
+import csv
+import itertools
+import json
+from django.conf import settings
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+import jdatetime
+from . import jalali, models, routers
+
+# The number of rows that are fetched from the cursor at once
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+ORDER_TITLES = {
+    'id': "شناسه",
+    'datetime': "زمان سفارش",
+    'type': "نوع",
+    'customer': "مشتری",
+    'branch': "شعبه",
+    'table': "میز",
+    'foods': "تعداد غذا",
+    'total_price': "مبلغ کل(ریال)",
+}
+
+RATE_TITLES = {
+    'id': "شناسه",
+    'datetime': "زمان ثبت",
+    'title': "عنوان",
+    'score': "امتیاز",
+    'customer': "مشتری",
+    'branch': "شعبه",
+    'text': "متن",
+}
+
+
+class Echo:
+    """
+    A file like object that returns the written value
+    instead of keeping it
+    """
+
+    def write(self, value):
+        return value
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def food_counts(order_ids, using=None):
+    """
+    Returns the number of foods of every order in one query
+    """
+
+    return dict(
+        models.Order.foods.through.objects.using(using).filter(
+            order_id__in=order_ids
+        ).order_by().values('order_id').annotate(
+            count=Count('pk')
+        ).values_list('order_id', 'count')
+    )
+
+
+def order_rows(queryset, chunk_size=CHUNK_SIZE):
+    queryset = queryset.select_related(
+        'customer__user', 'branch'
+    ).order_by('pk')
+
+    for chunk in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        counts = food_counts([order.pk for order in chunk], queryset.db)
+        datetimes = jalali.format_datetimes(
+            [order.datetime for order in chunk], separator=" "
+        )
+        for order, order_datetime in zip(chunk, datetimes):
+            yield {
+                'id': order.pk,
+                'datetime': order_datetime,
+                'type': order.get_title_display(),
+                'customer': order.customer.user.username,
+                'branch': order.branch.name,
+                'table': order.table_id,
+                'foods': counts.get(order.pk, 0),
+                'total_price': order.total_price,
+            }
+
+
+def rate_rows(queryset, chunk_size=CHUNK_SIZE):
+    queryset = queryset.select_related(
+        'customer__user', 'branch'
+    ).order_by('pk')
+
+    for chunk in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        datetimes = jalali.format_datetimes(
+            [rate.datetime for rate in chunk], separator=" "
+        )
+        for rate, rate_datetime in zip(chunk, datetimes):
+            yield {
+                'id': rate.pk,
+                'datetime': rate_datetime,
+                'title': rate.title,
+                'score': rate.score,
+                'customer': rate.customer.user.username,
+                'branch': rate.branch.name,
+                'text': rate.text,
+            }
+
+
+def as_csv(rows, titles):
+    writer = csv.writer(Echo())
+
+    # the byte order mark lets the spreadsheets read the persian text
+    yield '\ufeff' + writer.writerow(titles.values())
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def as_jsonl(rows, titles):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+EXPORTS = {
+    'orders': (order_rows, ORDER_TITLES),
+    'rates': (rate_rows, RATE_TITLES),
+}
+
+FORMATS = {
+    'csv': (as_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (as_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def export(kind, queryset, export_format='csv', chunk_size=CHUNK_SIZE):
+    """
+    Returns the lines of the exported rows of the queryset
+    as a generator
+    """
+
+    rows, titles = EXPORTS[kind]
+    write = FORMATS[export_format][0]
+    return write(rows(routers.for_reports(queryset), chunk_size), titles)
+
+
+def streaming_response(kind, queryset, export_format='csv'):
+    response = StreamingHttpResponse(
+        export(kind, queryset, export_format),
+        content_type=FORMATS[export_format][1]
+    )
+    response['Content-Disposition'] = 'attachment; filename="{0}-{1}.{2}"'.format(
+        kind, jdatetime.date.today().strftime('%Y-%m-%d'), export_format
+    )
+    return response
@@ -0,0 +1,33 @@
+from django import forms
+from . import menu_import, models
+
+# Create the forms of the application in this madule
+
+# Define the form for importing the foods from a csv or xlsx file
+
+
+class MenuImportForm(forms.Form):
+
+    file = forms.FileField(
+        label="فایل منو",
+        help_text="ستون های name، price و branch (اختیاری) در فایل {0}".format(
+            "csv یا xlsx" if menu_import.XLSX else "csv"
+        )
+    )
+
+    branches = forms.ModelMultipleChoiceField(
+        queryset=models.Branch.objects.all(), required=False,
+        label="شعب",
+        help_text="غذاهای بدون شعبه برای همه این شعب ثبت می شوند"
+    )
+
+    # the xlsx files are refused before reading when openpyxl is missing
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if menu_import.is_xlsx(file.name) and not menu_import.XLSX:
+            raise forms.ValidationError(
+                "خواندن فایل xlsx روی این سرور ممکن نیست، "
+                "فایل را با قالب csv بارگذاری کنید",
+                code="xlsx پشتیبانی نمی شود"
+            )
+        return file
@@ -0,0 +1,119 @@
+# Create the gazetteer of provinces and cities in this madule
+# provinces and cities are almost static, so every worker keeps
+# an immutable snapshot of them that is loaded on the first use
+# and reloaded when the gazetteer version in the cache is changed
+
+import threading
+import time
+from types import MappingProxyType
+from django.conf import settings
+from django.db import transaction
+from . import models, routers
+from .cache import bump_version, get_version
+
+# the seconds between checking the shared version of the gazetteer
+CHECK_INTERVAL = getattr(settings, 'GAZETTEER_CHECK_INTERVAL', 5)
+
+
+class Gazetteer:
+    """
+    An immutable snapshot of the provinces and their cities
+    """
+
+    def __init__(self, provinces, cities):
+        self.provinces = MappingProxyType(dict(provinces))
+
+        city_names = {}
+        city_provinces = {}
+        province_cities = {}
+
+        for pk, name, province_id in cities:
+            city_names[pk] = name
+            city_provinces[pk] = province_id
+            province_cities.setdefault(province_id, []).append((pk, name))
+
+        self.cities = MappingProxyType(city_names)
+        self.city_provinces = MappingProxyType(city_provinces)
+        self.province_cities = MappingProxyType({
+            province_id: tuple(sorted(items, key=lambda item: item[1]))
+            for province_id, items in province_cities.items()
+        })
+
+    def province_name(self, province_id):
+        return self.provinces.get(province_id)
+
+    def city_name(self, city_id):
+        return self.cities.get(city_id)
+
+    def cities_of(self, province_id):
+        """
+        Returns the (id, name) pairs of the cities of the province
+        """
+
+        return self.province_cities.get(province_id, ())
+
+    @classmethod
+    def from_database(cls):
+        return cls(
+            models.Province.objects.values_list('id', 'name'),
+            models.City.objects.values_list('id', 'name', 'province_id'),
+        )
+
+
+_lock = threading.Lock()
+_snapshot = None
+_version = None
+_checked = 0
+
+
+def load():
+    """
+    Builds a new snapshot from the database and makes it current
+    """
+
+    global _snapshot, _version, _checked
+
+    with _lock:
+        version = get_version('gazetteer', 'all')
+        with routers.primary():
+            _snapshot = Gazetteer.from_database()
+        _version = version
+        _checked = time.monotonic()
+
+    return _snapshot
+
+
+def get():
+    """
+    Returns the current snapshot of the gazetteer, it is loaded
+    by the first call in every worker and not when the application
+    is ready, so the forked workers do not share its connection
+    """
+
+    global _checked
+
+    snapshot = _snapshot
+
+    if snapshot is None:
+        return load()
+
+    if time.monotonic() - _checked > CHECK_INTERVAL:
+        _checked = time.monotonic()
+        if get_version('gazetteer', 'all') != _version:
+            return load()
+
+    return snapshot
+
+
+def invalidate():
+    """
+    Drops the snapshot of this worker and bumps the shared version
+    after the current transaction is committed
+    """
+
+    def reset():
+        global _snapshot
+        bump_version('gazetteer', 'all')
+        _snapshot = None
+
+    transaction.on_commit(reset)
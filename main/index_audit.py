@@ -0,0 +1,469 @@
+# Create the index audit in this madule
+# the queries of the admin changelists and the api endpoints are captured
+# on a seeded database and explained with ANALYZE and BUFFERS,
+# the sequential scans of big tables and the indexes that no plan uses
+# or that are covered by another index are reported with a migration
+
+import json
+import re
+import threading
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.migrations.loader import MigrationLoader
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+from . import models, urls
+
+# the sequential scans that read fewer rows are not reported
+MIN_ROWS = getattr(settings, 'INDEX_AUDIT_MIN_ROWS', 1000)
+
+# the query strings of the endpoints that need parameters
+SAMPLE_QUERIES = {
+    'free_tables': {
+        'start': '2030-01-01T12:00:00+03:30',
+        'end': '2030-01-01T14:00:00+03:30', 'party': 2,
+    },
+    'catalog_search': {'q': 'a'},
+}
+
+INDEXES_SQL = """
+    SELECT t.relname, i.relname, ix.indisunique, ix.indisprimary,
+           ix.indpred IS NOT NULL OR 0 = ANY(ix.indkey::int2[]),
+           ARRAY(
+               SELECT a.attname FROM unnest(ix.indkey::int2[])
+               WITH ORDINALITY AS k(attnum, n)
+               JOIN pg_attribute a
+                 ON a.attrelid = t.oid AND a.attnum = k.attnum
+               ORDER BY k.n
+           ),
+           ARRAY(
+               SELECT o.opcname FROM unnest(ix.indclass::oid[])
+               WITH ORDINALITY AS c(oid, n)
+               JOIN pg_opclass o ON o.oid = c.oid
+               ORDER BY c.n
+           ),
+           pg_relation_size(i.oid), COALESCE(s.idx_scan, 0),
+           pg_get_indexdef(i.oid)
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_class t ON t.oid = ix.indrelid
+    LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.oid
+    WHERE t.relname = ANY(%s)
+    ORDER BY t.relname, i.relname
+"""
+
+# a column of the filter of a scan and its comparison
+FILTER_COLUMN = re.compile(r'"?([a-z_][a-z0-9_]*)"?\s*(=|>=|<=|<|>)\s')
+
+RANGE_OPERATORS = ('>=', '<=', '<', '>')
+
+
+class Index:
+
+    def __init__(self, table, name, unique, primary, partial, columns,
+                 opclasses, size, scans, definition):
+        self.table = table
+        self.name = name
+        self.unique = unique
+        self.primary = primary
+        self.partial = partial
+        self.columns = tuple(columns)
+        self.opclasses = tuple(opclasses)
+        self.size = size
+        self.scans = scans
+        self.definition = definition
+
+    @property
+    def droppable(self):
+        # the unique indexes enforce the constraints
+        return not (self.unique or self.primary)
+
+    def covers(self, other):
+        """
+        Returns True when the index can serve every lookup
+        of the other index, its leading columns are the same.
+        Of two same indexes only the one with the greater name
+        is covered, so one of them is always kept
+        """
+
+        if (
+            self is other or self.partial or other.partial
+            or self.columns[:len(other.columns)] != other.columns
+            or self.opclasses[:len(other.opclasses)] != other.opclasses
+        ):
+            return False
+
+        if len(self.columns) > len(other.columns):
+            return True
+        return other.droppable and (
+            not self.droppable or self.name < other.name
+        )
+
+
+class QueryRecorder:
+    """
+    An execute wrapper that records the distinct statements
+    of every thread, the async views run their queries in the pool
+    """
+
+    def __init__(self):
+        self.active = True
+        self.path = None
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.active and not many and sql.lstrip().upper().startswith('SELECT'):
+            with self._lock:
+                self.queries.setdefault(sql, (params, self.path))
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def app_tables():
+    tables = set()
+    for model in apps.get_app_config('main').get_models(include_auto_created=True):
+        tables.add(model._meta.db_table)
+    return sorted(tables)
+
+
+def endpoint_paths():
+    """
+    Returns the paths and the query strings of the changelists
+    of the registered admins and of the api endpoints,
+    the first rows are the samples of their arguments
+    """
+
+    paths = [
+        (reverse('admin:{0}_{1}_changelist'.format(
+            model._meta.app_label, model._meta.model_name
+        )), {})
+        for model in admin.site._registry
+    ]
+
+    samples = {
+        'branch_id': models.Branch.objects.values_list('pk', flat=True).first(),
+        'collection_id': models.FoodCollection.objects.values_list(
+            'pk', flat=True
+        ).first(),
+    }
+
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+
+        kwargs = {name: samples[name] for name in pattern.pattern.converters}
+        if None not in kwargs.values():
+            paths.append((
+                reverse(pattern.name, kwargs=kwargs),
+                SAMPLE_QUERIES.get(pattern.name, {})
+            ))
+
+    return paths
+
+
+def audit_users(usernames=None):
+    """
+    Returns the users that browse the endpoints, an admin
+    and the staff of the first branch when the usernames are not given
+    """
+
+    if usernames:
+        return list(models.User.objects.filter(username__in=usernames))
+
+    users = list(models.User.objects.filter(
+        is_active=True, user_type=5
+    ).order_by('pk')[:1])
+
+    branch = models.Branch.objects.select_related(
+        'branchManager', 'branchCashier'
+    ).order_by('pk').first()
+    if branch is not None:
+        users += [branch.branchManager, branch.branchCashier]
+
+    return users
+
+
+def capture(users, paths):
+    """
+    Requests the paths as every user and returns
+    the distinct statements with their parameters and paths
+    """
+
+    recorder = QueryRecorder()
+    connection_created.connect(recorder.install)
+    for alias in connections:
+        recorder.install(None, connections[alias])
+
+    try:
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            for user in users:
+                client = Client(HTTP_HOST='localhost')
+                client.force_login(user)
+                for path, query in paths:
+                    recorder.path = "{0} ({1})".format(path, user.username)
+                    client.get(path, query)
+    finally:
+        recorder.active = False
+        connection_created.disconnect(recorder.install)
+
+    return recorder.queries
+
+
+def explain(sql, params, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the executed plan of the statement,
+    it runs in a transaction that is rolled back
+    """
+
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params
+            )
+            plan = cursor.fetchone()[0]
+        transaction.set_rollback(True, using=using)
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from walk(child)
+
+
+def read_indexes(tables, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(INDEXES_SQL, [tables])
+        return [Index(*row) for row in cursor.fetchall()]
+
+
+def table_columns(tables, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        return {
+            table: {
+                column.name for column in
+                connection.introspection.get_table_description(cursor, table)
+            }
+            for table in tables
+        }
+
+
+def suggested_columns(scan, columns):
+    """
+    Returns the columns of an index for the filter of the scan,
+    the equalities come before the ranges
+    """
+
+    equal, ranged = [], []
+    for column, operator in FILTER_COLUMN.findall(scan.get('Filter', '')):
+        if column not in columns:
+            continue
+        target = ranged if operator in RANGE_OPERATORS else equal
+        if column not in equal and column not in ranged:
+            target.append(column)
+    return tuple(equal + ranged)
+
+
+def redundant_indexes(indexes):
+    """
+    Returns the droppable indexes with their covers,
+    the widest cover is chosen that is not covered itself
+    so no cover is dropped
+    """
+
+    covers = sorted(
+        indexes,
+        key=lambda index: (-len(index.columns), index.droppable, index.name)
+    )
+    return [
+        (index, cover) for index in indexes if index.droppable
+        for cover in [next(
+            (other for other in covers
+             if other.table == index.table and other.covers(index)), None
+        )] if cover is not None
+    ]
+
+
+def audit(usernames=None, min_rows=MIN_ROWS, using=DEFAULT_DB_ALIAS):
+    """
+    Captures and explains the queries and returns the report
+    with the sequential scans, the unused and the redundant indexes
+    and the suggested new indexes
+    """
+
+    tables = app_tables()
+    indexes = read_indexes(tables, using)
+    columns = table_columns(tables, using)
+
+    queries = capture(audit_users(usernames), endpoint_paths())
+
+    used = set()
+    scans = []
+    suggested = {}
+
+    for sql, (params, path) in queries.items():
+        plan = explain(sql, params, using)
+        for node in walk(plan):
+            if node.get('Index Name'):
+                used.add(node['Index Name'])
+
+            if node['Node Type'] != 'Seq Scan':
+                continue
+            table = node.get('Relation Name')
+            read = (
+                node.get('Actual Rows', 0)
+                + node.get('Rows Removed by Filter', 0)
+            ) * node.get('Actual Loops', 1)
+            if table not in columns or read < min_rows:
+                continue
+
+            scans.append({
+                'table': table, 'path': path, 'rows': read,
+                'filter': node.get('Filter', ''),
+                'blocks': node.get('Shared Hit Blocks', 0)
+                + node.get('Shared Read Blocks', 0),
+                'sql': sql,
+            })
+
+            wanted = suggested_columns(node, columns[table])
+            if wanted and not any(
+                index.table == table and index.columns[:len(wanted)] == wanted
+                for index in indexes
+            ):
+                suggested[(table, wanted)] = path
+
+    redundant = redundant_indexes(indexes)
+
+    # the covers are kept and the redundant indexes are reported once
+    reported = {
+        name for index, cover in redundant
+        for name in (index.name, cover.name)
+    }
+
+    unused = [
+        index for index in indexes
+        if index.droppable and index.name not in used
+        and index.name not in reported and not index.scans
+    ]
+
+    return {
+        'queries': len(queries),
+        'scans': scans,
+        'redundant': redundant,
+        'unused': unused,
+        'suggested': suggested,
+        'model_changes': model_changes(indexes),
+    }
+
+
+def model_changes(indexes):
+    """
+    Returns the changes of the models that drop the indexes
+    that Django made from Meta.indexes and from the indexed fields
+    by the names of the indexes, the migration state knows these
+    indexes so they are not dropped by raw SQL. The indexes
+    of the many to many tables are not in the state of the models
+    """
+
+    changes = {}
+    for model in apps.get_app_config('main').get_models():
+        table = [
+            index for index in indexes if index.table == model._meta.db_table
+        ]
+
+        for meta_index in model._meta.indexes:
+            changes[meta_index.name] = (
+                "{0}: remove {1} from Meta.indexes".format(
+                    model.__name__, meta_index.name
+                )
+            )
+
+        for field in model._meta.local_fields:
+            if not (field.db_index or field.unique):
+                continue
+
+            # the text fields have a second index for the LIKE lookups
+            names = [
+                index.name for index in table
+                if index.columns == (field.column,) and index.droppable
+            ]
+            change = "set unique=False" if field.unique else "set db_index=False"
+            for name in names:
+                changes[name] = "{0}.{1}: {2}, it drops {3}".format(
+                    model.__name__, field.name, change, ", ".join(names)
+                )
+
+    return changes
+
+
+def dropped_indexes(report, drop_unused=False):
+    indexes = [index for index, cover in report['redundant']]
+    if drop_unused:
+        indexes += report['unused']
+    return indexes
+
+
+def index_name(table, columns):
+    return "{0}_{1}_audit_idx".format(table, "_".join(columns))[:63]
+
+
+def migration(report, drop_unused=False):
+    """
+    Returns the source of a migration that drops the redundant indexes,
+    and the unused ones when asked, and adds the suggested indexes,
+    the indexes of the models are left to their model changes
+    """
+
+    leaves = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes('main')
+
+    operations = []
+    for index in dropped_indexes(report, drop_unused):
+        if index.name in report['model_changes']:
+            continue
+        operations.append(
+            "        migrations.RunSQL(\n"
+            "            {0!r},\n"
+            "            reverse_sql={1!r},\n"
+            "        ),".format(
+                'DROP INDEX IF EXISTS "{0}"'.format(index.name),
+                index.definition
+            )
+        )
+
+    for table, columns in sorted(report['suggested']):
+        name = index_name(table, columns)
+        operations.append(
+            "        migrations.RunSQL(\n"
+            "            {0!r},\n"
+            "            reverse_sql={1!r},\n"
+            "        ),".format(
+                'CREATE INDEX IF NOT EXISTS "{0}" ON "{1}" ({2})'.format(
+                    name, table, ", ".join('"%s"' % c for c in columns)
+                ),
+                'DROP INDEX IF EXISTS "{0}"'.format(name)
+            )
+        )
+
+    return (
+        "from django.db import migrations\n\n\n"
+        "class Migration(migrations.Migration):\n\n"
+        "    dependencies = [\n{0}"
+        "    ]\n\n"
+        "    operations = [\n{1}\n"
+        "    ]\n"
+    ).format(
+        "".join("        ({0!r}, {1!r}),\n".format(*leaf) for leaf in leaves),
+        "\n".join(operations)
+    )
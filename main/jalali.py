@@ -0,0 +1,187 @@
+# Create the jalali date helpers in this madule
+# the jalali fields return jdatetime objects
+# that are converted here for computing and grouping by day
+
+import datetime
+import functools
+import jdatetime
+from django.conf import settings
+from django.utils import timezone
+
+# The number of the days that are kept by every conversion cache,
+# a few years of days are enough for the hot read paths
+CACHE_SIZE = getattr(settings, 'JALALI_CACHE_SIZE', 4096)
+
+DATE_FORMAT = "%Y/%m/%d"
+
+TIME_FORMAT = "%H:%M:%S"
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def jalali_date(day):
+    """
+    Returns the jalali date of the gregorian date
+    """
+
+    return jdatetime.date.fromgregorian(date=day)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def gregorian_date(year, month, day):
+    """
+    Returns the gregorian date of the jalali year, month and day
+    """
+
+    return jdatetime.date(year, month, day).togregorian()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def date_string(year, month, day, date_format=DATE_FORMAT):
+    """
+    Returns the formatted jalali date, strftime of jdatetime
+    is the slowest part of showing a date
+    """
+
+    return jdatetime.date(year, month, day).strftime(date_format)
+
+
+def as_gregorian(value):
+    """
+    Converting the jalali or naive datetimes
+    to an aware gregorian datetime
+    """
+
+    if isinstance(value, jdatetime.datetime):
+        day = gregorian_date(value.year, value.month, value.day)
+        value = datetime.datetime(
+            day.year, day.month, day.day, value.hour, value.minute,
+            value.second, value.microsecond, value.tzinfo
+        )
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+
+    return value
+
+
+def local_date(value):
+    """
+    Returns the jalali date of the datetime in the local time zone
+    """
+
+    return jalali_date(timezone.localtime(as_gregorian(value)).date())
+
+
+def local_datetime(value):
+    """
+    Returns the jalali datetime of the datetime in the local time zone
+    """
+
+    value = timezone.localtime(as_gregorian(value))
+    day = jalali_date(value.date())
+    return jdatetime.datetime(
+        day.year, day.month, day.day, value.hour, value.minute,
+        value.second, value.microsecond, value.tzinfo
+    )
+
+
+def as_date(value):
+    """
+    Returns the jalali date of a date or a datetime,
+    the datetimes are taken in the local time zone
+    """
+
+    if isinstance(value, (jdatetime.datetime, datetime.datetime)):
+        return local_date(value)
+
+    if isinstance(value, datetime.date):
+        return jalali_date(value)
+
+    return value
+
+
+def format_date(value, date_format=DATE_FORMAT):
+    """
+    Returns the formatted jalali date of a date or a datetime
+    """
+
+    if value is None:
+        return None
+
+    value = as_date(value)
+    return date_string(value.year, value.month, value.day, date_format)
+
+
+def format_datetime(value, date_format=DATE_FORMAT, time_format=TIME_FORMAT,
+                    separator=" - "):
+    """
+    Returns the formatted jalali datetime in the local time zone,
+    the time is formatted by the gregorian strftime
+    """
+
+    if value is None:
+        return None
+
+    return format_datetimes(
+        [value], date_format, time_format, separator
+    )[0]
+
+
+def format_datetimes(values, date_format=DATE_FORMAT, time_format=TIME_FORMAT,
+                     separator=" - "):
+    """
+    Returns the formatted jalali datetimes of a list of datetimes,
+    every distinct day is converted and formatted only once
+    """
+
+    zone = timezone.get_current_timezone()
+    values = [
+        None if value is None
+        else timezone.localtime(as_gregorian(value), zone)
+        for value in values
+    ]
+
+    days = {}
+    for value in values:
+        if value is not None and value.date() not in days:
+            day = jalali_date(value.date())
+            days[value.date()] = date_string(
+                day.year, day.month, day.day, date_format
+            )
+
+    return [
+        None if value is None else separator.join((
+            days[value.date()], value.strftime(time_format)
+        ))
+        for value in values
+    ]
+
+
+def bounds(year, month=None, day=None):
+    """
+    Returns the first jalali day of the year, month or day
+    and the first day after it, ValueError is raised for invalid dates
+    """
+
+    start = jdatetime.date(
+        year, 1 if month is None else month, 1 if day is None else day
+    )
+
+    if day is not None:
+        end = start + jdatetime.timedelta(days=1)
+    elif month is not None:
+        end = jdatetime.date(year + month // 12, month % 12 + 1, 1)
+    else:
+        end = jdatetime.date(year + 1, 1, 1)
+
+    return start, end
+
+
+def day_start(day):
+    """
+    Returns the aware datetime of the beginning of the jalali day
+    """
+
+    return timezone.make_aware(
+        datetime.datetime.combine(day.togregorian(), datetime.time())
+    )
@@ -0,0 +1,165 @@
+# Create the batched last login writer in this madule
+# the last logins are buffered in the memory of the process
+# and written together by one UPDATE ... FROM (VALUES ...) statement
+# at a fixed interval and on shutdown, instead of one UPDATE per login
+
+import atexit
+import threading
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.db import connection, transaction
+from django.utils import timezone
+from . import buckets, jalali, models
+
+BATCHING = getattr(settings, 'LAST_LOGIN_BATCHING', False)
+
+# the seconds between the writes of the buffer
+FLUSH_INTERVAL = getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 30)
+
+# a login is not recorded when the stored last login is newer than this
+GRANULARITY = getattr(settings, 'LAST_LOGIN_GRANULARITY', 60)
+
+BATCH_SIZE = getattr(settings, 'LAST_LOGIN_BATCH_SIZE', 500)
+
+_buffer = {}
+_lock = threading.Lock()
+_timer = None
+
+
+def record_login(sender, user, **kwargs):
+    """
+    Buffers the login time of the user, the logins
+    within the granularity of the stored one are dropped
+    """
+
+    now = timezone.now()
+    last_login = user.last_login
+
+    if last_login is not None and (
+        now - jalali.as_gregorian(last_login)
+    ).total_seconds() < GRANULARITY:
+        return
+
+    user.last_login = now
+
+    with _lock:
+        _buffer[user.pk] = now
+        schedule()
+
+
+def schedule():
+    global _timer
+
+    if _timer is None:
+        _timer = threading.Timer(FLUSH_INTERVAL, flush_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def flush_in_background():
+    global _timer
+
+    with _lock:
+        _timer = None
+
+    try:
+        flush()
+    finally:
+        # the timer thread does not serve requests
+        connection.close()
+
+
+def write(rows):
+    """
+    Writes the (user id, datetime) rows in one statement and returns
+    the (old, new) last logins of the updated users, the rows are
+    sorted so concurrent writers lock the users in the same order
+    """
+
+    table = connection.ops.quote_name(models.User._meta.db_table)
+    column = connection.ops.quote_name(
+        models.User._meta.get_field('last_login').column
+    )
+
+    values = ", ".join(["(%s, %s::timestamptz)"] * len(rows))
+    params = [value for row in sorted(rows) for value in row]
+
+    # the joined old row is read from the snapshot of the statement,
+    # so it has the last login before the update
+    sql = (
+        "UPDATE {table} AS u SET {column} = v.last_login "
+        "FROM (VALUES {values}) AS v(id, last_login), {table} AS old "
+        "WHERE u.id = v.id AND old.id = u.id "
+        "AND (u.{column} IS NULL OR u.{column} < v.last_login) "
+        "RETURNING old.{column}, u.{column}"
+    ).format(table=table, column=column, values=values)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def flush():
+    """
+    Writes the buffered last logins and moves their date buckets,
+    returns the number of the updated users
+    """
+
+    with _lock:
+        rows = list(_buffer.items())
+        _buffer.clear()
+
+    updated = 0
+    for start in range(0, len(rows), BATCH_SIZE):
+        with transaction.atomic():
+            moved = write(rows[start:start + BATCH_SIZE])
+            move_buckets(moved)
+
+        updated += len(moved)
+
+    return updated
+
+
+def move_buckets(moved):
+    """
+    Moves the (old, new) last logins between the buckets of their days,
+    the logins of the same day move nothing
+    """
+
+    days = {}
+    for old, new in moved:
+        key = (jalali.as_date(old), jalali.as_date(new))
+        if key[0] != key[1]:
+            days[key] = days.get(key, 0) + 1
+
+    for (old_day, new_day), count in days.items():
+        buckets.apply(models.User, 'last_login', old_day, -count)
+        buckets.apply(models.User, 'last_login', new_day, count)
+
+
+def write_login(sender, user, **kwargs):
+    """
+    Writes the login time of the user at once and moves its bucket
+    when the day of its last login has changed
+    """
+
+    user.last_login = timezone.now()
+
+    with transaction.atomic():
+        move_buckets(write([(user.pk, user.last_login)]))
+
+
+def install():
+    """
+    Replaces the last login receiver of Django with the one
+    that moves the buckets, the logins are buffered when batching
+    """
+
+    user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+
+    if BATCHING:
+        user_logged_in.connect(record_login, dispatch_uid='update_last_login')
+        atexit.register(flush)
+    else:
+        user_logged_in.connect(write_login, dispatch_uid='update_last_login')
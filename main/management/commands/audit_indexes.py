@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand
+from main import index_audit
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Explains the queries of the admin changelists and the api "
+        "on the seeded database and reports the sequential scans, "
+        "the unused and the redundant indexes with a suggested migration"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', dest='usernames', action='append',
+            help="The users that browse the endpoints, an admin "
+                 "and the staff of the first branch when omitted"
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=index_audit.MIN_ROWS,
+            help="The sequential scans that read fewer rows are not reported"
+        )
+        parser.add_argument(
+            '--drop-unused', action='store_true',
+            help="Drops the unused indexes in the migration too"
+        )
+        parser.add_argument(
+            '--output', help="The path of the migration, the stdout when omitted"
+        )
+
+    def handle(self, *args, **options):
+        report = index_audit.audit(options['usernames'], options['min_rows'])
+
+        self.stdout.write("{0} distinct queries are explained".format(
+            report['queries']
+        ))
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Sequential scans:"))
+        for scan in sorted(report['scans'], key=lambda scan: -scan['rows']):
+            self.stdout.write(
+                "  {table}: {rows} rows, {blocks} blocks, {path}\n"
+                "    filter: {filter}".format(**scan)
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Redundant indexes:"))
+        for index, cover in report['redundant']:
+            self.stdout.write("  {0}.{1} {2} is covered by {3} {4}".format(
+                index.table, index.name, index.columns,
+                cover.name, cover.columns
+            ))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            "Unused indexes (no captured plan and no scans in the statistics):"
+        ))
+        for index in report['unused']:
+            self.stdout.write("  {0}.{1} {2}, {3} bytes".format(
+                index.table, index.name, index.columns, index.size
+            ))
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Suggested indexes:"))
+        for (table, columns), path in sorted(report['suggested'].items()):
+            self.stdout.write("  {0} {1} for {2}".format(table, columns, path))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            "Model changes (makemigrations drops these indexes):"
+        ))
+        changes = report['model_changes']
+        dropped = index_audit.dropped_indexes(report, options['drop_unused'])
+        for index in dropped:
+            if index.name in changes:
+                self.stdout.write("  {0}.{1}: {2}".format(
+                    index.table, index.name, changes[index.name]
+                ))
+
+        source = index_audit.migration(report, options['drop_unused'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(source)
+            self.stdout.write("The migration is written to {0}".format(
+                options['output']
+            ))
+        else:
+            self.stdout.write(self.style.MIGRATE_HEADING("Suggested migration:"))
+            self.stdout.write(source)
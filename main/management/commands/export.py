@@ -0,0 +1,64 @@
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+from main import exports, models, sales
+
+MODELS = {
+    'orders': models.Order,
+    'rates': models.Rate,
+}
+
+
+class Command(BaseCommand):
+
+    help = "Streams the orders or the rates of a jalali date range to a file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('start', help="The first jalali day, YYYY-MM-DD")
+        parser.add_argument('end', help="The last jalali day, YYYY-MM-DD")
+        parser.add_argument(
+            '--format', dest='export_format', default='csv',
+            choices=sorted(exports.FORMATS)
+        )
+        parser.add_argument(
+            '--branch', dest='branch_ids', action='append', type=int,
+            help="The branches to export, all of them when omitted"
+        )
+        parser.add_argument(
+            '--output', help="The path of the file, the stdout when omitted"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=exports.CHUNK_SIZE,
+            help="The number of rows that are fetched at once"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = jdatetime.datetime.strptime(options['start'], '%Y-%m-%d').date()
+            end = jdatetime.datetime.strptime(options['end'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("تاریخ ها باید به صورت YYYY-MM-DD وارد شوند")
+
+        if end < start:
+            raise CommandError("تاریخ پایان نباید قبل از تاریخ شروع باشد")
+
+        start_datetime, end_datetime = sales.day_bounds(start, end)
+        queryset = MODELS[options['kind']].objects.filter(
+            datetime__gte=start_datetime, datetime__lt=end_datetime
+        )
+
+        if options['branch_ids']:
+            queryset = queryset.filter(branch__in=options['branch_ids'])
+
+        lines = exports.export(
+            options['kind'], queryset, options['export_format'],
+            chunk_size=options['chunk_size']
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
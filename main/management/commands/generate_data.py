@@ -0,0 +1,75 @@
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from main import synthetic
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Generates a seeded synthetic dataset for the load tests, "
+        "the orders and the rates are loaded by COPY"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help="The seed of the generator, the same seed gives the same data"
+        )
+        parser.add_argument(
+            '--prefix',
+            help="The prefix of the usernames, s<seed>- when omitted"
+        )
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--collections', type=int, default=50)
+        parser.add_argument(
+            '--branches-per-collection', dest='branches', type=int, default=4
+        )
+        parser.add_argument(
+            '--foods-per-branch', dest='foods', type=int, default=30
+        )
+        parser.add_argument(
+            '--tables-per-branch', dest='tables', type=int, default=15
+        )
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--rates', type=int, default=20000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help="The number of the jalali days before today with orders"
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help="The zipf exponent of the popularity of the branches"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=synthetic.CHUNK_SIZE,
+            help="The number of rows of every COPY statement"
+        )
+
+    def handle(self, *args, **options):
+        for name in ('customers', 'collections', 'branches', 'foods', 'days',
+                     'chunk_size'):
+            if options[name] < 1:
+                raise CommandError("{0} باید بزرگتر از صفر باشد".format(name))
+
+        generator = synthetic.Generator(
+            seed=options['seed'], prefix=options['prefix'],
+            customers=options['customers'], collections=options['collections'],
+            branches=options['branches'], foods=options['foods'],
+            tables=options['tables'], orders=options['orders'],
+            rates=options['rates'], days=options['days'],
+            skew=options['skew'], chunk_size=options['chunk_size'],
+            log=self.stdout.write,
+        )
+
+        started = time.monotonic()
+        try:
+            counts = generator.generate()
+        except ValidationError as error:
+            raise CommandError(" ".join(error.messages))
+
+        self.stdout.write(
+            "{customers} customers, {branches} branches, {orders} orders "
+            "and {rates} rates are generated".format(**counts)
+        )
+        self.stdout.write("in {0:.1f} seconds".format(time.monotonic() - started))
@@ -0,0 +1,35 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from main import menu_import
+
+
+class Command(BaseCommand):
+
+    help = "Imports the foods of a csv or xlsx file in one transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The csv or xlsx file")
+        parser.add_argument(
+            '--branch', dest='branch_ids', action='append', type=int,
+            help="The branches of the rows that have no branch column"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="The number of foods that are inserted in every statement"
+        )
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'rb') as file:
+            try:
+                foods = menu_import.import_foods(
+                    menu_import.read_rows(file, options['path']),
+                    options['branch_ids'], batch_size=options['batch_size']
+                )
+            except ValidationError as error:
+                for message in error.messages:
+                    self.stderr.write(message)
+                raise CommandError(
+                    "{0} خطا در فایل وجود دارد".format(len(error.messages))
+                )
+
+        self.stdout.write("{0} foods are imported".format(len(foods)))
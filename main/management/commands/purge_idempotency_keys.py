@@ -0,0 +1,24 @@
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+from main import ordering
+
+
+class Command(BaseCommand):
+
+    help = "Deletes the idempotency keys of the orders older than the days"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help="The keys older than this number of days are deleted"
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("تعداد روزها باید حداقل یک باشد")
+
+        before = jdatetime.datetime.now() - jdatetime.timedelta(
+            days=options['days']
+        )
+        count = ordering.purge_keys(before)
+        self.stdout.write("{0} idempotency keys are deleted".format(count))
@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from main import buckets
+
+
+class Command(BaseCommand):
+
+    help = "Rebuilds the jalali date buckets of the models from their tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help="The models like main.user to rebuild, all of them when omitted"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="The number of buckets that are inserted in every statement"
+        )
+
+    def handle(self, *args, **options):
+        bucketed = [
+            model for model in apps.get_app_config('main').get_models()
+            if getattr(model, 'bucket_fields', ())
+        ]
+
+        if options['models']:
+            labels = {label.lower() for label in options['models']}
+            unknown = labels - {buckets.label_of(model) for model in bucketed}
+            if unknown:
+                raise CommandError(
+                    "Unknown models: {0}".format(", ".join(sorted(unknown)))
+                )
+            bucketed = [
+                model for model in bucketed
+                if buckets.label_of(model) in labels
+            ]
+
+        for model in bucketed:
+            count = buckets.rebuild(model, batch_size=options['batch_size'])
+            self.stdout.write("{0} buckets of {1} are rebuilt".format(
+                count, buckets.label_of(model)
+            ))
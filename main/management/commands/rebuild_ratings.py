@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from main import ratings
+
+
+class Command(BaseCommand):
+
+    help = "Rebuilds the ratings of the branches from the rates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'branch_ids', nargs='*', type=int,
+            help="The branches to rebuild, all of them when omitted"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="The number of ratings that are inserted in every statement"
+        )
+
+    def handle(self, *args, **options):
+        count = ratings.rebuild(
+            options['branch_ids'] or None, batch_size=options['batch_size']
+        )
+        self.stdout.write("{0} branch ratings are rebuilt".format(count))
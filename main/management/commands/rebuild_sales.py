@@ -0,0 +1,36 @@
+import jdatetime
+from django.core.management.base import BaseCommand, CommandError
+from main import sales
+
+
+class Command(BaseCommand):
+
+    help = "Rebuilds the daily sales rollups of a jalali date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', help="The first jalali day, YYYY-MM-DD")
+        parser.add_argument('end', help="The last jalali day, YYYY-MM-DD")
+        parser.add_argument(
+            '--branch', dest='branch_ids', action='append', type=int,
+            help="The branches to rebuild, all of them when omitted"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="The number of rollups that are inserted in every statement"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = jdatetime.datetime.strptime(options['start'], '%Y-%m-%d').date()
+            end = jdatetime.datetime.strptime(options['end'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("تاریخ ها باید به صورت YYYY-MM-DD وارد شوند")
+
+        if end < start:
+            raise CommandError("تاریخ پایان نباید قبل از تاریخ شروع باشد")
+
+        count = sales.rebuild(
+            start, end, branch_ids=options['branch_ids'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write("{0} daily sales rollups are rebuilt".format(count))
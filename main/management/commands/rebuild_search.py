@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main import search
+
+
+class Command(BaseCommand):
+
+    help = "Rebuilds the normalized names and search vectors of the catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="The number of rows that are updated in every statement"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model, field in search.NAME_FIELDS.items():
+            with transaction.atomic():
+                objects = []
+                queryset = model.objects.only('pk', field).order_by('pk')
+
+                for obj in queryset.iterator(chunk_size=batch_size):
+                    objects.append(obj)
+                    if len(objects) >= batch_size:
+                        model.objects.bulk_update(
+                            search.fill_search_names(objects), ['search_name']
+                        )
+                        objects = []
+
+                model.objects.bulk_update(
+                    search.fill_search_names(objects), ['search_name']
+                )
+                count = search.refresh_vectors(model.objects.all())
+
+            self.stdout.write(
+                "{0}: {1}".format(model._meta.verbose_name_plural, count)
+            )
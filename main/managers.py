@@ -3,6 +3,10 @@
 # create the objects from models
 
 from django.contrib.auth.models import BaseUserManager
+from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django_jalali.db import models as jmodels
 import unicodedata
 from django.utils.encoding import force_text
 
@@ -31,7 +35,7 @@ class UserManager(BaseUserManager):
             user_type=user_type
         )
 
-        if user_type is 1:
+        if user_type == 1:
             user.person == None
 
         user.set_password(password)
@@ -56,4 +60,76 @@ class UserManager(BaseUserManager):
 
         user.save(using=self._db)
 
-        return user
\ No newline at end of file
+        return user
+
+# Create the QuerySet for Order model
+# it computes the orders totals inside the database
+class OrderQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotating every order with the sum of its foods prices
+        that is computed by the database as `computed_total`
+        """
+
+        return self.annotate(
+            computed_total=Coalesce(Sum('foods__price'), 0)
+        )
+
+    def totals(self):
+        """
+        Returns a dictionary of order id to the sum of its foods prices,
+        all of the orders are aggregated in one SQL statement
+        """
+
+        return dict(
+            self.order_by().values('pk').annotate(
+                computed_total=Coalesce(Sum('foods__price'), 0)
+            ).values_list('pk', 'computed_total')
+        )
+
+    def refresh_totals(self):
+        """
+        Recomputes the stored total_price of the orders from their foods
+        in one UPDATE statement and returns the number of updated rows
+        """
+
+        through = self.model.foods.through
+        foods_total = through.objects.filter(
+            order=OuterRef('pk')
+        ).order_by().values('order').annotate(
+            total=Sum('food__price')
+        ).values('total')
+
+        return self.update(
+            total_price=Coalesce(
+                Subquery(foods_total, output_field=models.PositiveIntegerField()), 0
+            )
+        )
+
+# Create the Manager for Order model
+class OrderManager(jmodels.jManager.from_queryset(OrderQuerySet)):
+    pass
+
+# Create the QuerySet for Reservation model
+class ReservationQuerySet(models.QuerySet):
+
+    def active(self):
+        """
+        Returns the reservations that are not canceled
+        """
+
+        return self.filter(state=1)
+
+    def overlapping(self, start, end):
+        """
+        Returns the reservations that have an intersection
+        with the half open interval [start, end)
+        """
+
+        return self.filter(start__lt=end, end__gt=start)
+
+# Create the Manager for Reservation model
+class ReservationManager(jmodels.jManager.from_queryset(ReservationQuerySet)):
+    pass
+
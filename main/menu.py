@@ -0,0 +1,72 @@
+# Create the cached menu read path in this madule
+# the menu of every branch is cached under the version of the branch
+# in a local LRU tier and in Django's cache framework
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from . import models, routers
+from .cache import LocalLRUCache, bump_version, get_version
+
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60 * 24)
+
+local_menus = LocalLRUCache(
+    maxsize=getattr(settings, 'MENU_LOCAL_CACHE_SIZE', 512)
+)
+
+
+def serialize_food(food):
+    return {'id': food['id'], 'name': food['name'], 'price': food['price']}
+
+
+def load_menu(branch_id):
+    """
+    Reads the foods of the branch from the database,
+    returns None when the branch does not exist
+    """
+
+    foods = models.Food.objects.filter(branch_id=branch_id).order_by(
+        'name', 'pk'
+    ).values('id', 'name', 'price')
+
+    foods = tuple(serialize_food(food) for food in foods)
+
+    if not foods and not models.Branch.objects.filter(pk=branch_id).exists():
+        return None
+
+    return foods
+
+
+def get_menu(branch_id):
+    """
+    Returns the serialized foods of the branch as a tuple of dictionaries
+    or None when the branch does not exist,
+    the returned value is shared between requests and must not be changed
+    """
+
+    version = get_version('menu', branch_id)
+    key = (branch_id, version)
+
+    entry = local_menus.get(key)
+    if entry is not None:
+        return entry['foods']
+
+    shared_key = "menu:{0}:{1}".format(branch_id, version)
+    entry = cache.get(shared_key)
+
+    if entry is None:
+        with routers.primary():
+            entry = {'foods': load_menu(branch_id)}
+        cache.set(shared_key, entry, timeout=MENU_CACHE_TIMEOUT)
+
+    local_menus.set(key, entry)
+    return entry['foods']
+
+
+def invalidate(branch_id):
+    """
+    Bumps the menu version of the branch after the current transaction
+    is committed, so the old menu is never cached under the new version
+    """
+
+    transaction.on_commit(lambda: bump_version('menu', branch_id))
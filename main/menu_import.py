@@ -0,0 +1,172 @@
+# Create the bulk menu import in this madule
+# the whole file is validated in one pass and all of the errors
+# are reported together, then the foods are written by bulk_create
+# in batches inside a single transaction
+
+import csv
+import importlib.util
+import io
+import os
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from . import menu, models, search
+
+COLUMNS = ('name', 'price', 'branch')
+
+# the xlsx files are read by openpyxl of the requirements
+XLSX = importlib.util.find_spec('openpyxl') is not None
+
+
+# the key of the values after the last column of the header
+EXTRA_COLUMNS = '_extra'
+
+
+def read_csv(file):
+    """
+    Yields the rows of the csv file, a value that is missing
+    in a short row is None and the values of a long row
+    are the list of EXTRA_COLUMNS
+    """
+
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        for row in csv.DictReader(text, restkey=EXTRA_COLUMNS):
+            yield {
+                key if key == EXTRA_COLUMNS else key.strip().lower(): value
+                for key, value in row.items() if key
+            }
+    except UnicodeDecodeError:
+        raise ValidationError(
+            "فایل csv باید با کدگذاری UTF-8 ذخیره شده باشد",
+            code="کدگذاری نادرست"
+        )
+    except csv.Error as error:
+        raise ValidationError(
+            "فایل csv خوانده نشد: {0}".format(error), code="فایل نادرست"
+        )
+    finally:
+        text.detach()
+
+
+def read_xlsx(file):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValidationError(
+            "برای خواندن فایل xlsx بسته openpyxl باید نصب باشد",
+            code="openpyxl نصب نشده"
+        )
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+
+    for row in rows:
+        yield {
+            key: '' if value is None else str(value)
+            for key, value in zip(header, row) if key
+        }
+
+
+def is_xlsx(filename):
+    return os.path.splitext(filename)[1].lower() == '.xlsx'
+
+
+def read_rows(file, filename):
+    """
+    Returns the rows of the uploaded csv or xlsx file as dictionaries
+    """
+
+    if is_xlsx(filename):
+        return read_xlsx(file)
+    return read_csv(file)
+
+
+def validate(rows, branch_ids=None, branches=None):
+    """
+    Validates all of the rows and returns the unsaved foods,
+    raises one ValidationError that has the errors of every line.
+    The foods of a row without branch are made for every branch
+    of branch_ids, and the rows may only name the branches
+    of the branches queryset when it is given
+    """
+
+    name_field = models.Food._meta.get_field('name')
+    price_field = models.Food._meta.get_field('price')
+
+    errors = []
+    parsed = []
+
+    # the header is the first line of the file
+    for line, row in enumerate(rows, start=2):
+        if EXTRA_COLUMNS in row or None in row.values():
+            errors.append(
+                "سطر {0}: تعداد ستون ها با سرستون برابر نیست".format(line)
+            )
+            continue
+
+        try:
+            name = name_field.clean((row.get('name') or '').strip(), None)
+            price = price_field.clean((row.get('price') or '').strip(), None)
+            branch = (row.get('branch') or '').strip()
+            row_branches = [int(branch)] if branch else list(branch_ids or ())
+        except ValidationError as error:
+            errors.extend(
+                "سطر {0}: {1}".format(line, message)
+                for message in error.messages
+            )
+            continue
+        except ValueError:
+            errors.append("سطر {0}: شناسه شعبه نادرست است".format(line))
+            continue
+
+        if not row_branches:
+            errors.append("سطر {0}: شعبه مشخص نشده است".format(line))
+            continue
+
+        parsed.append((line, name, price, row_branches))
+
+    referenced = {
+        branch for _, _, _, row_branches in parsed for branch in row_branches
+    }
+    if branches is None:
+        branches = models.Branch.objects.all()
+    existing = set(
+        branches.filter(pk__in=referenced).values_list('pk', flat=True)
+    )
+
+    foods = []
+    for line, name, price, row_branches in parsed:
+        for branch in row_branches:
+            if branch not in existing:
+                errors.append(
+                    "سطر {0}: شعبه {1} وجود ندارد".format(line, branch)
+                )
+                continue
+            foods.append(models.Food(name=name, price=price, branch_id=branch))
+
+    if errors:
+        raise ValidationError(errors)
+
+    return foods
+
+
+def import_foods(rows, branch_ids=None, batch_size=500, branches=None):
+    """
+    Validates and inserts the foods of the rows and returns them,
+    nothing is inserted when any row is invalid
+    """
+
+    foods = search.fill_search_names(validate(rows, branch_ids, branches))
+
+    with transaction.atomic():
+        created = models.Food.objects.bulk_create(foods, batch_size=batch_size)
+
+        # bulk_create does not send the saving signals
+        search.refresh_vectors(
+            models.Food.objects.filter(pk__in=[food.pk for food in created])
+        )
+        for branch_id in {food.branch_id for food in created}:
+            menu.invalidate(branch_id)
+
+    return created
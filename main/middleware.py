@@ -0,0 +1,109 @@
+# Create the middlewares of the application in this madule
+
+import asyncio
+import logging
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.admin import AdminSite, ModelAdmin
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+# the number of queries that every admin view may run
+DEFAULT_QUERY_BUDGET = getattr(settings, 'QUERY_BUDGET', 20)
+
+
+def query_budget_of(view_func):
+    """
+    Returns the query budget of the view, a view function can define
+    a query_budget attribute and the admin views use the query_budget
+    of their ModelAdmin, the other views have no budget
+    """
+
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is not None:
+        return budget
+
+    # the admin views are wrapped several times around
+    # the bound methods of their ModelAdmin or AdminSite
+    while view_func is not None:
+        owner = getattr(
+            view_func, 'model_admin', getattr(view_func, '__self__', None)
+        )
+        if isinstance(owner, (ModelAdmin, AdminSite)):
+            return getattr(owner, 'query_budget', DEFAULT_QUERY_BUDGET)
+        view_func = getattr(view_func, '__wrapped__', None)
+
+    return None
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """
+    Counts the queries of every request and logs a warning
+    when a view runs more queries than its budget
+    """
+
+    def __call__(self, request):
+        # under ASGI the requests are passed through by the mixin,
+        # their queries run in other threads and are not counted
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        counter = QueryCounter()
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                "%s %s ran %d queries, the budget is %d",
+                request.method, request.path, counter.count, budget
+            )
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = query_budget_of(view_func)
+
+
+class ReplicaStickyMiddleware(MiddlewareMixin):
+    """
+    Pins the requests of a client to the primary database
+    for a few seconds after it has written, so it reads its own writes
+    while the replica is catching up
+    """
+
+    def process_request(self, request):
+        # the threads of the workers are reused by the next requests
+        routers.pinned.set(False)
+        routers.wrote.set(False)
+
+        try:
+            until = float(request.COOKIES[routers.STICKY_COOKIE])
+        except (KeyError, ValueError):
+            return
+        routers.pin(until)
+
+    def process_response(self, request, response):
+        if routers.wrote.get():
+            response.set_cookie(
+                routers.STICKY_COOKIE, str(time.time() + routers.STICKY_SECONDS),
+                max_age=routers.STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
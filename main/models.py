@@ -1,22 +1,64 @@
 from unicodedata import name
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import (
     AbstractBaseUser, PermissionsMixin
 )
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db.models.fields.related_descriptors import ForwardOneToOneDescriptor
 from django_jalali.db import models as jmodels
 import jdatetime
-from . import managers
+from . import gazetteer, jalali, managers
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+from django.core.exceptions import ValidationError
 
 # Create your models here.
 
+# Define the mixin of the models that have bucketed dates
+# the loaded values of the bucket_fields are kept
+# so the date buckets are moved after changing them
+
+
+class DateBucketsMixin:
+
+    bucket_fields = ()
+
+    # the buckets of these fields are only counted on creating
+    # and deleting, their changes are left to the rebuild_buckets command
+    lazy_bucket_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_buckets = {
+            name: instance.__dict__[name]
+            for name in cls.bucket_fields if name in instance.__dict__
+        }
+        return instance
+
+# Create the mixin of the models that assign the staff to the branches
+# the loaded values of the scope_fields are kept on the instance
+# so the cached scopes of the users are invalidated after changing them
+
+
+class StaffScopeMixin:
+
+    scope_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_scope = tuple(
+            instance.__dict__.get(name) for name in cls.scope_fields
+        )
+        return instance
+
 # Create custom User model for this application
 # this user model inheritence from AbstractBaseUser model
 # that have their abstract behavior and attributes
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(DateBucketsMixin, AbstractBaseUser, PermissionsMixin):
 
     username = models.CharField(
         db_index=True, max_length=100, null=False, blank=False,
@@ -57,15 +99,21 @@ class User(AbstractBaseUser, PermissionsMixin):
     objects = jmodels.jManager()
 
     date_joined = jmodels.jDateField(
-        default=jdatetime.date.today, editable=False,
+        db_index=True, default=jdatetime.date.today, editable=False,
         null=False, blank=True, verbose_name="تاریخ ثبت"
     )
 
     last_login = jmodels.jDateTimeField(
-        default=jdatetime.datetime.now,
+        db_index=True, default=jdatetime.datetime.now,
         null=False, blank=True, verbose_name="اخرین ورود"
     )
 
+    bucket_fields = ('date_joined', 'last_login')
+
+    # every login changes the last_login, so its bucket is not moved
+    # by saving the user but by the logins madule, once per changed day
+    lazy_bucket_fields = ('last_login',)
+
     USERNAME_FIELD = "username"
 
     Email_Field = "email"
@@ -76,11 +124,37 @@ class User(AbstractBaseUser, PermissionsMixin):
     # that is in the managers majule
     objects = managers.UserManager()
 
+    # the admin permissions of the staff of the food collections,
+    # their rows are limited to their own branches by the scoping madule
+    STAFF_PERMISSIONS = {
+        2: frozenset({
+            'main.view_branch', 'main.view_dailysales', 'main.view_order',
+            'main.view_rate', 'main.view_reservation',
+            'main.add_food', 'main.change_food', 'main.delete_food',
+            'main.view_food', 'main.add_table', 'main.change_table',
+            'main.delete_table', 'main.view_table',
+        }),
+        3: frozenset({
+            'main.view_branch', 'main.view_dailysales', 'main.view_order',
+            'main.view_rate', 'main.add_reservation',
+            'main.change_reservation', 'main.view_reservation',
+            'main.add_food', 'main.change_food', 'main.delete_food',
+            'main.view_food', 'main.add_table', 'main.change_table',
+            'main.delete_table', 'main.view_table',
+        }),
+        4: frozenset({
+            'main.view_branch', 'main.add_order', 'main.change_order',
+            'main.view_order', 'main.add_reservation',
+            'main.change_reservation', 'main.view_reservation',
+            'main.view_food', 'main.change_table', 'main.view_table',
+        }),
+    }
+
     # Is the user a member of staff?
-    # Simplest possible answer: All admins are staff
+    # The admins and the staff of the food collections are
     @property
     def is_staff(self):
-        return self.is_superuser
+        return self.is_superuser or self.user_type in self.STAFF_PERMISSIONS
 
     def get_full_name(self):
         return self.username
@@ -89,11 +163,22 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
     def has_perm(self, perm, obj=None):
-        if self.user_type is 5:
+        if self.user_type == 5:
+            return True
+        return self.is_active and perm in self.STAFF_PERMISSIONS.get(
+            self.user_type, ()
+        )
+
+    def has_module_perms(self, app_label):
+        if self.user_type == 5:
             return True
+        return self.is_active and any(
+            perm.startswith(app_label + '.')
+            for perm in self.STAFF_PERMISSIONS.get(self.user_type, ())
+        )
 
     def has_madule_perms(self, app_label):
-        if self.user_type is 5:
+        if self.user_type == 5:
             return True
 
     def __str__(self):
@@ -139,6 +224,15 @@ class Customer(models.Model):
         verbose_name="شهر محل سکونت"
     )
 
+    # the names are read from the gazetteer without any query
+    @property
+    def province_name(self):
+        return gazetteer.get().province_name(self.province_id)
+
+    @property
+    def city_name(self):
+        return gazetteer.get().city_name(self.city_id)
+
     def __str__(self):
         return self.user.username
 
@@ -199,7 +293,7 @@ class Person(models.Model):
 # Food Collections serve to customers
 
 
-class FoodCollection(models.Model):
+class FoodCollection(DateBucketsMixin, StaffScopeMixin, models.Model):
 
     full_name = models.CharField(
         db_index=True, max_length=100, null=False, blank=False,
@@ -234,6 +328,19 @@ class FoodCollection(models.Model):
         verbose_name="مدیر مجموعه"
     )
 
+    # the normalized name and its search vector
+    # that are filled by the signals madule
+    search_name = models.CharField(
+        max_length=100, null=False, blank=True, default="",
+        editable=False, verbose_name="نام نرمال شده"
+    )
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    bucket_fields = ('expiration_date',)
+
+    scope_fields = ('manager_id',)
+
     def __str__(self):
         return self.full_name
 
@@ -243,14 +350,23 @@ class FoodCollection(models.Model):
 
         verbose_name_plural = "مجموعه های غذایی"
 
+        indexes = [
+            GinIndex(
+                fields=["search_vector"],
+                name="foodcollection_search_idx"
+            ),
+        ]
+
 # Create the Collaboration Requests model
 # this model is records from every request
 
 
-class CollaborationRequest(models.Model):
+class CollaborationRequest(DateBucketsMixin, models.Model):
 
     objects = jmodels.jManager()
 
+    bucket_fields = ('date',)
+
     date = jmodels.jDateField(
         default=jdatetime.date.today, editable=False,
         null=False, blank=True,
@@ -324,7 +440,9 @@ class CollaborationRequest(models.Model):
 # has one or more brnches
 
 
-class Branch(models.Model):
+class Branch(StaffScopeMixin, models.Model):
+
+    scope_fields = ('foodCollection_id', 'branchManager_id', 'branchCashier_id')
 
     name = models.CharField(
         db_index=True, max_length=100, null=False, blank=False,
@@ -346,6 +464,15 @@ class Branch(models.Model):
         related_name="cashier", verbose_name="صندوقدار شعبه"
     )
 
+    # the normalized name and its search vector
+    # that are filled by the signals madule
+    search_name = models.CharField(
+        max_length=100, null=False, blank=True, default="",
+        editable=False, verbose_name="نام نرمال شده"
+    )
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
     def __str__(self):
         return self.name
 
@@ -355,6 +482,10 @@ class Branch(models.Model):
 
         verbose_name_plural = "شعب"
 
+        indexes = [
+            GinIndex(fields=["search_vector"], name="branch_search_idx"),
+        ]
+
 # Create the Call Contact model
 # Call Contact is for record the contacts from every branch
 
@@ -439,6 +570,15 @@ class Location(models.Model):
         verbose_name="آدرس"
     )
 
+    # the names are read from the gazetteer without any query
+    @property
+    def province_name(self):
+        return gazetteer.get().province_name(self.province_id)
+
+    @property
+    def city_name(self):
+        return gazetteer.get().city_name(self.city_id)
+
     def __str__(self):
         return self.branch.name
 
@@ -485,6 +625,11 @@ class City(models.Model):
         verbose_name="استان مربوطه"
     )
 
+    # the name is read from the gazetteer without any query
+    @property
+    def province_name(self):
+        return gazetteer.get().province_name(self.province_id)
+
     def __str__(self):
         return self.name
 
@@ -499,10 +644,12 @@ class City(models.Model):
 # Create the Rate model 
 # every Branch of Food Collection has rates that customers do them
 
-class Rate(models.Model):
+class Rate(DateBucketsMixin, models.Model):
 
     objects = jmodels.jManager()
 
+    bucket_fields = ('datetime',)
+
     datetime = jmodels.jDateTimeField(
         default=jdatetime.datetime.now, null=False, blank=True,
         editable=False, verbose_name="زمان ثبت"
@@ -524,12 +671,38 @@ class Rate(models.Model):
         verbose_name="کاربر نظر دهنده"
     )
 
+    # the composite branch index of the meta serves its lookups
     branch = models.ForeignKey(
-        "Branch", on_delete=models.CASCADE,
+        "Branch", on_delete=models.CASCADE, db_index=False,
         null=False, blank=True,
         verbose_name="مجموعه غذایی مورد نظر"
     )
 
+    score = models.PositiveSmallIntegerField(
+        validators=[
+            MinValueValidator(limit_value=1),
+            MaxValueValidator(limit_value=5),
+        ],
+        null=True, blank=False,
+        verbose_name="امتیاز"
+    )
+
+    # keeping the loaded branch and score
+    # so the rating of the branch is corrected after changing them
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the deferred ones are read by the signals before an update
+        if 'branch_id' in instance.__dict__ and 'score' in instance.__dict__:
+            instance._loaded_rating = (instance.branch_id, instance.score)
+        return instance
+
+    # the rating of the branch is updated by the signals
+    # in the same transaction of saving the rate
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return "{0} -> {1}".format(
             self.customer.user.username, self.branch.name
@@ -541,6 +714,80 @@ class Rate(models.Model):
 
         verbose_name_plural = "نظرات"
 
+        indexes = [
+            # the keyset of the paginated rate lists
+            models.Index(
+                fields=["datetime", "id"], name="rate_datetime_id_idx"
+            ),
+            # the rates of a branch are a range of this index
+            models.Index(
+                fields=["branch", "datetime", "id"],
+                name="rate_branch_datetime_idx"
+            ),
+        ]
+
+# Create the Branch Rating model
+# every row is the aggregate of the scores of a branch
+# that is maintained by the ratings madule
+
+
+class BranchRating(models.Model):
+
+    branch = models.OneToOneField(
+        "Branch", on_delete=models.CASCADE, primary_key=True,
+        related_name="rating", verbose_name="شعبه"
+    )
+
+    count = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="تعداد امتیازها"
+    )
+
+    total = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="مجموع امتیازها"
+    )
+
+    mean = models.FloatField(
+        db_index=True, default=0, null=False, blank=True,
+        verbose_name="میانگین امتیاز"
+    )
+
+    stars_1 = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="۱ ستاره"
+    )
+
+    stars_2 = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="۲ ستاره"
+    )
+
+    stars_3 = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="۳ ستاره"
+    )
+
+    stars_4 = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="۴ ستاره"
+    )
+
+    stars_5 = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="۵ ستاره"
+    )
+
+    # the number of every score from 1 to 5
+    @property
+    def histogram(self):
+        return (
+            self.stars_1, self.stars_2, self.stars_3,
+            self.stars_4, self.stars_5
+        )
+
+    def __str__(self):
+        return "{0} -> {1:.2f}".format(self.branch_id, self.mean)
+
+    class Meta:
+
+        verbose_name = "امتیاز شعبه"
+
+        verbose_name_plural = "امتیاز شعب"
+
 # Create the Food model
 
 
@@ -567,6 +814,25 @@ class Food(models.Model):
         verbose_name="مجموعه غذایی"
     )
 
+    # the normalized name and its search vector
+    # that are filled by the signals madule
+    search_name = models.CharField(
+        max_length=100, null=False, blank=True, default="",
+        editable=False, verbose_name="نام نرمال شده"
+    )
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # keeping the loaded branch
+    # so the menu of the previous branch is invalidated after a move
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the deferred one is read by the signals before an update
+        if 'branch_id' in instance.__dict__:
+            instance._loaded_branch = instance.branch_id
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -576,6 +842,10 @@ class Food(models.Model):
 
         verbose_name_plural = "غذاها"
 
+        indexes = [
+            GinIndex(fields=["search_vector"], name="food_search_idx"),
+        ]
+
 # Create the Table model
 # every Branch has one or more table
 
@@ -618,13 +888,170 @@ class Table(models.Model):
 
         verbose_name_plural = "میزها"
 
+# Create the Reservation model
+# every Table can be reserved for several time intervals
+# the intervals of the active reservations of a table never overlap
+
+
+class Reservation(models.Model):
+
+    # relating to custom reservation manager
+    # that is in the managers majule
+    objects = managers.ReservationManager()
+
+    table = models.ForeignKey(
+        "Table", on_delete=models.CASCADE,
+        null=False, blank=False, related_name="reservations",
+        verbose_name="میز"
+    )
+
+    branch = models.ForeignKey(
+        "Branch", on_delete=models.CASCADE,
+        null=False, blank=True, editable=False,
+        verbose_name="شعبه"
+    )
+
+    customer = models.ForeignKey(
+        "Customer", on_delete=models.DO_NOTHING,
+        null=True, blank=True,
+        verbose_name="مشتری"
+    )
+
+    party_size = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(limit_value=1)],
+        null=False, blank=False,
+        verbose_name="تعداد نفرات"
+    )
+
+    start = jmodels.jDateTimeField(
+        null=False, blank=False, verbose_name="زمان شروع"
+    )
+
+    end = jmodels.jDateTimeField(
+        null=False, blank=False, verbose_name="زمان پایان"
+    )
+
+    STATE_CHOICES = [
+        (1, "فعال"),
+        (2, "لغو شده")
+    ]
+
+    state = models.PositiveSmallIntegerField(
+        null=False, blank=True,
+        default=1, choices=STATE_CHOICES,
+        verbose_name="حالت"
+    )
+
+    created = jmodels.jDateTimeField(
+        default=jdatetime.datetime.now, editable=False,
+        null=False, blank=True, verbose_name="زمان ثبت"
+    )
+
+    # validating the interval, the capacity and the conflicts for forms
+    def clean(self):
+        from . import reservations
+
+        if (self.start is None or self.end is None or self.table_id is None
+                or self.party_size is None):
+            return
+
+        # the row of the table stays locked until the end of the transaction,
+        # the admin saves in the same transaction as this validation
+        # so a concurrent booking of the table waits for the save.
+        # Without a transaction only the validation is locked
+        # and save_reservation locks the table again
+        with transaction.atomic():
+            reservations.lock_table(self)
+
+    def __str__(self):
+        return "{0} -> {1}".format(self.table.name, self.start)
+
+    class Meta:
+
+        verbose_name = "رزرو"
+
+        verbose_name_plural = "رزروها"
+
+        indexes = [
+            # finding the previous reservation of a table
+            # is a single descending scan over this index
+            models.Index(
+                fields=["table", "start"],
+                condition=models.Q(state=1),
+                name="reservation_active_table_idx"
+            ),
+            models.Index(
+                fields=["branch", "start"],
+                name="reservation_branch_start_idx"
+            ),
+        ]
+
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(end__gt=models.F("start")),
+                name="reservation_end_after_start"
+            ),
+        ]
+
+# Create the Table Availability model
+# every row keeps the busy time slots of a table in one day
+# as a bitmap that is maintained by the availability madule
+
+
+class TableAvailability(models.Model):
+
+    table = models.ForeignKey(
+        "Table", on_delete=models.CASCADE,
+        null=False, blank=False, related_name="availabilities",
+        verbose_name="میز"
+    )
+
+    branch = models.ForeignKey(
+        "Branch", on_delete=models.CASCADE,
+        null=False, blank=False, verbose_name="شعبه"
+    )
+
+    objects = jmodels.jManager()
+
+    day = jmodels.jDateField(
+        null=False, blank=False, verbose_name="روز"
+    )
+
+    # the bit i is set when the slot i of the day is reserved
+    busy = models.BigIntegerField(
+        default=0, null=False, blank=True,
+        verbose_name="زمان های رزرو شده"
+    )
+
+    def __str__(self):
+        return "{0} -> {1}".format(self.table_id, self.day)
+
+    class Meta:
+
+        verbose_name = "وضعیت میز"
+
+        verbose_name_plural = "وضعیت میزها"
+
+        unique_together = ["table", "day"]
+
+        indexes = [
+            models.Index(
+                fields=["branch", "day"],
+                name="availability_branch_day_idx"
+            ),
+        ]
+
 # Create the Order model
 # every customet can order from Food Collection
 
 
-class Order(models.Model):
+class Order(DateBucketsMixin, models.Model):
 
-    objects = jmodels.jManager()
+    # relating to custom order manager
+    # that is in the managers majule
+    objects = managers.OrderManager()
+
+    bucket_fields = ('datetime',)
 
     datetime = jmodels.jDateTimeField(
         default=jdatetime.datetime.now,
@@ -642,14 +1069,22 @@ class Order(models.Model):
         choices=ORDER_TYPE_CHOICES, verbose_name="نوع"
     )
 
+    # the unique index of the customer and the day serves its lookups
     customer = models.ForeignKey(
-        "Customer", on_delete=models.DO_NOTHING,
-        null=False, blank=False, unique_for_date='datetime',
+        "Customer", on_delete=models.DO_NOTHING, db_index=False,
+        null=False, blank=False,
         verbose_name="مشتری"
     )
 
+    # the local jalali day of the datetime, it is set on every save
+    # so the database keeps one order for a customer in a day
+    order_date = jmodels.jDateField(
+        editable=False, null=False, blank=True, verbose_name="روز سفارش"
+    )
+
+    # the composite branch index of the meta serves its lookups
     branch = models.ForeignKey(
-        "Branch", on_delete=models.CASCADE,
+        "Branch", on_delete=models.CASCADE, db_index=False,
         null=False, blank=False,
         verbose_name="مجموعه غذایی"
     )
@@ -664,12 +1099,64 @@ class Order(models.Model):
         "Food",
         verbose_name="غذا"
     )
+
+    # the stored sum of the foods prices
+    # it is kept up to date by the signals madule
+    # whenever the foods of the order are changed
+    total_price = models.PositiveIntegerField(
+        db_index=True, default=0, editable=False,
+        null=False, blank=True, verbose_name="مبلغ کل(ریال)"
+    )
+
     @property
     def prices(self):
-        foods = self.foods
-        for food in foods:
-            prices += food.price
-        return prices
+        return self.total_price
+
+    # the fields of the sales rollup key and its revenue
+    sales_fields = ('branch_id', 'datetime', 'title', 'total_price')
+
+    # keeping the loaded values of the sales rollup key
+    # so the daily sales are corrected after changing them
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the deferred ones are read by the signals before an update
+        if all(name in instance.__dict__ for name in cls.sales_fields):
+            instance._loaded_sales = tuple(
+                instance.__dict__[name] for name in cls.sales_fields
+            )
+        return instance
+
+    def clean(self):
+        if self.datetime is not None:
+            self.order_date = jalali.local_date(self.datetime)
+
+    # the day is derived from the datetime, so it is validated
+    # with the customer even when the forms do not show it
+    def validate_unique(self, exclude=None):
+        if exclude is not None and 'customer' not in exclude:
+            exclude = [name for name in exclude if name != 'order_date']
+        super().validate_unique(exclude)
+
+    def unique_error_message(self, model_class, unique_check):
+        if tuple(unique_check) == ('customer', 'order_date'):
+            return ValidationError(
+                "برای این مشتری در این روز سفارش ثبت شده است",
+                code="سفارش تکراری"
+            )
+        return super().unique_error_message(model_class, unique_check)
+
+    # the daily sales are updated by the signals
+    # in the same transaction of saving the order
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'datetime' in update_fields:
+            self.order_date = jalali.local_date(self.datetime)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'order_date'}
+
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return "{1} -> {0}".format(self.branch.name, self.customer.user.username)
@@ -678,4 +1165,182 @@ class Order(models.Model):
 
         verbose_name = "سفارش"
 
-        verbose_name_plural = "سفارشات"
\ No newline at end of file
+        verbose_name_plural = "سفارشات"
+
+        indexes = [
+            # the keyset of the paginated order lists
+            models.Index(
+                fields=["datetime", "id"], name="order_datetime_id_idx"
+            ),
+            # the orders of a branch are a range of this index
+            models.Index(
+                fields=["branch", "datetime", "id"],
+                name="order_branch_datetime_idx"
+            ),
+        ]
+
+        constraints = [
+            # one order for a customer in a jalali day,
+            # its unique index also serves the orders of a customer
+            models.UniqueConstraint(
+                fields=["customer", "order_date"],
+                name="order_customer_day_uniq"
+            ),
+        ]
+
+# Create the IdempotencyKey model
+# every placed order is recorded under the key that the client sent,
+# so a retried request returns the same order instead of a new one
+
+
+class IdempotencyKey(models.Model):
+
+    objects = jmodels.jManager()
+
+    key = models.CharField(
+        max_length=100, null=False, blank=False, verbose_name="کلید"
+    )
+
+    customer = models.ForeignKey(
+        "Customer", on_delete=models.CASCADE, db_index=False,
+        null=False, blank=False, verbose_name="مشتری"
+    )
+
+    # the hash of the placed basket, a key can not be reused
+    # for a different basket
+    fingerprint = models.CharField(
+        max_length=64, null=False, blank=False, verbose_name="اثر درخواست"
+    )
+
+    order = models.OneToOneField(
+        "Order", on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="idempotency_key", verbose_name="سفارش"
+    )
+
+    created = jmodels.jDateTimeField(
+        db_index=True, default=jdatetime.datetime.now, editable=False,
+        null=False, blank=True, verbose_name="زمان ثبت"
+    )
+
+    def __str__(self):
+        return "{0} -> {1}".format(self.customer_id, self.key)
+
+    class Meta:
+
+        verbose_name = "کلید یکتایی"
+
+        verbose_name_plural = "کلیدهای یکتایی"
+
+        unique_together = ["customer", "key"]
+
+# Create the Daily Sales model
+# every row is the rollup of the orders of a branch
+# in one jalali day and one order type
+
+
+class DailySales(models.Model):
+
+    branch = models.ForeignKey(
+        "Branch", on_delete=models.CASCADE,
+        null=False, blank=False, verbose_name="شعبه"
+    )
+
+    objects = jmodels.jManager()
+
+    day = jmodels.jDateField(
+        null=False, blank=False, verbose_name="روز"
+    )
+
+    # the jalali year and month of the day for monthly reports
+    year = models.PositiveSmallIntegerField(
+        null=False, blank=False, verbose_name="سال"
+    )
+
+    month = models.PositiveSmallIntegerField(
+        null=False, blank=False, verbose_name="ماه"
+    )
+
+    order_type = models.PositiveSmallIntegerField(
+        null=False, blank=False,
+        choices=Order.ORDER_TYPE_CHOICES, verbose_name="نوع"
+    )
+
+    orders = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="تعداد سفارش"
+    )
+
+    revenue = models.BigIntegerField(
+        default=0, null=False, blank=True, verbose_name="درآمد(ریال)"
+    )
+
+    def __str__(self):
+        return "{0} -> {1}".format(self.branch_id, self.day)
+
+    class Meta:
+
+        verbose_name = "فروش روزانه"
+
+        verbose_name_plural = "فروش روزانه"
+
+        unique_together = ["branch", "day", "order_type"]
+
+        indexes = [
+            models.Index(
+                fields=["branch", "year", "month"],
+                name="dailysales_branch_month_idx"
+            ),
+            models.Index(fields=["day"], name="dailysales_day_idx"),
+        ]
+
+# Create the DateBucket model
+# every row counts the values of one date field of a model
+# in one jalali day, the admin date drill-downs read these rows
+
+
+class DateBucket(models.Model):
+
+    objects = jmodels.jManager()
+
+    # the lowercased label of the model like main.user
+    model = models.CharField(
+        max_length=100, null=False, blank=False, verbose_name="مدل"
+    )
+
+    field = models.CharField(
+        max_length=100, null=False, blank=False, verbose_name="فیلد"
+    )
+
+    day = jmodels.jDateField(
+        null=False, blank=False, verbose_name="روز"
+    )
+
+    # the jalali year and month of the day for the drill-downs
+    year = models.PositiveSmallIntegerField(
+        null=False, blank=False, verbose_name="سال"
+    )
+
+    month = models.PositiveSmallIntegerField(
+        null=False, blank=False, verbose_name="ماه"
+    )
+
+    count = models.PositiveIntegerField(
+        default=0, null=False, blank=True, verbose_name="تعداد"
+    )
+
+    def __str__(self):
+        return "{0}.{1} -> {2}".format(self.model, self.field, self.day)
+
+    class Meta:
+
+        verbose_name = "شمارش روزانه"
+
+        verbose_name_plural = "شمارش های روزانه"
+
+        unique_together = ["model", "field", "day"]
+
+        indexes = [
+            models.Index(
+                fields=["model", "field", "year", "month"],
+                name="datebucket_month_idx"
+            ),
+        ]
@@ -0,0 +1,199 @@
+# Create the order placement in this madule
+# a whole basket is validated and inserted in one transaction
+# and the idempotency key of the client makes the retries return
+# the same order instead of placing a new one
+
+import hashlib
+import json
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from . import jalali, models
+
+# the code of the error of a key that is reused for another basket
+KEY_CONFLICT = "کلید تکراری"
+
+# the code of the error of a key whose order is deleted
+ORDER_DELETED = "سفارش حذف شده"
+
+# the sqlstate of postgres for the foreign key violations
+FOREIGN_KEY_VIOLATION = '23503'
+
+# the unique constraint of the orders of a customer in a day
+DAILY_ORDER_CONSTRAINT = "order_customer_day_uniq"
+
+
+def fingerprint(branch_id, food_ids, order_type, table_id):
+    basket = [branch_id, sorted(food_ids), order_type, table_id]
+    return hashlib.sha256(json.dumps(basket).encode()).hexdigest()
+
+
+def clean_basket(branch_id, food_ids, order_type, table_id=None):
+    """
+    Validates the basket and returns the prices of its foods,
+    the foods of the branch are read in one query
+    """
+
+    if order_type not in dict(models.Order.ORDER_TYPE_CHOICES):
+        raise ValidationError("نوع سفارش نادرست است", code="نوع نامعتبر")
+
+    if not food_ids:
+        raise ValidationError("سبد خرید خالی است", code="سبد خالی")
+
+    prices = dict(
+        models.Food.objects.filter(
+            branch_id=branch_id, pk__in=food_ids
+        ).values_list('pk', 'price')
+    )
+
+    missing = sorted(set(food_ids) - set(prices))
+    if missing:
+        raise ValidationError(
+            "غذاهای {0} در این شعبه وجود ندارند".format(
+                ", ".join(str(pk) for pk in missing)
+            ),
+            code="غذای نامعتبر"
+        )
+
+    if table_id is not None and not models.Table.objects.filter(
+        pk=table_id, branch_id=branch_id
+    ).exists():
+        raise ValidationError("میز در این شعبه وجود ندارد", code="میز نامعتبر")
+
+    return prices
+
+
+def violated_constraint(error):
+    """
+    Returns the name of the constraint of the IntegrityError of postgres
+    """
+
+    return getattr(
+        getattr(error.__cause__, 'diag', None), 'constraint_name', None
+    )
+
+
+def is_customer_violation(error):
+    """
+    Checks that the IntegrityError is the violation of the customer
+    foreign key of the order or of the idempotency key, the constraints
+    are introspected only on this error path
+    """
+
+    name = violated_constraint(error)
+
+    with connection.cursor() as cursor:
+        for model in (models.IdempotencyKey, models.Order):
+            constraint = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            ).get(name)
+            if constraint and constraint['foreign_key'] and (
+                constraint['columns'] == [
+                    model._meta.get_field('customer').column
+                ]
+            ):
+                return True
+
+    return False
+
+
+def place_order(customer_id, key, branch_id, food_ids, order_type,
+                table_id=None):
+    """
+    Places the order of the basket and returns it with True,
+    a retried key returns the order of the first request with False
+    """
+
+    food_ids = sorted(set(food_ids))
+    basket = fingerprint(branch_id, food_ids, order_type, table_id)
+
+    try:
+        with transaction.atomic():
+            # a concurrent retry waits here on the unique key
+            # until the first request is committed or rolled back
+            record, created = models.IdempotencyKey.objects.get_or_create(
+                customer_id=customer_id, key=key,
+                defaults={'fingerprint': basket}
+            )
+
+            if not created:
+                if record.fingerprint != basket:
+                    raise ValidationError(
+                        "این کلید برای سفارش دیگری استفاده شده است",
+                        code=KEY_CONFLICT
+                    )
+                # the order of the key was deleted after it was placed,
+                # the client must place the basket by a new key
+                if record.order_id is None:
+                    raise ValidationError(
+                        "سفارش این کلید حذف شده است، "
+                        "برای ثبت دوباره از کلید جدید استفاده کنید",
+                        code=ORDER_DELETED
+                    )
+                return record.order, False
+
+            prices = clean_basket(branch_id, food_ids, order_type, table_id)
+
+            # the order of the day is checked by the unique constraint
+            # so concurrent baskets can not both be placed
+            try:
+                order = models.Order.objects.create(
+                    customer_id=customer_id, branch_id=branch_id,
+                    title=order_type, table_id=table_id,
+                    total_price=sum(prices.values())
+                )
+            except IntegrityError as e:
+                if violated_constraint(e) != DAILY_ORDER_CONSTRAINT:
+                    raise
+                raise ValidationError(
+                    "برای این مشتری امروز سفارش ثبت شده است",
+                    code="سفارش تکراری"
+                )
+
+            # the links are inserted together, the total is already stored
+            # so the m2m signals are not needed
+            models.Order.foods.through.objects.bulk_create([
+                models.Order.foods.through(order_id=order.pk, food_id=food_id)
+                for food_id in food_ids
+            ])
+
+            record.order = order
+            record.save(update_fields=['order'])
+    except IntegrityError as e:
+        # the foreign keys are checked when the transaction is committed
+        if getattr(e.__cause__, 'pgcode', None) != FOREIGN_KEY_VIOLATION:
+            raise
+        if is_customer_violation(e):
+            raise ValidationError("مشتری یافت نشد", code="مشتری نامعتبر")
+        raise ValidationError(
+            "شعبه، میز یا غذاهای سبد تغییر کرده اند", code="سبد نامعتبر"
+        )
+
+    return order, True
+
+
+def serialize_order(order, food_ids=None):
+    if food_ids is None:
+        food_ids = list(
+            models.Order.foods.through.objects.filter(
+                order_id=order.pk
+            ).order_by('food_id').values_list('food_id', flat=True)
+        )
+
+    return {
+        'id': order.pk,
+        'branch': order.branch_id,
+        'type': order.title,
+        'table': order.table_id,
+        'foods': sorted(set(food_ids)),
+        'total_price': order.total_price,
+        'datetime': jalali.format_datetime(order.datetime),
+    }
+
+
+def purge_keys(before):
+    """
+    Deletes the idempotency keys that are created before the datetime
+    and returns their number
+    """
+
+    return models.IdempotencyKey.objects.filter(created__lt=before).delete()[0]
@@ -0,0 +1,267 @@
+# Create the paginators of the big admin changelists in this madule
+# counting uses the estimates of the PostgreSQL planner for large tables
+# and deep pages are found by seeking on the ordering keys
+# instead of skipping the rows by OFFSET
+
+import base64
+import datetime
+import json
+import jdatetime
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .jalali import as_gregorian
+
+# the counts that are estimated less than this are counted exactly
+EXACT_COUNT_LIMIT = getattr(settings, 'EXACT_COUNT_LIMIT', 10000)
+
+# only this many first and last pages are numbered, the other rows
+# are reached by the cursors that seek the keyset
+KEYSET_PAGE = getattr(settings, 'KEYSET_PAGE', 5)
+
+CURSOR_VAR = 'cursor'
+
+
+def estimated_count(queryset, exact_limit=EXACT_COUNT_LIMIT):
+    """
+    Returns the number of rows of the queryset, a large count is
+    estimated by pg_class.reltuples for the whole table or by
+    the row estimate of EXPLAIN for a filtered queryset
+    """
+
+    connection = connections[queryset.db]
+
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)]
+            )
+            row = cursor.fetchone()
+            estimate = row[0] if row else -1
+        else:
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]['Plan']['Plan Rows']
+
+    # a table that is never analyzed has a negative estimate
+    if estimate < exact_limit:
+        return queryset.count()
+
+    return int(estimate)
+
+
+def encode_cursor(values):
+    values = [
+        as_gregorian(value).isoformat()
+        if isinstance(value, (datetime.datetime, jdatetime.datetime))
+        else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetPaginator(Paginator):
+    """
+    A paginator that estimates large counts and seeks the deep pages,
+    the keyset is the unique ordering of the pages like ('-datetime', '-pk')
+    """
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, keyset=('-pk',)):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.keyset = tuple(keyset)
+        self.fields = tuple(key.lstrip('-') for key in self.keyset)
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+    @property
+    def seekable(self):
+        """
+        The pages are seeked only when the ordering of the queryset
+        starts with the keyset
+        """
+
+        aliases = {'-id': '-pk', 'id': 'pk'}
+        keyset = [aliases.get(key, key) for key in self.keyset]
+
+        # the changelist repeats the ordering of the ModelAdmin
+        ordering = []
+        for key in self.object_list.query.order_by:
+            key = aliases.get(key, key)
+            if key not in ordering:
+                ordering.append(key)
+
+        return ordering[:len(keyset)] == keyset
+
+    def key_of(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def seek(self, values, inclusive=False):
+        """
+        Returns the rows that come after the key values in the keyset order,
+        the row of the values itself is included when inclusive is set
+        """
+
+        values = [
+            as_gregorian(value) if isinstance(value, jdatetime.datetime)
+            else value
+            for value in values
+        ]
+
+        condition = Q(**dict(zip(self.fields, values))) if inclusive else Q()
+
+        for index, key in enumerate(self.keyset):
+            lookup = '{0}__{1}'.format(
+                self.fields[index], 'lt' if key.startswith('-') else 'gt'
+            )
+            condition |= Q(
+                **dict(zip(self.fields[:index], values[:index])),
+                **{lookup: values[index]}
+            )
+
+        return self.object_list.filter(condition)
+
+    def after_cursor(self, cursor):
+        """
+        Returns the page of rows after the encoded cursor
+        or None when the cursor is not valid
+        """
+
+        values = decode_cursor(cursor)
+
+        if values is None or len(values) != len(self.fields) or not self.seekable:
+            return None
+
+        try:
+            values = [
+                self.to_python(field, value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            return None
+
+        if None in values:
+            return None
+
+        return self.seek(values)[:self.per_page]
+
+    def to_python(self, field, value):
+        if field == 'pk':
+            return int(value)
+        model_field = self.object_list.model._meta.get_field(field)
+        if model_field.get_internal_type() == 'DateTimeField':
+            # the jalali fields need the local time zone of pytz
+            # instead of the fixed offset of the parsed value
+            value = parse_datetime(value)
+            return value and timezone.localtime(as_gregorian(value))
+        return model_field.to_python(value)
+
+    def numbered_pages(self):
+        """
+        Returns the numbered pages, the first and the last ones
+        """
+
+        if self.num_pages <= 2 * KEYSET_PAGE:
+            return list(range(self.num_pages))
+
+        return [
+            *range(KEYSET_PAGE), '.',
+            *range(self.num_pages - KEYSET_PAGE, self.num_pages)
+        ]
+
+    def page(self, number):
+        number = self.validate_number(number)
+
+        if number <= KEYSET_PAGE or not self.seekable:
+            return super().page(number)
+
+        if number <= self.num_pages - KEYSET_PAGE:
+            raise InvalidPage("این صفحه با مکان نما خوانده می شود")
+
+        # the last pages are the first ones of the reversed keyset,
+        # every one of them is full and the last one ends the rows
+        bottom = (self.num_pages - number) * self.per_page
+        rows = list(self.object_list.reverse()[bottom:bottom + self.per_page])
+        rows.reverse()
+        return self._get_page(rows, number, self)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    A changelist that shows the rows after the cursor parameter
+    and links the next rows by a cursor
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        return super().get_query_string(
+            new_params, list(remove or []) + [CURSOR_VAR]
+        )
+
+    def get_results(self, request):
+        cursor = self.params.get(CURSOR_VAR)
+
+        # the rows of the cursor replace the page, the first page
+        # is a lazy slice that is never read instead of a deep page
+        if cursor:
+            self.page_num = 0
+
+        super().get_results(request)
+
+        if cursor and self.multi_page:
+            rows = self.paginator.after_cursor(cursor)
+            if rows is None:
+                raise IncorrectLookupParameters
+            self.result_list = rows
+
+    @cached_property
+    def keyset_page_range(self):
+        if not self.paginator.seekable:
+            return None
+        return self.paginator.numbered_pages()
+
+    @cached_property
+    def next_cursor(self):
+        """
+        Returns the link of the rows after the shown rows
+        """
+
+        if not self.multi_page or not self.paginator.seekable:
+            return None
+
+        rows = list(self.result_list)
+        if len(rows) < self.list_per_page:
+            return None
+
+        return self.get_query_string(
+            {CURSOR_VAR: encode_cursor(self.paginator.key_of(rows[-1]))},
+            remove=[PAGE_VAR]
+        )
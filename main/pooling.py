@@ -0,0 +1,76 @@
+# Create the database connection pooling in this madule
+# every worker thread keeps its connection open for CONN_MAX_AGE,
+# the connections are checked before a request reuses them
+# and the opened, reused and failed connections are counted
+
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connections
+
+# probing the connection before reusing it,
+# a broken connection is replaced instead of failing the request
+HEALTH_CHECKS = getattr(settings, 'DATABASE_HEALTH_CHECKS', True)
+
+# the connections that were used in the last seconds are trusted
+# so the busy workers do not pay a round trip for every request
+HEALTH_CHECK_IDLE = getattr(settings, 'DATABASE_HEALTH_CHECK_IDLE', 10)
+
+COUNTERS = ('opened', 'reused', 'failed', 'expired', 'broken')
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def count(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def stats():
+    """
+    Returns the counters of the connections of this process
+    """
+
+    with _lock:
+        return {name: _counters[name] for name in COUNTERS}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+def checkout(**kwargs):
+    """
+    Prepares the connections of the thread for a request,
+    the obsolete and the broken ones are closed
+    and reconnected lazily by their next query
+    """
+
+    now = time.monotonic()
+
+    for connection in connections.all():
+        # a connection inside a transaction, like the one of a test case,
+        # is neither closed nor probed
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+
+        connection.close_if_unusable_or_obsolete()
+        if connection.connection is None:
+            count('expired')
+            continue
+
+        # a connection that was never checked out is probed too
+        last = getattr(connection, 'last_checkout', None)
+        idle = None if last is None else now - last
+        if HEALTH_CHECKS and (
+            idle is None or idle >= HEALTH_CHECK_IDLE
+        ) and not connection.is_usable():
+            connection.close()
+            count('broken')
+            continue
+
+        connection.last_checkout = now
+        count('reused')
@@ -0,0 +1,26 @@
+# Create the postgresql backend of the project in this madule
+# it is the backend of Django that counts the opened
+# and the failed connections for the pooling madule
+# and marks the writes of the primary for the router
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.postgresql import base
+from main import pooling, routers
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        if alias == DEFAULT_DB_ALIAS:
+            self.execute_wrappers.append(routers.mark_writes)
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            pooling.count('failed')
+            raise
+
+        pooling.count('opened')
+        return connection
@@ -0,0 +1,121 @@
+# Create the branch ratings aggregation in this madule
+# every change of a score is applied to the BranchRating row
+# of its branch, so reading a rating never aggregates the rates
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from . import models
+
+SCORES = range(1, 6)
+
+
+def apply(branch_id, score, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) one score
+    to the aggregate of the branch in one UPDATE statement
+    """
+
+    if branch_id is None or score is None:
+        return
+
+    count = F('count') + sign
+    total = F('total') + sign * score
+
+    changes = {
+        'count': count,
+        'total': total,
+        # the UPDATE reads the old values, so the count becomes zero
+        # when the only score of the branch is removed
+        'mean': Case(
+            When(count__lte=-sign, then=Value(0.0)),
+            default=Cast(total, FloatField()) / count,
+            output_field=FloatField()
+        ),
+        'stars_{}'.format(score): F('stars_{}'.format(score)) + sign,
+    }
+
+    updated = models.BranchRating.objects.filter(
+        branch_id=branch_id
+    ).update(**changes)
+
+    if not updated and sign > 0:
+        models.BranchRating.objects.get_or_create(branch_id=branch_id)
+        models.BranchRating.objects.filter(
+            branch_id=branch_id
+        ).update(**changes)
+
+
+def aggregates(rates):
+    """
+    Returns the aggregates of the scores of the rates per branch
+    that are computed by the database in one statement
+    """
+
+    return rates.filter(score__isnull=False).order_by().values(
+        'branch'
+    ).annotate(
+        count=Count('pk'),
+        total=Sum('score'),
+        **{
+            'stars_{}'.format(score): Count('pk', filter=Q(score=score))
+            for score in SCORES
+        }
+    )
+
+
+def rebuild(branch_ids=None, batch_size=1000):
+    """
+    Recomputes the ratings of the branches, or all of them,
+    from the rates and returns the number of the written rows
+    """
+
+    rates = models.Rate.objects.all()
+    ratings = models.BranchRating.objects.all()
+
+    if branch_ids is not None:
+        rates = rates.filter(branch__in=branch_ids)
+        ratings = ratings.filter(branch__in=branch_ids)
+
+    rows = [
+        models.BranchRating(
+            branch_id=row.pop('branch'),
+            mean=row['total'] / row['count'],
+            **row
+        )
+        for row in aggregates(rates)
+    ]
+
+    with transaction.atomic():
+        ratings.delete()
+        models.BranchRating.objects.bulk_create(rows, batch_size=batch_size)
+
+    return len(rows)
+
+
+def best_branches(limit=10, min_count=1):
+    """
+    Returns the ratings of the best branches ordered by their mean score
+    """
+
+    return models.BranchRating.objects.filter(
+        count__gte=min_count
+    ).select_related('branch').order_by('-mean', '-count')[:limit]
+
+
+def summary(branch_id):
+    """
+    Returns the count, the mean and the histogram of the rating
+    of the branch in one query
+    """
+
+    rating = models.BranchRating.objects.filter(branch_id=branch_id).first()
+
+    if rating is None:
+        return {'count': 0, 'mean': 0, 'histogram': [0] * len(SCORES)}
+
+    return {
+        'count': rating.count,
+        'mean': round(rating.mean, 2),
+        'histogram': list(rating.histogram),
+    }
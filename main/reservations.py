@@ -0,0 +1,175 @@
+# Create the table reservation engine in this madule
+# every booking locks only the row of the reserved table,
+# so the bookings of one table are serialized
+# while the other tables of the branch are booked concurrently
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
+from . import availability, models
+from .jalali import as_gregorian
+
+
+def is_available(table, start, end, exclude=None):
+    """
+    Checks that the table has no active reservation in [start, end).
+    Reservations of a table never overlap, so only the last one
+    that starts before `end` can conflict and it is found
+    by one descending index scan
+    """
+
+    start, end = as_gregorian(start), as_gregorian(end)
+
+    previous = models.Reservation.objects.active().filter(
+        table=table, start__lt=end
+    )
+
+    if exclude is not None:
+        previous = previous.exclude(pk=exclude)
+
+    previous = previous.order_by('-start').values_list('end', flat=True)[:1]
+
+    for previous_end in previous:
+        return as_gregorian(previous_end) <= start
+
+    return True
+
+
+def lock_table(reservation):
+    """
+    Locks the row of the table of the reservation and raises
+    ValidationError when the reservation does not fit in the table,
+    it is called in a transaction that keeps the lock until its end
+    """
+
+    if not transaction.get_connection().in_atomic_block:
+        raise TransactionManagementError(
+            "The table must be locked in a transaction"
+        )
+
+    start = as_gregorian(reservation.start)
+    end = as_gregorian(reservation.end)
+
+    if end <= start:
+        raise ValidationError(
+            "زمان پایان باید بعد از زمان شروع باشد",
+            code="بازه زمانی نادرست"
+        )
+
+    table = models.Table.objects.select_for_update().get(
+        pk=reservation.table_id
+    )
+
+    if reservation.party_size > table.capacity:
+        raise ValidationError(
+            "تعداد نفرات از ظرفیت میز بیشتر است",
+            code="ظرفیت ناکافی"
+        )
+
+    if reservation.state == 1 and not is_available(
+        table, start, end, exclude=reservation.pk
+    ):
+        raise ValidationError(
+            "میز در این بازه زمانی رزرو شده است",
+            code="تداخل رزرو"
+        )
+
+    return table
+
+
+def save_reservation(reservation):
+    """
+    Saves the reservation while the row of its table is locked,
+    raises ValidationError when the table is not free in the interval
+    """
+
+    start = as_gregorian(reservation.start)
+    end = as_gregorian(reservation.end)
+
+    with transaction.atomic():
+        table = lock_table(reservation)
+
+        # the previous interval is freed in the bitmaps when it is moved
+        previous_days = []
+        if reservation.pk is not None:
+            previous = models.Reservation.objects.filter(
+                pk=reservation.pk
+            ).values_list('start', 'end').first()
+            if previous:
+                previous_days = list(availability.day_masks(*previous))
+
+        reservation.table = table
+        reservation.branch_id = table.branch_id
+        reservation.save()
+
+        if previous_days or reservation.state != 1:
+            availability.rebuild(
+                table,
+                set(previous_days) |
+                set(availability.day_masks(start, end))
+            )
+        else:
+            availability.mark(reservation)
+
+    return reservation
+
+
+def book(table, start, end, party_size, customer=None):
+    """
+    Creates an active reservation of the table for [start, end)
+    """
+
+    return save_reservation(
+        models.Reservation(
+            table=table, customer=customer, party_size=party_size,
+            start=start, end=end
+        )
+    )
+
+
+def cancel(reservation):
+    """
+    Cancels the reservation and frees its interval of the table
+    """
+
+    with transaction.atomic():
+        table = models.Table.objects.select_for_update().get(
+            pk=reservation.table_id
+        )
+
+        reservation.state = 2
+        reservation.save(update_fields=['state'])
+
+        availability.rebuild(
+            table, availability.day_masks(reservation.start, reservation.end)
+        )
+
+    return reservation
+
+
+def release(reservation):
+    """
+    Frees the interval of a deleted reservation of the table,
+    nothing is left to free when the table is deleted with it
+    """
+
+    if reservation.state != 1:
+        return
+
+    with transaction.atomic():
+        table = models.Table.objects.select_for_update().filter(
+            pk=reservation.table_id
+        ).first()
+
+        if table is None:
+            return
+
+        # only the stored bitmaps are freed, so the ones of a table
+        # that is deleted with its reservations are not created again
+        days = models.TableAvailability.objects.filter(
+            table_id=table.pk, day__in=list(
+                availability.day_masks(reservation.start, reservation.end)
+            )
+        ).values_list('day', flat=True)
+
+        availability.rebuild(table, [day.togregorian() for day in days])
@@ -0,0 +1,126 @@
+# Create the database router in this madule
+# the reads of the catalog models and the reports go to the replica,
+# the writes and the transactions stay on the primary
+# and a client that wrote is pinned to the primary for a short time
+
+import contextvars
+import re
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = getattr(settings, 'DATABASE_REPLICA', 'replica')
+
+# the seconds that a client reads from the primary after its last write,
+# they should be longer than the replication lag
+STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+STICKY_COOKIE = getattr(settings, 'REPLICA_STICKY_COOKIE', 'foodland_primary')
+
+# the models that are read much more than they are written
+REPLICA_MODELS = {
+    'main.foodcollection', 'main.branch', 'main.food',
+    'main.province', 'main.city', 'main.rate',
+}
+
+# the request or the task reads from the primary
+pinned = contextvars.ContextVar('pinned', default=False)
+
+# the request or the task has written to the primary
+wrote = contextvars.ContextVar('wrote', default=False)
+
+# the statements that change the rows of the primary
+WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+def has_replica():
+    return REPLICA in connections.databases
+
+
+def read_alias():
+    """
+    Returns the replica when the reads may be stale,
+    the pinned clients and the open transactions read the primary
+    """
+
+    if not has_replica() or pinned.get():
+        return DEFAULT_DB_ALIAS
+
+    # the reads of a transaction must see its own writes and locks
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+
+    return REPLICA
+
+
+def for_reports(queryset):
+    """
+    Returns the queryset of a report on the replica when it is allowed
+    """
+
+    return queryset.using(read_alias())
+
+
+@contextmanager
+def primary():
+    """
+    Reads the primary in the block, the versioned caches are filled
+    from it so a lagging replica is never cached under a new version
+    """
+
+    token = pinned.set(True)
+    try:
+        yield
+    finally:
+        pinned.reset(token)
+
+
+def mark_writes(execute, sql, params, many, context):
+    """
+    The execute wrapper of the primary connection, the rest of the
+    request reads its own writes after a statement that changed rows
+    """
+
+    if many or WRITE_STATEMENT.match(sql):
+        wrote.set(True)
+        pinned.set(True)
+    return execute(sql, params, many, context)
+
+
+def pin(until=None):
+    """
+    Pins the current context to the primary, a client is pinned
+    when its sticky cookie is not expired yet
+    """
+
+    if until is None or until > time.time():
+        pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+    """
+    Routes the reads of the catalog models to the replica
+    and everything else to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in REPLICA_MODELS:
+            return read_alias()
+        return DEFAULT_DB_ALIAS
+
+    # the writes are marked by mark_writes, Django also asks this
+    # for the reads of select_for_update and get_or_create
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica has the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica is migrated by the replication
+        return db == DEFAULT_DB_ALIAS
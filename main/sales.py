@@ -0,0 +1,170 @@
+# Create the daily sales rollup in this madule
+# every created, changed or deleted order is applied to the DailySales row
+# of its branch, jalali day and type, so reports never read the orders
+
+import datetime
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from . import jalali, models, routers
+
+
+def sales_key(branch_id, order_datetime, order_type):
+    return branch_id, jalali.local_date(order_datetime), order_type
+
+
+def apply(branch_id, day, order_type, orders, revenue):
+    """
+    Adds the number of orders and the revenue to the rollup row
+    in one UPDATE statement, the row is created when it is missing
+    """
+
+    if not orders and not revenue:
+        return
+
+    changes = {
+        'orders': F('orders') + orders,
+        'revenue': F('revenue') + revenue,
+    }
+
+    rows = models.DailySales.objects.filter(
+        branch_id=branch_id, day=day, order_type=order_type
+    )
+
+    if not rows.update(**changes) and orders > 0:
+        models.DailySales.objects.get_or_create(
+            branch_id=branch_id, day=day, order_type=order_type,
+            defaults={'year': day.year, 'month': day.month}
+        )
+        rows.update(**changes)
+
+
+def order_saved(order, created):
+    """
+    Applies a saved order, a changed order is moved
+    from the rollup of its loaded values to the new ones
+    """
+
+    current = (order.branch_id, order.datetime, order.title, order.total_price)
+    loaded = getattr(order, '_loaded_sales', None)
+
+    if created:
+        apply(*sales_key(*current[:3]), 1, current[3])
+    elif loaded is None:
+        day = jalali.local_date(order.datetime)
+        rebuild(day, day, branch_ids=[order.branch_id])
+    elif loaded != current:
+        apply(*sales_key(*loaded[:3]), -1, -loaded[3])
+        apply(*sales_key(*current[:3]), 1, current[3])
+
+    order._loaded_sales = current
+
+
+def order_deleted(order):
+    loaded = getattr(order, '_loaded_sales', None) or (
+        order.branch_id, order.datetime, order.title, order.total_price
+    )
+    apply(*sales_key(*loaded[:3]), -1, -loaded[3])
+
+
+def refresh_totals(queryset):
+    """
+    Recomputes the totals of the orders and applies the differences
+    to the revenue of their days, returns a dictionary of order id
+    to its new total
+    """
+
+    with transaction.atomic():
+        previous = dict(queryset.values_list('pk', 'total_price'))
+        queryset.refresh_totals()
+
+        totals = {}
+        orders = queryset.values_list(
+            'pk', 'branch_id', 'datetime', 'title', 'total_price'
+        )
+
+        for pk, branch_id, order_datetime, order_type, total in orders:
+            totals[pk] = total
+            difference = total - previous.get(pk, total)
+            if difference:
+                apply(
+                    *sales_key(branch_id, order_datetime, order_type),
+                    0, difference
+                )
+
+    return totals
+
+
+def day_bounds(start, end):
+    """
+    Returns the aware datetimes of the beginning of the start day
+    and the end of the end day
+    """
+
+    start = timezone.make_aware(
+        datetime.datetime.combine(start.togregorian(), datetime.time())
+    )
+    end = timezone.make_aware(
+        datetime.datetime.combine(
+            end.togregorian() + datetime.timedelta(days=1), datetime.time()
+        )
+    )
+    return start, end
+
+
+def rebuild(start, end, branch_ids=None, batch_size=1000):
+    """
+    Recomputes the rollups of the jalali days from start to end
+    from the orders and returns the number of the written rows
+    """
+
+    start_datetime, end_datetime = day_bounds(start, end)
+
+    orders = models.Order.objects.filter(
+        datetime__gte=start_datetime, datetime__lt=end_datetime
+    )
+    rollups = models.DailySales.objects.filter(day__gte=start, day__lte=end)
+
+    if branch_ids is not None:
+        orders = orders.filter(branch__in=branch_ids)
+        rollups = rollups.filter(branch__in=branch_ids)
+
+    # the local gregorian date is grouped in the database
+    # and every gregorian date is exactly one jalali day
+    rows = orders.order_by().annotate(
+        local_day=TruncDate('datetime')
+    ).values('branch', 'local_day', 'title').annotate(
+        order_count=Count('pk'), revenue=Sum('total_price')
+    )
+
+    objects = []
+    for row in rows:
+        day = jalali.jalali_date(row['local_day'])
+        objects.append(models.DailySales(
+            branch_id=row['branch'], day=day,
+            year=day.year, month=day.month, order_type=row['title'],
+            orders=row['order_count'], revenue=row['revenue']
+        ))
+
+    with transaction.atomic():
+        rollups.delete()
+        models.DailySales.objects.bulk_create(objects, batch_size=batch_size)
+
+    return len(objects)
+
+
+def monthly(year, branch_ids=None):
+    """
+    Returns the orders and the revenue of every branch, jalali month
+    and order type of the jalali year
+    """
+
+    rollups = routers.for_reports(models.DailySales.objects.filter(year=year))
+
+    if branch_ids is not None:
+        rollups = rollups.filter(branch__in=branch_ids)
+
+    return rollups.order_by('branch', 'month', 'order_type').values(
+        'branch', 'month', 'order_type'
+    ).annotate(total_orders=Sum('orders'), total_revenue=Sum('revenue'))
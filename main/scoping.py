@@ -0,0 +1,66 @@
+# Create the role scoping of the querysets in this madule
+# the managers of the food collections and the staff of the branches
+# only see the rows of their own branches, the rows are filtered
+# by the branch so the composite branch indexes are used
+
+from . import accounts
+
+# the lookups from the scoped models to their branch
+BRANCH_PATHS = {
+    'main.branch': 'pk',
+    'main.food': 'branch',
+    'main.table': 'branch',
+    'main.order': 'branch',
+    'main.rate': 'branch',
+    'main.reservation': 'branch',
+    'main.dailysales': 'branch',
+}
+
+# the manager, the branch manager and the cashier
+STAFF_TYPES = (2, 3, 4)
+
+
+def is_unrestricted(user):
+    return user.is_active and (user.is_superuser or user.user_type == 5)
+
+
+def branch_ids_of(user):
+    """
+    Returns the branches of the user, the users of the cached backend
+    have their scope already and the others are resolved here
+    """
+
+    if not user.is_authenticated or user.user_type not in STAFF_TYPES:
+        return ()
+
+    if not hasattr(user, 'branch_ids'):
+        accounts.resolve_scope(user)
+
+    return user.branch_ids
+
+
+def is_scoped(model):
+    return model._meta.label_lower in BRANCH_PATHS
+
+
+def scope(queryset, user):
+    """
+    Returns the rows of the queryset that the user may see,
+    the admins see every row and the other users no row
+    """
+
+    if is_unrestricted(user):
+        return queryset
+
+    branch_ids = branch_ids_of(user)
+    if not branch_ids:
+        return queryset.none()
+
+    path = BRANCH_PATHS[queryset.model._meta.label_lower]
+    if len(branch_ids) == 1:
+        return queryset.filter(**{path: branch_ids[0]})
+    return queryset.filter(**{path + '__in': branch_ids})
+
+
+def can_access_branch(user, branch_id):
+    return is_unrestricted(user) or branch_id in branch_ids_of(user)
@@ -0,0 +1,135 @@
+# Create the catalog search in this madule
+# names are normalized for persian text and indexed as a tsvector,
+# so searching is a GIN index lookup instead of ILIKE scans
+
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import CharField, F, Value
+from . import models
+
+SEARCH_CONFIG = 'simple'
+
+# the searched name field of every catalog model
+NAME_FIELDS = {
+    models.FoodCollection: 'full_name',
+    models.Branch: 'name',
+    models.Food: 'name',
+}
+
+# arabic letters are mapped to persian ones
+# and persian or arabic digits to the latin digits
+CHARACTER_MAP = str.maketrans({
+    '\u064a': '\u06cc', '\u0649': '\u06cc', '\u0626': '\u06cc',
+    '\u0643': '\u06a9',
+    '\u0629': '\u0647', '\u06c0': '\u0647',
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0671': '\u0627',
+    '\u0624': '\u0648',
+    # zero width non joiner, zero width joiner and tatweel
+    '\u200c': ' ', '\u200d': '', '\u0640': '',
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+
+# the arabic diacritics
+DIACRITICS = re.compile('[\u064b-\u0652\u0670]')
+
+NON_WORD = re.compile(r'[^\w\s]')
+
+
+def normalize(text):
+    """
+    Normalizing the persian text for searching
+    """
+
+    text = DIACRITICS.sub('', (text or '').translate(CHARACTER_MAP))
+    return ' '.join(text.lower().split())
+
+
+def build_query(text):
+    """
+    Returns a prefix matching SearchQuery of every word of the text
+    or None when there is no word to search
+    """
+
+    words = NON_WORD.sub(' ', normalize(text)).split()
+
+    if not words:
+        return None
+
+    return SearchQuery(
+        ' & '.join('{}:*'.format(word) for word in words),
+        config=SEARCH_CONFIG, search_type='raw'
+    )
+
+
+def search_vector(search_name=None):
+    source = (
+        'search_name' if search_name is None
+        else Value(search_name, output_field=CharField())
+    )
+    return SearchVector(source, config=SEARCH_CONFIG)
+
+
+def fill_search_names(objects):
+    """
+    Fills the normalized search name of the unsaved objects,
+    it is used where the saving signals are not sent like bulk_create
+    """
+
+    for obj in objects:
+        obj.search_name = normalize(getattr(obj, NAME_FIELDS[type(obj)]))
+
+    return objects
+
+
+def refresh_vectors(queryset):
+    """
+    Recomputes the search vector of the rows from their search_name
+    """
+
+    return queryset.update(search_vector=search_vector())
+
+
+def write_search_name(queryset, search_name):
+    """
+    Writes the search name and its vector of the rows in one update,
+    the vector is made from the new name and not from the stored one
+    """
+
+    return queryset.update(
+        search_name=search_name, search_vector=search_vector(search_name)
+    )
+
+
+def ranked(queryset, query):
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', 'pk')
+
+
+def search(text, limit=10):
+    """
+    Searches the food collections, branches and foods,
+    the results of every kind are ordered by their rank
+    """
+
+    query = build_query(text)
+
+    if query is None:
+        return {'collections': [], 'branches': [], 'foods': []}
+
+    collections = ranked(models.FoodCollection.objects.all(), query)
+    branches = ranked(models.Branch.objects.all(), query)
+    foods = ranked(models.Food.objects.all(), query)
+
+    return {
+        'collections': list(
+            collections.values('id', 'full_name', 'rank')[:limit]
+        ),
+        'branches': list(
+            branches.values('id', 'name', 'foodCollection_id', 'rank')[:limit]
+        ),
+        'foods': list(
+            foods.values('id', 'name', 'price', 'branch_id', 'rank')[:limit]
+        ),
+    }
@@ -0,0 +1,270 @@
+# Create the signal receivers in this madule
+# receivers keep the denormalized data of models up to date
+# they are connected when the application is ready
+
+from django.core.signals import request_started
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+from . import (
+    accounts, api, buckets, gazetteer, menu, models, pooling, ratings,
+    reservations, sales, search
+)
+
+# Refresh the stored total_price of orders
+# whenever the foods of an order are changed
+
+
+@receiver(m2m_changed, sender=models.Order.foods.through)
+def update_order_total(sender, instance, action, reverse, pk_set, **kwargs):
+
+    # on the reverse side the cleared orders are not known after clearing
+    # so they are collected before the relations are removed
+    if action == "pre_clear" and reverse:
+        instance._cleared_order_ids = list(
+            sender.objects.filter(food=instance).values_list(
+                'order_id', flat=True
+            )
+        )
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        order_ids = [instance.pk]
+    elif action == "post_clear":
+        order_ids = getattr(instance, '_cleared_order_ids', [])
+    else:
+        order_ids = pk_set
+
+    if not order_ids:
+        return
+
+    totals = sales.refresh_totals(models.Order.objects.filter(pk__in=order_ids))
+
+    # the changed order keeps its new total,
+    # so saving it again does not write the old one
+    if not reverse and instance.pk in totals:
+        instance.total_price = totals[instance.pk]
+        loaded = getattr(instance, '_loaded_sales', None)
+        if loaded is not None:
+            instance._loaded_sales = loaded[:3] + (instance.total_price,)
+
+# Invalidate the cached menu of the branch
+# whenever one of its foods is saved or deleted,
+# a moved food invalidates the menus of both branches
+
+
+@receiver(pre_save, sender=models.Food)
+def load_food_branch(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None or hasattr(instance, '_loaded_branch'):
+        return
+
+    instance._loaded_branch = sender.objects.filter(
+        pk=instance.pk
+    ).values_list('branch_id', flat=True).first()
+
+
+@receiver(post_save, sender=models.Food)
+@receiver(post_delete, sender=models.Food)
+def invalidate_branch_menu(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_branch', None)
+    for branch_id in {loaded, instance.branch_id} - {None}:
+        menu.invalidate(branch_id)
+    instance._loaded_branch = instance.branch_id
+
+# Bump the api versions of the branches and the collections
+# whenever they, their contacts, locations or tables are changed
+
+
+@receiver(post_save, sender=models.Branch)
+@receiver(post_delete, sender=models.Branch)
+def invalidate_branch_api(sender, instance, **kwargs):
+    api.invalidate_branch(instance.pk)
+
+
+@receiver(post_save, sender=models.CallContact)
+@receiver(post_delete, sender=models.CallContact)
+@receiver(post_save, sender=models.Location)
+@receiver(post_delete, sender=models.Location)
+def invalidate_branch_details_api(sender, instance, **kwargs):
+    api.invalidate_branch(instance.branch_id)
+
+
+@receiver(post_save, sender=models.Table)
+@receiver(post_delete, sender=models.Table)
+def invalidate_tables_api(sender, instance, **kwargs):
+    api.invalidate_tables(instance.branch_id)
+
+
+@receiver(post_save, sender=models.FoodCollection)
+@receiver(post_delete, sender=models.FoodCollection)
+def invalidate_collections_api(sender, **kwargs):
+    api.invalidate_collections()
+
+# Reload the gazetteer of provinces and cities
+# whenever a province or a city is saved or deleted
+
+
+@receiver(post_save, sender=models.Province)
+@receiver(post_delete, sender=models.Province)
+@receiver(post_save, sender=models.City)
+@receiver(post_delete, sender=models.City)
+def invalidate_gazetteer(sender, **kwargs):
+    gazetteer.invalidate()
+
+# Fill the normalized search name of the catalog models
+# and refresh their search vector after saving
+
+
+@receiver(pre_save, sender=models.FoodCollection)
+@receiver(pre_save, sender=models.Branch)
+@receiver(pre_save, sender=models.Food)
+def fill_search_name(sender, instance, **kwargs):
+    instance.search_name = search.normalize(
+        getattr(instance, search.NAME_FIELDS[sender])
+    )
+
+
+@receiver(post_save, sender=models.FoodCollection)
+@receiver(post_save, sender=models.Branch)
+@receiver(post_save, sender=models.Food)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields and search.NAME_FIELDS[sender] not in update_fields:
+        return
+
+    # the search name is not saved when only the name is in update_fields
+    search.write_search_name(
+        sender.objects.filter(pk=instance.pk), instance.search_name
+    )
+
+# Update the rating of the branches
+# whenever a rate is created, changed or deleted
+
+
+@receiver(pre_save, sender=models.Rate)
+def load_branch_rating(sender, instance, raw=False, **kwargs):
+    # the rates that were not loaded from the database, or were loaded
+    # without their branch or score, read the stored ones before the update
+    if raw or instance.pk is None or hasattr(instance, '_loaded_rating'):
+        return
+
+    instance._loaded_rating = sender.objects.filter(
+        pk=instance.pk
+    ).values_list('branch_id', 'score').first()
+
+
+@receiver(post_save, sender=models.Rate)
+def update_branch_rating(sender, instance, created, **kwargs):
+    current = (instance.branch_id, instance.score)
+    loaded = getattr(instance, '_loaded_rating', None)
+
+    if created:
+        ratings.apply(instance.branch_id, instance.score, 1)
+    elif loaded is None:
+        ratings.rebuild([instance.branch_id])
+    elif loaded != current:
+        ratings.apply(*loaded, -1)
+        ratings.apply(*current, 1)
+
+    instance._loaded_rating = current
+
+
+@receiver(post_delete, sender=models.Rate)
+def remove_branch_rating(sender, instance, **kwargs):
+    loaded = getattr(
+        instance, '_loaded_rating', (instance.branch_id, instance.score)
+    )
+    ratings.apply(*loaded, -1)
+
+# Update the daily sales rollups
+# whenever an order is created, changed or deleted
+
+
+@receiver(pre_save, sender=models.Order)
+def load_order_sales(sender, instance, raw=False, **kwargs):
+    # the orders that were not loaded from the database, or were loaded
+    # without the fields of their rollup, read the stored ones
+    if raw or instance.pk is None or hasattr(instance, '_loaded_sales'):
+        return
+
+    instance._loaded_sales = sender.objects.filter(
+        pk=instance.pk
+    ).values_list(*sender.sales_fields).first()
+
+
+@receiver(post_save, sender=models.Order)
+def update_daily_sales(sender, instance, created, **kwargs):
+    sales.order_saved(instance, created)
+
+
+@receiver(post_delete, sender=models.Order)
+def remove_daily_sales(sender, instance, **kwargs):
+    sales.order_deleted(instance)
+
+# Free the slots of the table availability
+# whenever an active reservation is deleted
+
+
+@receiver(post_delete, sender=models.Reservation)
+def release_reservation(sender, instance, **kwargs):
+    reservations.release(instance)
+
+# Move the values of the bucketed date fields between the date buckets
+# whenever their rows are created, changed or deleted
+
+
+@receiver(post_save, sender=models.User)
+@receiver(post_save, sender=models.FoodCollection)
+@receiver(post_save, sender=models.CollaborationRequest)
+@receiver(post_save, sender=models.Rate)
+@receiver(post_save, sender=models.Order)
+def update_date_buckets(sender, instance, created, update_fields=None,
+                        **kwargs):
+    buckets.instance_saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=models.User)
+@receiver(post_delete, sender=models.FoodCollection)
+@receiver(post_delete, sender=models.CollaborationRequest)
+@receiver(post_delete, sender=models.Rate)
+@receiver(post_delete, sender=models.Order)
+def remove_date_buckets(sender, instance, **kwargs):
+    buckets.instance_deleted(instance)
+
+# Check the persistent database connections
+# before a request reuses them
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    pooling.checkout()
+
+# Invalidate the cached users whenever they are changed
+# and the cached scopes whenever the staff of a branch is changed
+
+
+@receiver(post_save, sender=models.User)
+@receiver(post_delete, sender=models.User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # a login only writes the last_login, the cached user is still valid
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    accounts.invalidate_users([instance.pk])
+
+
+@receiver(post_save, sender=models.FoodCollection)
+@receiver(post_save, sender=models.Branch)
+def invalidate_saved_scopes(sender, instance, created, **kwargs):
+    scope = tuple(instance.__dict__.get(name) for name in sender.scope_fields)
+    if created or getattr(instance, '_loaded_scope', None) != scope:
+        accounts.invalidate_scopes()
+    instance._loaded_scope = scope
+
+
+@receiver(post_delete, sender=models.FoodCollection)
+@receiver(post_delete, sender=models.Branch)
+def invalidate_deleted_scopes(sender, instance, **kwargs):
+    accounts.invalidate_scopes()
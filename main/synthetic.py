@@ -0,0 +1,541 @@
+# Create the synthetic data generator in this madule
+# a seeded and consistent dataset of the whole application is generated
+# for the load tests, the small tables are written by bulk_create
+# and the orders, their foods and the rates are streamed by COPY
+
+import bisect
+import datetime
+import io
+import random
+import jdatetime
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from . import (
+    accounts, buckets, gazetteer, jalali, models, ratings, sales, search
+)
+from .cache import bump_version
+
+# the password of every generated user
+PASSWORD = getattr(settings, 'SYNTHETIC_PASSWORD', 'foodland')
+
+# the number of rows of every COPY statement
+CHUNK_SIZE = getattr(settings, 'SYNTHETIC_CHUNK_SIZE', 50000)
+
+FIRST_NAMES = (
+    "علی", "محمد", "حسین", "رضا", "مهدی", "امیر", "سارا", "زهرا",
+    "فاطمه", "مریم", "نرگس", "لیلا", "حمید", "کاوه", "نازنین", "پریسا",
+)
+
+LAST_NAMES = (
+    "احمدی", "محمدی", "حسینی", "رضایی", "کریمی", "موسوی", "جعفری",
+    "نادعلی", "صادقی", "رحیمی", "اکبری", "قاسمی", "طاهری", "یوسفی",
+)
+
+FOOD_NAMES = (
+    "چلو کباب کوبیده", "چلو جوجه کباب", "قورمه سبزی", "قیمه", "زرشک پلو با مرغ",
+    "باقالی پلو با ماهیچه", "کشک بادمجان", "میرزا قاسمی", "آش رشته", "دیزی",
+    "فسنجان", "سالاد شیرازی", "دوغ", "پیتزا", "همبرگر", "ساندویچ الویه",
+)
+
+RATE_TITLES = ("عالی", "خوب", "معمولی", "کیفیت غذا", "برخورد پرسنل", "سرعت")
+
+RATE_TEXTS = (
+    "غذا گرم و تازه بود", "زمان انتظار طولانی بود", "برخورد پرسنل خوب بود",
+    "قیمت ها مناسب است", "حجم غذا کم بود", "دوباره سفارش می دهم",
+)
+
+# the weights of the jalali weekdays from saturday, the weekend is busier
+WEEKDAY_WEIGHTS = (1.0, 0.9, 0.9, 0.95, 1.0, 1.3, 1.4)
+
+# the weights of the scores from 1 to 5, most customers are satisfied
+SCORE_WEIGHTS = (0.05, 0.07, 0.18, 0.35, 0.35)
+
+# the orders are placed between 11 and 23 of the local time
+OPENING_SECONDS = (11 * 3600, 23 * 3600)
+
+
+def column(model, name):
+    return model._meta.get_field(name).column
+
+
+def next_numbers(model, field, width, count):
+    """
+    Returns count unique digit strings of the width
+    after the largest one of the field
+    """
+
+    current = model.objects.filter(
+        **{field + '__regex': r'^\d{%d}$' % width}
+    ).aggregate(largest=Max(field))['largest']
+
+    start = int(current) + 1 if current else 10 ** (width - 1)
+    if start + count > 10 ** width:
+        raise ValidationError(
+            "اعداد یکتای {0} کافی نیستند".format(field), code="اعداد ناکافی"
+        )
+
+    return ['%0*d' % (width, number) for number in range(start, start + count)]
+
+
+def copy(model, columns, lines):
+    """
+    Streams the csv lines into the table of the model by COPY
+    """
+
+    sql = "COPY {0} ({1}) FROM STDIN WITH (FORMAT csv)".format(
+        connection.ops.quote_name(model._meta.db_table),
+        ", ".join(connection.ops.quote_name(name) for name in columns)
+    )
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, io.StringIO("".join(lines)))
+
+
+class Generator:
+    """
+    Generates the rows of every model from one seed, the popularity
+    of the branches follows a zipf like skew and the orders are spread
+    over the jalali days with busier weekends and a growing trend
+    """
+
+    def __init__(self, seed=1, prefix=None, customers=10000, collections=50,
+                 branches=4, foods=30, tables=15, orders=100000, rates=20000,
+                 days=365, skew=1.1, chunk_size=CHUNK_SIZE, log=None):
+        self.random = random.Random(seed)
+        self.prefix = prefix or "s{0}-".format(seed)
+        self.counts = {
+            'customers': customers, 'collections': collections,
+            'branches': branches, 'foods': foods, 'tables': tables,
+            'orders': orders, 'rates': rates,
+        }
+        self.skew = skew
+        self.chunk_size = chunk_size
+        self.log = log or (lambda message: None)
+
+        self.last_day = jdatetime.date.today() - jdatetime.timedelta(days=1)
+        self.first_day = self.last_day - jdatetime.timedelta(days=days - 1)
+        self.days = [
+            self.first_day + jdatetime.timedelta(days=offset)
+            for offset in range(days)
+        ]
+
+    def check(self):
+        if self.counts['orders'] > self.counts['customers'] * len(self.days):
+            raise ValidationError(
+                "هر مشتری در هر روز فقط یک سفارش دارد، "
+                "تعداد مشتریان یا روزها را بیشتر کنید",
+                code="سفارش تکراری"
+            )
+
+        if models.User.objects.filter(
+            username__startswith=self.prefix
+        ).exists():
+            raise ValidationError(
+                "کاربران {0} قبلا ساخته شده اند".format(self.prefix),
+                code="پیشوند تکراری"
+            )
+
+    def places(self):
+        """
+        Returns the (province, city) pairs, the gazetteer is created
+        when the database has no cities
+        """
+
+        cities = list(models.City.objects.values_list('province_id', 'pk'))
+        if cities:
+            return cities
+
+        provinces = models.Province.objects.bulk_create([
+            models.Province(name="استان {0}".format(number))
+            for number in range(1, 32)
+        ])
+        created = models.City.objects.bulk_create([
+            models.City(name="شهر {0}".format(number), province=province)
+            for province in provinces for number in range(1, 6)
+        ])
+        gazetteer.invalidate()
+
+        return [(city.province_id, city.pk) for city in created]
+
+    def staff(self, user_type, count, label):
+        password = self.password
+        return models.User.objects.bulk_create([
+            models.User(
+                username="{0}{1}{2}".format(self.prefix, label, number),
+                user_type=user_type, password=password,
+                date_joined=self.first_day, last_login=self.random_datetime(),
+            )
+            for number in range(count)
+        ])
+
+    def random_datetime(self, day=None):
+        day = day or self.random.choice(self.days)
+        return jalali.day_start(day) + datetime.timedelta(
+            seconds=self.random.randint(*OPENING_SECONDS)
+        )
+
+    def generate_customers(self, places):
+        count = self.counts['customers']
+
+        persons = models.Person.objects.bulk_create([
+            models.Person(
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                national_code=code, gender=self.random.choice(("مرد", "زن")),
+            )
+            for code in next_numbers(models.Person, 'national_code', 10, count)
+        ], batch_size=5000)
+
+        users = models.User.objects.bulk_create([
+            models.User(
+                username="{0}c{1}".format(self.prefix, number),
+                user_type=1, password=self.password, person=person,
+                date_joined=self.random.choice(self.days),
+                last_login=self.random_datetime(),
+            )
+            for number, person in enumerate(persons)
+        ], batch_size=5000)
+
+        phones = next_numbers(models.Customer, 'phone_number', 9, count)
+        customers = []
+        for user, phone in zip(users, phones):
+            province_id, city_id = self.random.choice(places)
+            customers.append(models.Customer(
+                user=user, phone_number=phone,
+                province_id=province_id, city_id=city_id,
+            ))
+        models.Customer.objects.bulk_create(customers, batch_size=5000)
+
+        return [user.pk for user in users]
+
+    def generate_branches(self, places):
+        collections_count = self.counts['collections']
+        branches_count = collections_count * self.counts['branches']
+
+        requests = models.CollaborationRequest.objects.bulk_create([
+            models.CollaborationRequest(
+                date=self.first_day, applicant_firstname=self.random.choice(FIRST_NAMES),
+                applicant_lastname=self.random.choice(LAST_NAMES),
+                applicant_nationalcode=code,
+                fc_name="مجموعه {0}".format(number),
+                guild_id='%012d' % self.random.randrange(10 ** 11, 10 ** 12),
+                job_category="رستوران",
+            )
+            for number, code in enumerate(next_numbers(
+                models.CollaborationRequest, 'applicant_nationalcode', 10,
+                collections_count
+            ))
+        ])
+
+        managers = self.staff(2, collections_count, 'm')
+        collections = models.FoodCollection.objects.bulk_create(
+            search.fill_search_names([
+                models.FoodCollection(
+                    full_name="{0} {1}".format(
+                        self.random.choice(LAST_NAMES), request.fc_name
+                    ),
+                    guild_id=request.guild_id,
+                    expiration_date=self.last_day + jdatetime.timedelta(days=365),
+                    collaborationRequest=request, manager=manager,
+                )
+                for request, manager in zip(requests, managers)
+            ])
+        )
+
+        branch_managers = self.staff(3, branches_count, 'bm')
+        cashiers = self.staff(4, branches_count, 'bc')
+        branches = models.Branch.objects.bulk_create(search.fill_search_names([
+            models.Branch(
+                name="{0} شعبه {1}".format(collection.full_name, number + 1),
+                foodCollection=collection,
+                branchManager=branch_managers[index],
+                branchCashier=cashiers[index],
+            )
+            for index, (collection, number) in enumerate(
+                (collection, number) for collection in collections
+                for number in range(self.counts['branches'])
+            )
+        ]))
+
+        phones = next_numbers(models.CallContact, 'phoneNumber1', 8, branches_count)
+        mobiles = next_numbers(models.CallContact, 'mobileNumber', 9, branches_count)
+        models.CallContact.objects.bulk_create([
+            models.CallContact(
+                branch=branch, phoneNumber1=phone, mobileNumber=mobile
+            )
+            for branch, phone, mobile in zip(branches, phones, mobiles)
+        ])
+
+        locations = []
+        for branch in branches:
+            province_id, city_id = self.random.choice(places)
+            locations.append(models.Location(
+                branch=branch, province_id=province_id, city_id=city_id,
+                address="{0}خیابان {1} پلاک {2}".format(
+                    self.prefix, self.random.choice(LAST_NAMES), branch.pk
+                ),
+            ))
+        models.Location.objects.bulk_create(locations)
+
+        search.refresh_vectors(models.FoodCollection.objects.filter(
+            pk__in=[collection.pk for collection in collections]
+        ))
+        search.refresh_vectors(models.Branch.objects.filter(
+            pk__in=[branch.pk for branch in branches]
+        ))
+
+        return [branch.pk for branch in branches]
+
+    def generate_menus(self, branch_ids):
+        """
+        Returns the (food ids, prices, table ids) of every branch
+        """
+
+        foods = models.Food.objects.bulk_create(search.fill_search_names([
+            models.Food(
+                name=self.random.choice(FOOD_NAMES), branch_id=branch_id,
+                price=self.random.randrange(50, 800) * 1000,
+            )
+            for branch_id in branch_ids
+            for number in range(self.counts['foods'])
+        ]), batch_size=5000)
+        search.refresh_vectors(models.Food.objects.filter(
+            pk__in=[food.pk for food in foods]
+        ))
+
+        tables = models.Table.objects.bulk_create([
+            models.Table(
+                name="میز {0}".format(number + 1), branch_id=branch_id,
+                capacity=self.random.choice((2, 2, 4, 4, 4, 6, 8)),
+            )
+            for branch_id in branch_ids
+            for number in range(self.counts['tables'])
+        ], batch_size=5000)
+
+        menus = {branch_id: ([], [], []) for branch_id in branch_ids}
+        for food in foods:
+            menus[food.branch_id][0].append(food.pk)
+            menus[food.branch_id][1].append(food.price)
+        for table in tables:
+            menus[table.branch_id][2].append(table.pk)
+
+        return menus
+
+    def popularity(self, branch_ids):
+        """
+        Returns the cumulative weights of the shuffled branches,
+        the weight of the branch of rank n is 1 / n ** skew
+        """
+
+        ranked = list(branch_ids)
+        self.random.shuffle(ranked)
+
+        cumulative, total = [], 0.0
+        for rank in range(1, len(ranked) + 1):
+            total += 1.0 / rank ** self.skew
+            cumulative.append(total)
+
+        return ranked, cumulative
+
+    def orders_per_day(self):
+        """
+        Returns the number of orders of every day, a day has at most
+        one order for every customer
+        """
+
+        weights = [
+            WEEKDAY_WEIGHTS[day.weekday()] * (0.7 + 0.6 * index / len(self.days))
+            for index, day in enumerate(self.days)
+        ]
+        total = sum(weights)
+
+        counts, carried = [], 0.0
+        for weight in weights:
+            carried += self.counts['orders'] * weight / total
+            count = min(int(round(carried)), self.counts['customers'])
+            counts.append(count)
+            carried -= count
+
+        # the rounding and the capped days are given to the quiet days
+        missing = self.counts['orders'] - sum(counts)
+        for index in sorted(range(len(counts)), key=counts.__getitem__):
+            if missing <= 0:
+                break
+            extra = min(missing, self.counts['customers'] - counts[index])
+            counts[index] += extra
+            missing -= extra
+
+        return counts
+
+    def generate_orders(self, customer_ids, branches, menus):
+        ranked, cumulative = branches
+        top = cumulative[-1]
+        through = models.Order.foods.through
+        order_columns = [
+            'id', column(models.Order, 'datetime'), column(models.Order, 'title'),
+            column(models.Order, 'customer'), column(models.Order, 'order_date'),
+            column(models.Order, 'branch'), column(models.Order, 'table'),
+            column(models.Order, 'total_price'),
+        ]
+        food_columns = [column(through, 'order'), column(through, 'food')]
+
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE {0} IN SHARE ROW EXCLUSIVE MODE".format(
+                connection.ops.quote_name(models.Order._meta.db_table)
+            ))
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM {0}".format(
+                connection.ops.quote_name(models.Order._meta.db_table)
+            ))
+            order_id = cursor.fetchone()[0]
+
+        rand = self.random.random
+        randint = self.random.randint
+        orders, foods, written = [], [], 0
+
+        for day, count in zip(self.days, self.orders_per_day()):
+            day_start = jalali.day_start(day)
+            order_date = day.togregorian().isoformat()
+
+            for customer_id in self.random.sample(customer_ids, count):
+                order_id += 1
+                branch_id = ranked[bisect.bisect(cumulative, rand() * top)]
+                food_ids, prices, table_ids = menus[branch_id]
+
+                chosen = self.random.sample(
+                    range(len(food_ids)), min(randint(1, 4), len(food_ids))
+                )
+                title = 2 if table_ids and rand() < 0.6 else 1
+                table_id = self.random.choice(table_ids) if title == 2 else ''
+                placed = day_start + datetime.timedelta(
+                    seconds=randint(*OPENING_SECONDS)
+                )
+
+                orders.append("{0},{1},{2},{3},{4},{5},{6},{7}\n".format(
+                    order_id, placed.isoformat(), title, customer_id,
+                    order_date, branch_id, table_id,
+                    sum(prices[index] for index in chosen)
+                ))
+                foods.extend(
+                    "{0},{1}\n".format(order_id, food_ids[index])
+                    for index in chosen
+                )
+
+                if len(orders) >= self.chunk_size:
+                    copy(models.Order, order_columns, orders)
+                    copy(through, food_columns, foods)
+                    written += len(orders)
+                    self.log("{0} orders are written".format(written))
+                    orders, foods = [], []
+
+        if orders:
+            copy(models.Order, order_columns, orders)
+            copy(through, food_columns, foods)
+            written += len(orders)
+
+        # the ids were given explicitly, so the sequence is moved after them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [models.Order]
+            ):
+                cursor.execute(sql)
+
+        return written
+
+    def generate_rates(self, customer_ids, branches):
+        ranked, cumulative = branches
+        top = cumulative[-1]
+        rate_columns = [
+            column(models.Rate, name) for name in (
+                'datetime', 'title', 'text', 'customer', 'branch', 'score'
+            )
+        ]
+        scores = list(range(1, 6))
+        score_weights = list(SCORE_WEIGHTS)
+
+        rates, written = [], 0
+        for number in range(self.counts['rates']):
+            rates.append('{0},{1},"{2}",{3},{4},{5}\n'.format(
+                self.random_datetime().isoformat(),
+                self.random.choice(RATE_TITLES), self.random.choice(RATE_TEXTS),
+                self.random.choice(customer_ids),
+                ranked[bisect.bisect(cumulative, self.random.random() * top)],
+                self.random.choices(scores, score_weights)[0],
+            ))
+
+            if len(rates) >= self.chunk_size:
+                copy(models.Rate, rate_columns, rates)
+                written += len(rates)
+                self.log("{0} rates are written".format(written))
+                rates = []
+
+        if rates:
+            copy(models.Rate, rate_columns, rates)
+            written += len(rates)
+
+        return written
+
+    def rebuild(self):
+        """
+        Rebuilds the denormalized data that the signals
+        of bulk_create and COPY did not maintain
+        """
+
+        for model in (models.User, models.FoodCollection,
+                      models.CollaborationRequest, models.Rate, models.Order):
+            buckets.rebuild(model)
+        sales.rebuild(self.first_day, self.last_day)
+        ratings.rebuild()
+
+        def bump():
+            bump_version('api', 'branches')
+            bump_version('api', 'collections')
+
+        accounts.invalidate_scopes()
+        transaction.on_commit(bump)
+
+    def generate(self):
+        """
+        Generates the whole dataset in one transaction
+        and returns the numbers of the written rows
+        """
+
+        self.check()
+        self.password = make_password(PASSWORD)
+
+        with transaction.atomic():
+            # the foreign keys are checked at the end of every COPY,
+            # the deferred checks of millions of rows would queue until commit
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+            places = self.places()
+            customer_ids = self.generate_customers(places)
+            self.log("{0} customers are written".format(len(customer_ids)))
+
+            branch_ids = self.generate_branches(places)
+            menus = self.generate_menus(branch_ids)
+            self.log("{0} branches are written".format(len(branch_ids)))
+
+            branches = self.popularity(branch_ids)
+            orders = self.generate_orders(customer_ids, branches, menus)
+            rates = self.generate_rates(customer_ids, branches)
+
+            self.log("the buckets, the sales and the ratings are rebuilding")
+            self.rebuild()
+
+        # the planner statistics of the loaded tables
+        with connection.cursor() as cursor:
+            for model in (models.Order, models.Order.foods.through,
+                          models.Rate, models.User, models.Customer):
+                cursor.execute("ANALYZE {0}".format(
+                    connection.ops.quote_name(model._meta.db_table)
+                ))
+
+        return {
+            'customers': len(customer_ids), 'branches': len(branch_ids),
+            'orders': orders, 'rates': rates,
+        }
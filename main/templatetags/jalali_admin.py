@@ -0,0 +1,117 @@
+# Create the template tags of the admin pages in this madule
+# the date hierarchy is drilled down by the jalali calendar
+# and its choices are read from the date buckets
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+import jdatetime
+from .. import buckets
+
+register = template.Library()
+
+
+def month_title(year, month):
+    return "{0} {1}".format(jdatetime.date.j_months_fa[month - 1], year)
+
+
+def jalali_date_hierarchy(cl):
+    """
+    Display the jalali date hierarchy of the changelist
+    from the counts of the date buckets
+    """
+
+    field_name = cl.date_hierarchy
+    field = cl.model._meta.get_field(field_name)
+
+    # the fields without buckets are drilled down by the base hierarchy
+    if not buckets.is_bucketed(field):
+        return date_hierarchy(cl)
+
+    year_field, month_field, day_field = (
+        '%s__%s' % (field_name, part) for part in buckets.HIERARCHY_PARTS
+    )
+    field_generic = '%s__' % field_name
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    def link(filters):
+        return cl.get_query_string(filters, [field_generic])
+
+    def choice(title, count, filters):
+        return {
+            'link': link(filters),
+            'title': "{0} ({1})".format(title, count),
+        }
+
+    # select appropriate start level
+    if not (year_lookup or month_lookup or day_lookup):
+        years = buckets.counts(cl.model, field_name)
+        if len(years) == 1:
+            year_lookup = years[0][0]
+            months = buckets.counts(cl.model, field_name, year_lookup)
+            if len(months) == 1:
+                month_lookup = months[0][0]
+
+    if year_lookup and month_lookup and day_lookup:
+        year, month = int(year_lookup), int(month_lookup)
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year, month_field: month}),
+                'title': month_title(year, month),
+            },
+            'choices': [{
+                'title': "{0} {1}".format(
+                    day_lookup, jdatetime.date.j_months_fa[month - 1]
+                ),
+            }],
+        }
+    elif year_lookup and month_lookup:
+        year, month = int(year_lookup), int(month_lookup)
+        days = buckets.counts(cl.model, field_name, year, month)
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year}),
+                'title': str(year),
+            },
+            'choices': [choice(
+                "{0} {1}".format(day, jdatetime.date.j_months_fa[month - 1]),
+                count, {year_field: year, month_field: month, day_field: day}
+            ) for day, count in days],
+        }
+    elif year_lookup:
+        year = int(year_lookup)
+        months = buckets.counts(cl.model, field_name, year)
+        return {
+            'show': True,
+            'back': {
+                'link': link({}),
+                'title': 'همه تاریخ ها',
+            },
+            'choices': [choice(
+                month_title(year, month), count,
+                {year_field: year, month_field: month}
+            ) for month, count in months],
+        }
+    else:
+        years = buckets.counts(cl.model, field_name)
+        return {
+            'show': True,
+            'back': None,
+            'choices': [choice(
+                str(year), count, {year_field: year}
+            ) for year, count in years],
+        }
+
+
+@register.tag(name='jalali_date_hierarchy')
+def jalali_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token,
+        func=jalali_date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
@@ -0,0 +1,101 @@
+# Create the testing helpers in this madule
+# they are mixed into the TestCase classes of the tests
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.contrib import admin
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from . import aio
+from .middleware import DEFAULT_QUERY_BUDGET
+
+
+class QueryBudgetTestMixin:
+    """
+    Assertions that bound the number of queries of a block or a page
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        self.checkQueryBudget(context.captured_queries, budget)
+
+    @contextmanager
+    def assertPoolQueryBudget(self, budget, using='default'):
+        """
+        Bounds the queries of the async views, they run their queries
+        in the thread of the pool of AsyncPoolTestMixin and the middlewares
+        in the thread of the test
+        """
+
+        def start():
+            context = CaptureQueriesContext(connections[using])
+            context.__enter__()
+            return context
+
+        pooled = aio.pool.submit(start).result()
+        try:
+            with CaptureQueriesContext(connections[using]) as context:
+                yield context
+        finally:
+            aio.pool.submit(pooled.__exit__, None, None, None).result()
+
+        self.checkQueryBudget(
+            context.captured_queries + pooled.captured_queries, budget
+        )
+
+    def checkQueryBudget(self, queries, budget):
+        if len(queries) > budget:
+            self.fail("{0} queries were run, the budget is {1}:\n{2}".format(
+                len(queries), budget,
+                '\n'.join(query['sql'] for query in queries)
+            ))
+
+    def assertChangelistWithinBudget(self, model, budget=None, client=None):
+        """
+        Requests the admin changelist of the model and checks
+        that it is within the query_budget of its ModelAdmin,
+        the client must be logged in as an admin
+        """
+
+        model_admin = admin.site._registry[model]
+
+        if budget is None:
+            budget = getattr(model_admin, 'query_budget', DEFAULT_QUERY_BUDGET)
+
+        url = reverse('admin:{0}_{1}_changelist'.format(
+            model._meta.app_label, model._meta.model_name
+        ))
+
+        with self.assertQueryBudget(budget):
+            response = (client or self.client).get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertAllChangelistsWithinBudget(self, client=None):
+        for model in admin.site._registry:
+            with self.subTest(model=model.__name__):
+                self.assertChangelistWithinBudget(model, client=client)
+
+
+class AsyncPoolTestMixin:
+    """
+    Runs the database work of the async views in one thread per test,
+    the thread has its own connection so it does not see the transaction
+    of a TestCase and the tests are TransactionTestCase
+    """
+
+    def setUp(self):
+        super().setUp()
+        self._pool = aio.pool
+        aio.pool = ThreadPoolExecutor(max_workers=1)
+
+    def tearDown(self):
+        aio.pool.submit(connections.close_all).result()
+        aio.pool.shutdown()
+        aio.pool = self._pool
+        super().tearDown()
@@ -1,3 +1,1232 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+from unittest import mock
+import jdatetime
+from django.apps import apps
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.backends.postgresql import base
+from django.db.transaction import TransactionManagementError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from . import (
+    accounts, api, availability, buckets, exports, index_audit, jalali,
+    logins, menu, menu_import, models, ordering, pooling, ratings, reservations,
+    routers, sales, scoping, search
+)
+from .testing import AsyncPoolTestMixin, QueryBudgetTestMixin
 
-# Create your tests here.
+# Create the tests of the application in this madule
+
+
+class WorldMixin:
+    """
+    Creates a food collection with its staff and branches,
+    a customer and a few foods and tables of every branch
+    """
+
+    branches_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_world()
+
+    @classmethod
+    def create_world(cls):
+        cls.province = models.Province.objects.create(name="تهران")
+        cls.city = models.City.objects.create(name="تهران", province=cls.province)
+
+        cls.customer_user = models.User.objects.create_user("customer", 1, "pw")
+        cls.customer = models.Customer.objects.create(
+            user=cls.customer_user, province=cls.province, city=cls.city,
+            phone_number="912345678"
+        )
+
+        cls.admin_user = models.User.objects.create_superuser("admin", "pw")
+        cls.manager = models.User.objects.create_user("manager", 2, "pw")
+
+        request = models.CollaborationRequest.objects.create(
+            applicant_firstname="علی", applicant_lastname="احمدی",
+            applicant_nationalcode="1234567890", fc_name="کافه",
+            guild_id="123456789012", job_category="رستوران"
+        )
+        cls.collection = models.FoodCollection.objects.create(
+            full_name="کافه", guild_id="123456789012",
+            expiration_date=jdatetime.date.today() + jdatetime.timedelta(days=365),
+            collaborationRequest=request, manager=cls.manager
+        )
+
+        cls.branches, cls.foods, cls.tables = [], [], []
+        for number in range(cls.branches_count):
+            branch = models.Branch.objects.create(
+                name="شعبه {0}".format(number), foodCollection=cls.collection,
+                branchManager=models.User.objects.create_user(
+                    "branch_manager{0}".format(number), 3, "pw"
+                ),
+                branchCashier=models.User.objects.create_user(
+                    "cashier{0}".format(number), 4, "pw"
+                ),
+            )
+            cls.branches.append(branch)
+            cls.foods += [
+                models.Food.objects.create(
+                    name="غذا {0}".format(food), price=1000 * (food + 1),
+                    branch=branch
+                )
+                for food in range(2)
+            ]
+            cls.tables.append(models.Table.objects.create(
+                name="میز {0}".format(number), capacity=4, branch=branch
+            ))
+
+        cls.branch = cls.branches[0]
+
+
+def local(hour, days=1):
+    """
+    Returns an aware datetime of the hour of a day after today
+    """
+
+    day = timezone.localdate() + datetime.timedelta(days=days)
+    return timezone.make_aware(datetime.datetime.combine(
+        day, datetime.time(hour)
+    ))
+
+
+class JalaliTests(SimpleTestCase):
+
+    # the first minutes of nowruz 1403 in tehran
+    nowruz = datetime.datetime(
+        2024, 3, 19, 20, 45, tzinfo=datetime.timezone.utc
+    )
+
+    def test_local_date_is_taken_in_the_local_time_zone(self):
+        self.assertEqual(
+            jalali.local_date(self.nowruz), jdatetime.date(1403, 1, 1)
+        )
+        self.assertEqual(
+            jalali.as_date(self.nowruz.date()), jdatetime.date(1402, 12, 29)
+        )
+
+    def test_as_gregorian(self):
+        value = jalali.local_datetime(self.nowruz)
+
+        self.assertEqual((value.year, value.month, value.day), (1403, 1, 1))
+        self.assertEqual(jalali.as_gregorian(value), self.nowruz)
+        self.assertTrue(timezone.is_aware(
+            jalali.as_gregorian(datetime.datetime(2024, 3, 20, 0, 15))
+        ))
+
+    def test_format_datetimes(self):
+        values = [self.nowruz, None, self.nowruz + datetime.timedelta(hours=1)]
+
+        self.assertEqual(jalali.format_datetimes(values), [
+            "1403/01/01 - 00:15:00", None, "1403/01/01 - 01:15:00",
+        ])
+        self.assertEqual(
+            jalali.format_datetime(self.nowruz), "1403/01/01 - 00:15:00"
+        )
+        self.assertIsNone(jalali.format_date(None))
+
+    def test_bounds(self):
+        self.assertEqual(jalali.bounds(1402, 12), (
+            jdatetime.date(1402, 12, 1), jdatetime.date(1403, 1, 1)
+        ))
+        self.assertEqual(
+            jalali.bounds(1402, 12, 29)[1], jdatetime.date(1403, 1, 1)
+        )
+        with self.assertRaises(ValueError):
+            jalali.bounds(1402, 13)
+
+
+class ReservationTests(WorldMixin, TestCase):
+
+    def test_book_rejects_overlap(self):
+        table = self.tables[0]
+        reservations.book(table, local(12), local(14), 2)
+
+        with self.assertRaises(ValidationError):
+            reservations.book(table, local(13), local(15), 2)
+
+        reservations.book(table, local(14), local(16), 2)
+        self.assertEqual(models.Reservation.objects.active().count(), 2)
+
+    def test_clean_locks_the_table(self):
+        table = self.tables[0]
+        reservations.book(table, local(12), local(14), 2)
+
+        reservation = models.Reservation(
+            table=table, party_size=2, start=local(13), end=local(15)
+        )
+        with CaptureQueriesContext(connection) as context:
+            with self.assertRaises(ValidationError):
+                reservation.clean()
+
+        self.assertTrue(any(
+            'FOR UPDATE' in query['sql'] for query in context.captured_queries
+        ))
+
+    def test_capacity(self):
+        with self.assertRaises(ValidationError):
+            reservations.book(self.tables[0], local(12), local(14), 5)
+
+    def test_lock_outside_a_transaction(self):
+        reservation = models.Reservation(
+            table=self.tables[0], party_size=2, start=local(12), end=local(14)
+        )
+
+        with mock.patch.object(
+            connection, 'in_atomic_block', False
+        ), self.assertRaises(TransactionManagementError):
+            reservations.lock_table(reservation)
+
+    def test_delete_frees_the_table(self):
+        reservation = reservations.book(self.tables[0], local(12), local(14), 2)
+
+        reservation.delete()
+
+        self.assertEqual(
+            availability.free_tables(self.branch, 2, local(12), local(14)),
+            [{'id': self.tables[0].pk, 'name': self.tables[0].name,
+              'capacity': 4}]
+        )
+
+    def test_delete_a_table_with_reservations(self):
+        table = models.Table.objects.get(pk=self.tables[0].pk)
+        reservations.book(table, local(12), local(14), 2)
+
+        table.delete()
+
+        self.assertFalse(models.TableAvailability.objects.filter(
+            table_id=self.tables[0].pk
+        ).exists())
+
+
+class FreeTablesTests(AsyncPoolTestMixin, WorldMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_world()
+
+    def url(self):
+        return reverse('free_tables', kwargs={'branch_id': self.branch.pk})
+
+    def test_naive_and_aware_bounds(self):
+        start = local(12)
+        response = self.client.get(self.url(), {
+            'start': start.replace(tzinfo=None).isoformat(),
+            'end': (start + datetime.timedelta(hours=2)).isoformat(),
+            'party': 2,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['tables']), 1)
+
+    def test_reserved_table_is_not_free(self):
+        reservations.book(self.tables[0], local(12), local(14), 2)
+        response = self.client.get(self.url(), {
+            'start': local(13).isoformat(), 'end': local(15).isoformat(),
+        })
+
+        self.assertEqual(response.json()['tables'], [])
+
+    def test_bad_interval(self):
+        response = self.client.get(self.url(), {
+            'start': local(14).isoformat(), 'end': local(12).isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(WorldMixin, TestCase):
+
+    def test_arabic_letters_and_prefixes(self):
+        food = models.Food.objects.create(
+            name="کباب کوبیده", price=5000, branch=self.branch
+        )
+
+        result = search.search("كباب كوب")
+        self.assertEqual([row['id'] for row in result['foods']], [food.pk])
+
+    def test_rename_with_update_fields(self):
+        food = self.foods[0]
+        food.name = "جوجه کباب"
+        food.save(update_fields=['name'])
+
+        food.refresh_from_db()
+        self.assertEqual(food.search_name, search.normalize("جوجه کباب"))
+        self.assertEqual(
+            [row['id'] for row in search.search("جوجه")['foods']], [food.pk]
+        )
+
+
+class RatingTests(WorldMixin, TestCase):
+
+    def rate(self, branch, score):
+        return models.Rate.objects.create(
+            title="نظر", text="متن", customer=self.customer,
+            branch=branch, score=score
+        )
+
+    def assertRatingsRebuilt(self):
+        stored = {
+            rating.branch_id: (rating.count, rating.total)
+            for rating in models.BranchRating.objects.filter(count__gt=0)
+        }
+        ratings.rebuild()
+        rebuilt = {
+            rating.branch_id: (rating.count, rating.total)
+            for rating in models.BranchRating.objects.all()
+        }
+        self.assertEqual(stored, rebuilt)
+
+    def test_create_change_delete(self):
+        rate = self.rate(self.branch, 5)
+        self.rate(self.branch, 3)
+        self.assertEqual(ratings.summary(self.branch.pk)['mean'], 4)
+
+        rate.score = 1
+        rate.save()
+        rate = models.Rate.objects.get(pk=rate.pk)
+        rate.branch = self.branches[1]
+        rate.save()
+        self.assertRatingsRebuilt()
+
+        rate.delete()
+        self.assertRatingsRebuilt()
+
+    def test_move_an_instance_that_was_not_loaded(self):
+        rate = self.rate(self.branch, 5)
+
+        models.Rate(
+            pk=rate.pk, title="نظر", text="متن", customer=self.customer,
+            branch=self.branches[1], score=2, datetime=rate.datetime
+        ).save()
+        self.assertRatingsRebuilt()
+
+        moved = models.Rate.objects.only('pk', 'title').get(pk=rate.pk)
+        moved.branch = self.branch
+        moved.save()
+        self.assertRatingsRebuilt()
+
+
+class ExportTests(WorldMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.orders = []
+        for day in range(3):
+            placed = timezone.now() - datetime.timedelta(days=day + 1)
+            order = models.Order.objects.create(
+                datetime=placed, order_date=jalali.local_date(placed),
+                title=1, customer=cls.customer, branch=cls.branch
+            )
+            order.foods.set(cls.foods[:day + 1])
+            cls.orders.append(order)
+
+    def test_jsonl_in_chunks(self):
+        lines = list(exports.export(
+            'orders', models.Order.objects.all(), 'jsonl', chunk_size=2
+        ))
+        rows = [json.loads(line) for line in lines]
+
+        self.assertEqual(
+            [row['id'] for row in rows],
+            sorted(order.pk for order in self.orders)
+        )
+        self.assertEqual(
+            {row['id']: row['foods'] for row in rows},
+            {order.pk: day + 1 for day, order in enumerate(self.orders)}
+        )
+        self.assertEqual(rows[0]['customer'], self.customer_user.username)
+
+    def test_csv_action_streams_the_selected_rows(self):
+        self.client.force_login(self.admin_user)
+
+        response = self.client.post(reverse('admin:main_order_changelist'), {
+            'action': 'exportCsv',
+            '_selected_action': [order.pk for order in self.orders[:2]],
+        })
+
+        self.assertTrue(response.streaming)
+        self.assertIn('orders-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(
+            lines[0].startswith('\ufeff' + exports.ORDER_TITLES['id'])
+        )
+        self.assertEqual(len(lines), 3)
+
+
+class MenuTests(WorldMixin, TestCase):
+
+    def test_moved_food_invalidates_both_menus(self):
+        food = models.Food.objects.only('pk', 'name').get(pk=self.foods[0].pk)
+        food.branch = self.branches[1]
+
+        with mock.patch.object(menu, 'invalidate') as invalidate:
+            food.save()
+
+        self.assertEqual(
+            {call.args[0] for call in invalidate.call_args_list},
+            {branch.pk for branch in self.branches}
+        )
+
+
+class SalesTests(WorldMixin, TestCase):
+
+    def rollups(self):
+        return {
+            (row.branch_id, row.day, row.order_type): (row.orders, row.revenue)
+            for row in models.DailySales.objects.filter(orders__gt=0)
+        }
+
+    def assertSalesRebuilt(self, day):
+        stored = self.rollups()
+        sales.rebuild(day, day)
+        self.assertEqual(stored, self.rollups())
+
+    def test_create_change_delete(self):
+        placed = timezone.now()
+        day = jalali.local_date(placed)
+        order = models.Order.objects.create(
+            datetime=placed, order_date=day, title=1,
+            customer=self.customer, branch=self.branch
+        )
+        order.foods.set(self.foods[:2])
+
+        self.assertEqual(self.rollups(), {(self.branch.pk, day, 1): (1, 3000)})
+        self.assertSalesRebuilt(day)
+
+        order.foods.remove(self.foods[0])
+        order.branch = self.branches[1]
+        order.save()
+
+        self.assertEqual(
+            self.rollups(), {(self.branches[1].pk, day, 1): (1, 2000)}
+        )
+        self.assertSalesRebuilt(day)
+
+        order.delete()
+        self.assertEqual(self.rollups(), {})
+
+    def order(self, placed, branch):
+        return models.Order.objects.create(
+            datetime=placed, order_date=jalali.local_date(placed), title=1,
+            customer=self.customer, branch=branch, total_price=1000
+        )
+
+    def test_save_a_deferred_order(self):
+        placed = timezone.now()
+        order = self.order(placed, self.branch)
+
+        deferred = models.Order.objects.only('pk', 'title').get(pk=order.pk)
+        deferred.title = 2
+        deferred.save()
+
+        day = jalali.local_date(placed)
+        self.assertEqual(self.rollups(), {(self.branch.pk, day, 2): (1, 1000)})
+        self.assertSalesRebuilt(day)
+
+    def test_move_an_order_that_was_not_loaded(self):
+        placed = timezone.now()
+        moved = placed - datetime.timedelta(days=1)
+        order = self.order(placed, self.branch)
+
+        models.Order.objects.defer('branch', 'datetime').get(
+            pk=order.pk
+        ).save()
+        order = models.Order(
+            pk=order.pk, datetime=moved, title=1, customer=self.customer,
+            branch=self.branches[1], total_price=1000
+        )
+        order.save()
+
+        self.assertEqual(self.rollups(), {
+            (self.branches[1].pk, jalali.local_date(moved), 1): (1, 1000)
+        })
+
+
+class MenuImportTests(WorldMixin, TestCase):
+
+    def upload(self, text, **data):
+        return self.upload_bytes(text.encode('utf-8'), **data)
+
+    def upload_bytes(self, content, name="menu.csv", **data):
+        self.client.force_login(self.branch.branchManager)
+        file = SimpleUploadedFile(name, content)
+        return self.client.post(
+            reverse('admin:main_food_import'), dict(data, file=file)
+        )
+
+    def test_scoped_manager_imports_own_branch(self):
+        response = self.upload(
+            "name,price,branch\nپیتزا,12000,{0}\n".format(self.branch.pk)
+        )
+
+        self.assertRedirects(response, reverse('admin:main_food_changelist'))
+        self.assertTrue(models.Food.objects.filter(
+            name="پیتزا", branch=self.branch, search_vector__isnull=False
+        ).exists())
+
+    def test_scoped_manager_cannot_import_other_branch(self):
+        response = self.upload(
+            "name,price,branch\nپیتزا,12000,{0}\n".format(self.branches[1].pk)
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['errors']), 1)
+        self.assertFalse(models.Food.objects.filter(name="پیتزا").exists())
+
+    def test_rows_without_branch_use_the_selected_ones(self):
+        foods = menu_import.import_foods(
+            menu_import.read_csv(io.BytesIO(
+                "name,price\nسالاد,3000\nدوغ,1000\n".encode('utf-8')
+            )),
+            [branch.pk for branch in self.branches]
+        )
+
+        self.assertEqual(len(foods), 4)
+
+    def test_all_errors_are_reported_and_nothing_is_imported(self):
+        rows = menu_import.read_csv(io.BytesIO(
+            "name,price,branch\n,100,{0}\nسالاد,-5,{0}\nدوغ,1000,x\n".format(
+                self.branch.pk
+            ).encode('utf-8')
+        ))
+
+        with self.assertRaises(ValidationError) as context:
+            menu_import.import_foods(rows)
+
+        self.assertEqual(len(context.exception.messages), 3)
+        self.assertEqual(models.Food.objects.count(), len(self.foods))
+
+    def test_short_and_long_rows_are_line_errors(self):
+        rows = menu_import.read_csv(io.BytesIO(
+            "name,price,branch\nسالاد\nدوغ,1000,{0},اضافه\n".format(
+                self.branch.pk
+            ).encode('utf-8')
+        ))
+
+        with self.assertRaises(ValidationError) as context:
+            menu_import.import_foods(rows)
+
+        self.assertEqual(
+            [message.split(':')[0] for message in context.exception.messages],
+            ["سطر 2", "سطر 3"]
+        )
+
+    def test_file_that_is_not_utf8(self):
+        response = self.upload_bytes(
+            "name,price,branch\nسالاد,3000,{0}\n".format(
+                self.branch.pk
+            ).encode('cp1256')
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['errors']), 1)
+
+    def test_xlsx_without_openpyxl_is_refused_by_the_form(self):
+        with mock.patch.object(menu_import, 'XLSX', False):
+            response = self.upload_bytes(b'PK', name="menu.xlsx")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('file', response.context['form'].errors)
+        self.assertFalse(models.Food.objects.filter(
+            branch=self.branch
+        ).exclude(pk__in=[food.pk for food in self.foods]).exists())
+
+
+class KeysetPaginationTests(WorldMixin, TestCase):
+
+    orders_count = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start = timezone.now() - datetime.timedelta(days=cls.orders_count)
+        orders = []
+        for day in range(cls.orders_count):
+            placed = start + datetime.timedelta(days=day)
+            orders.append(models.Order(
+                datetime=placed, order_date=jalali.local_date(placed),
+                title=1, customer=cls.customer, branch=cls.branch
+            ))
+        cls.orders = models.Order.objects.bulk_create(orders)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+        self.model_admin = admin.site._registry[models.Order]
+        self.model_admin.list_per_page = 2
+        self.url = reverse('admin:main_order_changelist')
+
+    def tearDown(self):
+        del self.model_admin.list_per_page
+
+    def shown(self, response):
+        return [order.pk for order in response.context['cl'].result_list]
+
+    def test_numbered_pages_are_the_first_and_the_last(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.context['cl'].keyset_page_range,
+            [0, 1, 2, 3, 4, '.', 10, 11, 12, 13, 14]
+        )
+
+        last = self.client.get(self.url, {'p': 14})
+        self.assertEqual(
+            self.shown(last), [self.orders[1].pk, self.orders[0].pk]
+        )
+
+        middle = self.client.get(self.url, {'p': 7})
+        self.assertEqual(middle.status_code, 302)
+
+    def test_cursors_walk_every_row_without_offset(self):
+        seen = []
+        response = self.client.get(self.url)
+        while True:
+            seen += self.shown(response)
+            next_cursor = response.context['cl'].next_cursor
+            if not next_cursor:
+                break
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(self.url + next_cursor)
+            self.assertFalse(any(
+                'OFFSET' in query['sql'] for query in context.captured_queries
+            ))
+
+        self.assertEqual(
+            seen, [order.pk for order in reversed(self.orders)]
+        )
+
+
+class ScopingTests(WorldMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start = timezone.now() - datetime.timedelta(days=10)
+        orders = []
+        for number, branch in enumerate(cls.branches):
+            for day in range(5):
+                # a customer orders once a day
+                placed = start + datetime.timedelta(days=number * 5 + day)
+                orders.append(models.Order(
+                    datetime=placed, order_date=jalali.local_date(placed),
+                    title=1, customer=cls.customer, branch=branch
+                ))
+        models.Order.objects.bulk_create(orders)
+        cls.start = start
+
+    def branch_ids(self, user):
+        return set(scoping.scope(
+            models.Order.objects.all(), user
+        ).values_list('branch_id', flat=True))
+
+    def test_every_user_sees_own_branches(self):
+        branch_ids = {branch.pk for branch in self.branches}
+
+        self.assertEqual(self.branch_ids(self.admin_user), branch_ids)
+        self.assertEqual(self.branch_ids(self.manager), branch_ids)
+        self.assertEqual(
+            self.branch_ids(self.branch.branchManager), {self.branch.pk}
+        )
+        self.assertEqual(
+            self.branch_ids(self.branch.branchCashier), {self.branch.pk}
+        )
+        self.assertEqual(self.branch_ids(self.customer_user), set())
+
+    def test_staff_cannot_read_another_branch(self):
+        self.client.force_login(self.branch.branchCashier)
+
+        response = self.client.get(reverse(
+            'branch_orders', args=[self.branches[1].pk]
+        ))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_since_returns_the_oldest_orders_first(self):
+        self.client.force_login(self.branch.branchManager)
+        url = reverse('branch_orders', args=[self.branch.pk])
+        expected = list(models.Order.objects.filter(
+            branch=self.branch
+        ).order_by('datetime', 'pk').values_list('pk', flat=True))
+
+        response = self.client.get(url, {
+            'since': self.start.isoformat(), 'limit': 2
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [order['id'] for order in response.json()['orders']],
+            expected[:2]
+        )
+
+        response = self.client.get(url)
+        self.assertEqual(
+            [order['id'] for order in response.json()['orders']],
+            expected[::-1]
+        )
+
+
+class DateBucketTests(WorldMixin, TestCase):
+
+    def assertBucketsRebuilt(self, model):
+        def stored():
+            return sorted(models.DateBucket.objects.filter(
+                model=buckets.label_of(model), count__gt=0
+            ).values_list('field', 'day', 'count'))
+
+        before = stored()
+        buckets.rebuild(model)
+        self.assertEqual(before, stored())
+
+    def test_orders_are_moved_between_days(self):
+        order = models.Order.objects.create(
+            title=1, customer=self.customer, branch=self.branch
+        )
+        self.assertBucketsRebuilt(models.Order)
+
+        order = models.Order.objects.get(pk=order.pk)
+        order.datetime = timezone.now() - datetime.timedelta(days=3)
+        order.save()
+        self.assertBucketsRebuilt(models.Order)
+
+        order.delete()
+        self.assertBucketsRebuilt(models.Order)
+
+    def test_login_writes_no_bucket_and_keeps_the_cached_user(self):
+        user = models.User.objects.get(pk=self.customer_user.pk)
+        user.last_login = timezone.now() - datetime.timedelta(days=3)
+
+        with mock.patch.object(accounts, 'invalidate_users') as invalidate:
+            with CaptureQueriesContext(connection) as context:
+                user.save(update_fields=['last_login'])
+
+        self.assertEqual(len(context.captured_queries), 1)
+        invalidate.assert_not_called()
+
+    def test_login_moves_the_last_login_bucket(self):
+        user = models.User.objects.get(pk=self.customer_user.pk)
+        user.last_login = timezone.now() - datetime.timedelta(days=3)
+        user.save(update_fields=['last_login'])
+        buckets.rebuild(models.User)
+
+        self.client.force_login(user)
+
+        self.assertBucketsRebuilt(models.User)
+        self.assertTrue(models.DateBucket.objects.filter(
+            model=buckets.label_of(models.User), field='last_login',
+            day=jalali.local_date(timezone.now()), count__gt=0
+        ).exists())
+
+    def test_stale_lazy_bucket_is_not_negative(self):
+        user = models.User.objects.get(pk=self.customer_user.pk)
+        user.last_login = timezone.now() - datetime.timedelta(days=3)
+        user.save(update_fields=['last_login'])
+
+        models.User.objects.get(pk=user.pk).delete()
+        self.assertFalse(
+            models.DateBucket.objects.filter(count__lt=0).exists()
+        )
+
+
+class LoginTests(WorldMixin, TestCase):
+
+    def setUp(self):
+        self.user = models.User.objects.get(pk=self.customer_user.pk)
+        self.user.last_login = timezone.now() - datetime.timedelta(days=3)
+        self.user.save(update_fields=['last_login'])
+        buckets.rebuild(models.User)
+
+    def stored(self):
+        return models.User.objects.values_list(
+            'last_login', flat=True
+        ).get(pk=self.user.pk)
+
+    def test_newer_last_login_is_never_overwritten(self):
+        now = timezone.now()
+        self.assertEqual(len(logins.write([(self.user.pk, now)])), 1)
+
+        older = now - datetime.timedelta(hours=1)
+        self.assertEqual(logins.write([(self.user.pk, older)]), [])
+        self.assertEqual(jalali.as_gregorian(self.stored()), now)
+
+    def test_flush_writes_the_buffer_and_moves_the_buckets(self):
+        with mock.patch.object(logins, 'schedule'):
+            logins.record_login(None, self.user)
+            self.assertEqual(list(logins._buffer), [self.user.pk])
+            self.assertEqual(logins.flush(), 1)
+
+            # a login within the granularity is not buffered
+            logins.record_login(None, self.user)
+            self.assertEqual(logins._buffer, {})
+
+        self.assertEqual(
+            jalali.local_date(self.stored()), jalali.local_date(timezone.now())
+        )
+        before = list(models.DateBucket.objects.filter(
+            field='last_login', count__gt=0
+        ).values_list('day', 'count').order_by('day'))
+        buckets.rebuild(models.User)
+        self.assertEqual(before, list(models.DateBucket.objects.filter(
+            field='last_login', count__gt=0
+        ).values_list('day', 'count').order_by('day')))
+
+
+class TableAdminTests(WorldMixin, TestCase):
+
+    def test_state_actions_invalidate_the_tables_api(self):
+        self.client.force_login(self.admin_user)
+
+        with mock.patch.object(api, 'invalidate_tables') as invalidate:
+            response = self.client.post(
+                reverse('admin:main_table_changelist'), {
+                    'action': 'changeStateToReserved',
+                    '_selected_action': [table.pk for table in self.tables],
+                }
+            )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            models.Table.objects.filter(state=2).count(), len(self.tables)
+        )
+        self.assertEqual(
+            {call.args[0] for call in invalidate.call_args_list},
+            {branch.pk for branch in self.branches}
+        )
+
+
+class UserAdminTests(WorldMixin, TestCase):
+
+    def deactivate(self, url, pk):
+        active = []
+
+        def invalidate(user_ids):
+            active.extend(models.User.objects.filter(
+                pk__in=user_ids
+            ).values_list('is_active', flat=True))
+
+        self.client.force_login(self.admin_user)
+        with mock.patch.object(accounts, 'invalidate_users', invalidate):
+            response = self.client.post(url, {
+                'action': 'deactivate', '_selected_action': [pk],
+            })
+
+        self.assertEqual(response.status_code, 302)
+        return active
+
+    def test_users_are_invalidated_after_the_update(self):
+        active = self.deactivate(
+            reverse('admin:main_user_changelist'), self.manager.pk
+        )
+        self.assertEqual(active, [False])
+
+    def test_customers_are_invalidated_after_the_update(self):
+        active = self.deactivate(
+            reverse('admin:main_customer_changelist'), self.customer.pk
+        )
+        self.assertEqual(active, [False])
+
+
+class OrderingTests(WorldMixin, TestCase):
+
+    def place(self, key, foods=None, **extra):
+        self.client.force_login(self.customer_user)
+        return self.client.post(
+            reverse('place_order'),
+            json.dumps(dict({
+                'branch': self.branch.pk,
+                'foods': [food.pk for food in (foods or self.foods[:2])],
+                'type': 1,
+            }, **extra)),
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_returns_the_same_order(self):
+        first = self.place('a')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.json()['total_price'], 3000)
+
+        retry = self.place('a')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(models.Order.objects.count(), 1)
+
+    def test_key_of_another_basket(self):
+        self.place('a')
+        response = self.place('a', foods=self.foods[:1])
+        self.assertEqual(response.status_code, 409)
+
+    def test_key_of_a_deleted_order(self):
+        order_id = self.place('a').json()['id']
+        models.Order.objects.get(pk=order_id).delete()
+
+        response = self.place('a')
+        self.assertEqual(response.status_code, 409)
+
+    def test_one_order_a_day(self):
+        self.place('a')
+        response = self.place('b')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(models.Order.objects.count(), 1)
+
+    def test_food_of_another_branch(self):
+        response = self.place('a', foods=[self.foods[-1]])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.IdempotencyKey.objects.exists())
+
+
+class OrderingCommitTests(WorldMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.create_world()
+
+    def test_user_without_customer(self):
+        user = models.User.objects.create_user("nobody", 1, "pw")
+
+        with self.assertRaises(ValidationError) as context:
+            ordering.place_order(
+                user.pk, 'a', self.branch.pk, [self.foods[0].pk], 1
+            )
+
+        self.assertEqual(context.exception.code, "مشتری نامعتبر")
+        self.assertFalse(models.Order.objects.exists())
+
+
+class RouterTests(WorldMixin, TestCase):
+
+    def setUp(self):
+        self.tokens = [routers.pinned.set(False), routers.wrote.set(False)]
+
+    def tearDown(self):
+        routers.pinned.reset(self.tokens[0])
+        routers.wrote.reset(self.tokens[1])
+
+    def test_reads_for_update_do_not_pin(self):
+        models.Food.objects.get_or_create(
+            pk=self.foods[0].pk, defaults={'branch': self.branch}
+        )
+        list(models.Table.objects.select_for_update().filter(
+            branch=self.branch
+        ))
+        self.assertFalse(routers.wrote.get())
+        self.assertFalse(routers.pinned.get())
+
+    def test_writes_pin(self):
+        self.foods[0].save()
+        self.assertTrue(routers.wrote.get())
+        self.assertTrue(routers.pinned.get())
+
+    def test_cache_fills_read_the_primary(self):
+        with routers.primary():
+            self.assertTrue(routers.pinned.get())
+        self.assertFalse(routers.pinned.get())
+
+    def test_cached_users_are_read_from_the_primary(self):
+        pinned = []
+
+        def resolve_scope(user):
+            pinned.append(routers.pinned.get())
+
+        cache.clear()
+        with mock.patch.object(accounts, 'resolve_scope', resolve_scope):
+            accounts.get_user(self.manager.pk)
+
+        self.assertEqual(pinned, [True])
+        self.assertFalse(routers.pinned.get())
+
+
+class PoolingTests(TransactionTestCase):
+
+    def setUp(self):
+        connection.ensure_connection()
+        connection.last_checkout = None
+        pooling.reset()
+
+    def tearDown(self):
+        pooling.reset()
+
+    def test_open_connection_is_probed_and_reused(self):
+        pooling.checkout()
+        pooling.checkout()
+
+        self.assertEqual(pooling.stats()['reused'], 2)
+        self.assertIsNotNone(connection.connection)
+
+    def test_obsolete_connection_is_closed(self):
+        connection.close_at = 0
+
+        pooling.checkout()
+
+        self.assertEqual(pooling.stats()['expired'], 1)
+        self.assertIsNone(connection.connection)
+
+    def test_broken_connection_is_closed(self):
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            pooling.checkout()
+
+        self.assertEqual(pooling.stats()['broken'], 1)
+        self.assertIsNone(connection.connection)
+
+    def test_opened_and_failed_connections(self):
+        connection.close()
+        connection.ensure_connection()
+        connection.close()
+
+        with mock.patch.object(
+            base.DatabaseWrapper, 'get_new_connection',
+            side_effect=OperationalError
+        ), self.assertRaises(OperationalError):
+            connection.ensure_connection()
+
+        self.assertEqual(pooling.stats()['opened'], 1)
+        self.assertEqual(pooling.stats()['failed'], 1)
+
+
+class AppReadyTests(SimpleTestCase):
+
+    # a simple test case fails on any query,
+    # the tests run with the local memory cache
+    @override_settings(DEBUG=True)
+    def test_ready_does_not_query_the_database(self):
+        apps.get_app_config('main').ready()
+
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tokens = [routers.pinned.set(False), routers.wrote.set(False)]
+        databases = mock.patch.dict(connections.databases, {
+            routers.REPLICA: dict(
+                connections.databases['default'], TEST={'MIRROR': 'default'}
+            ),
+        })
+        databases.start()
+        self.addCleanup(databases.stop)
+
+    def tearDown(self):
+        routers.pinned.reset(self.tokens[0])
+        routers.wrote.reset(self.tokens[1])
+
+    def write(self, sql):
+        routers.mark_writes(lambda *args: None, sql, [], False, {})
+
+    def test_replica_models_are_read_from_the_replica(self):
+        self.assertEqual(models.Food.objects.all().db, routers.REPLICA)
+        self.assertEqual(models.Branch.objects.all().db, routers.REPLICA)
+        self.assertEqual(models.Order.objects.all().db, 'default')
+        self.assertEqual(
+            routers.for_reports(models.Order.objects.all()).db, routers.REPLICA
+        )
+
+    def test_writes_pin_the_primary(self):
+        self.write('SELECT 1')
+        self.assertEqual(models.Food.objects.all().db, routers.REPLICA)
+
+        self.write('UPDATE "main_food" SET "price" = 1000')
+        self.assertTrue(routers.wrote.get())
+        self.assertEqual(models.Food.objects.all().db, 'default')
+
+    def test_primary_block(self):
+        with routers.primary():
+            self.assertEqual(models.Food.objects.all().db, 'default')
+        self.assertEqual(models.Food.objects.all().db, routers.REPLICA)
+
+    def test_writes_go_to_the_primary(self):
+        self.assertEqual(
+            models.Food.objects.select_for_update().db, 'default'
+        )
+        self.assertEqual(
+            routers.PrimaryReplicaRouter().db_for_write(models.Food), 'default'
+        )
+
+
+class IndexAuditTests(TestCase):
+
+    def index(self, name, columns, unique=False, table='main_order'):
+        return index_audit.Index(
+            table, name, unique, False, False, columns,
+            ['int4_ops'] * len(columns), 8192, 0,
+            'CREATE INDEX "{0}" ON "{1}"'.format(name, table)
+        )
+
+    def test_one_of_two_same_indexes_is_kept(self):
+        first = self.index('a_idx', ['branch_id'])
+        second = self.index('b_idx', ['branch_id'])
+
+        self.assertEqual(
+            index_audit.redundant_indexes([first, second]), [(second, first)]
+        )
+
+    def test_the_cover_is_never_dropped(self):
+        wide = self.index('c_idx', ['branch_id', 'datetime'])
+        first = self.index('a_idx', ['branch_id'])
+        second = self.index('b_idx', ['branch_id'])
+
+        redundant = index_audit.redundant_indexes([first, second, wide])
+
+        self.assertEqual(redundant, [(first, wide), (second, wide)])
+
+    def test_model_indexes_are_left_to_the_models(self):
+        meta_index = models.Order._meta.indexes[0]
+        managed = self.index(meta_index.name, ['branch_id'])
+        unmanaged = self.index('main_order_branch_audit_idx', ['branch_id'])
+        cover = self.index('main_order_cover_idx', ['branch_id', 'datetime'])
+        report = {
+            'redundant': index_audit.redundant_indexes(
+                [managed, unmanaged, cover]
+            ),
+            'unused': [], 'suggested': {},
+            'model_changes': index_audit.model_changes([managed, unmanaged]),
+        }
+
+        source = index_audit.migration(report)
+
+        self.assertIn("remove {0}".format(meta_index.name), report[
+            'model_changes'
+        ][meta_index.name])
+        self.assertNotIn(meta_index.name, source)
+        self.assertIn('DROP INDEX IF EXISTS "main_order_branch_audit_idx"', source)
+
+
+class ChangelistBudgetTests(QueryBudgetTestMixin, WorldMixin, TestCase):
+
+    branches_count = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number, branch in enumerate(cls.branches):
+            placed = timezone.now() - datetime.timedelta(days=number + 1)
+            order = models.Order.objects.create(
+                datetime=placed, order_date=jalali.local_date(placed),
+                title=1, customer=cls.customer, branch=branch
+            )
+            order.foods.set(
+                [food for food in cls.foods if food.branch_id == branch.pk]
+            )
+            models.Rate.objects.create(
+                title="نظر", text="متن", customer=cls.customer,
+                branch=branch, score=number % 5 + 1
+            )
+            reservations.book(
+                cls.tables[number], local(12, number + 1),
+                local(14, number + 1), 2
+            )
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin_user)
+        self.assertAllChangelistsWithinBudget()
+
+    def test_scoped_changelists(self):
+        for user in (self.manager, self.branch.branchManager,
+                     self.branch.branchCashier):
+            self.client.force_login(user)
+            for model in admin.site._registry:
+                if not user.has_perm('{0}.view_{1}'.format(
+                    model._meta.app_label, model._meta.model_name
+                )):
+                    continue
+                with self.subTest(user=user.username, model=model.__name__):
+                    self.assertChangelistWithinBudget(model)
+
+
+class ApiBudgetTests(
+    QueryBudgetTestMixin, AsyncPoolTestMixin, WorldMixin, TransactionTestCase
+):
+
+    branches_count = 4
+
+    def setUp(self):
+        super().setUp()
+        self.create_world()
+        # the budgets are of the requests that fill the caches
+        cache.clear()
+        menu.local_menus.clear()
+
+    def assertPathWithinBudget(self, budget, name, query=None, **kwargs):
+        with self.assertPoolQueryBudget(budget) as context:
+            response = self.client.get(reverse(name, kwargs=kwargs), query)
+
+        self.assertEqual(response.status_code, 200)
+        return context
+
+    def test_lists_and_details(self):
+        branch_id = self.branch.pk
+        for budget, name, kwargs in (
+            (1, 'branch_list', {}),
+            (1, 'branch_detail', {'branch_id': branch_id}),
+            (3, 'branch_overview', {'branch_id': branch_id}),
+            (2, 'branch_menu', {'branch_id': branch_id}),
+            (2, 'branch_tables', {'branch_id': branch_id}),
+            (2, 'collection_list', {}),
+            (2, 'collection_detail', {
+                'collection_id': self.collection.pk
+            }),
+        ):
+            with self.subTest(name=name):
+                self.assertPathWithinBudget(budget, name, **kwargs)
+
+    def test_search_and_free_tables(self):
+        self.assertPathWithinBudget(3, 'catalog_search', {'q': 'غذا'})
+        self.assertPathWithinBudget(3, 'free_tables', {
+            'start': local(12).isoformat(), 'end': local(14).isoformat(),
+        }, branch_id=self.branch.pk)
+
+    def test_branch_orders(self):
+        self.client.force_login(self.branch.branchManager)
+        self.assertPathWithinBudget(
+            3, 'branch_orders', branch_id=self.branch.pk
+        )
+
+
+class GenerateDataTests(TestCase):
+
+    def generate(self, **options):
+        options = dict({
+            'seed': 7, 'customers': 20, 'collections': 2, 'branches': 2,
+            'foods': 3, 'tables': 2, 'orders': 30, 'rates': 10, 'days': 5,
+            'chunk_size': 7,
+        }, **options)
+        call_command('generate_data', stdout=io.StringIO(), **options)
+
+    def test_dataset_and_its_rollups(self):
+        self.generate()
+
+        self.assertEqual(models.Order.objects.count(), 30)
+        self.assertEqual(models.Rate.objects.count(), 10)
+        self.assertEqual(models.Branch.objects.count(), 4)
+        self.assertEqual(
+            sum(models.DailySales.objects.values_list('orders', flat=True)),
+            30
+        )
+        self.assertFalse(models.Order.objects.exclude(
+            total_price=0
+        ).exclude(foods__isnull=False).exists())
+
+    def test_sequence_is_moved_after_the_copied_orders(self):
+        self.generate()
+        last = models.Order.objects.order_by('-pk').first()
+
+        # the generated orders end yesterday
+        order = models.Order.objects.create(
+            title=1, customer=last.customer, branch=last.branch
+        )
+
+        self.assertGreater(order.pk, last.pk)
+
+    def test_invalid_options(self):
+        with self.assertRaises(CommandError):
+            self.generate(orders=200)
+
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
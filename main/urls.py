@@ -15,7 +15,44 @@ Including another URLconf
 """
 from django.urls import path
 from django.urls.resolvers import URLPattern
+from . import views
 
 urlpatterns = [
-    
+    path(
+        'branches/<int:branch_id>/free-tables/',
+        views.free_tables, name='free_tables'
+    ),
+    path(
+        'branches/<int:branch_id>/menu/',
+        views.branch_menu, name='branch_menu'
+    ),
+    path('search/', views.catalog_search, name='catalog_search'),
+    path('orders/', views.place_order, name='place_order'),
+    path('stats/database/', views.database_stats, name='database_stats'),
+    path(
+        'collections/',
+        views.collection_list, name='collection_list'
+    ),
+    path(
+        'collections/<int:collection_id>/',
+        views.collection_detail, name='collection_detail'
+    ),
+    path('branches/', views.branch_list, name='branch_list'),
+    path(
+        'branches/<int:branch_id>/',
+        views.branch_detail, name='branch_detail'
+    ),
+    path(
+        'branches/<int:branch_id>/overview/',
+        views.branch_overview, name='branch_overview'
+    ),
+    path(
+        'branches/<int:branch_id>/tables/',
+        views.branch_tables, name='branch_tables'
+    ),
+    path(
+        'branches/<int:branch_id>/orders/',
+        views.branch_orders, name='branch_orders'
+    ),
 ]
+
@@ -1,3 +1,272 @@
-from django.shortcuts import render
+import asyncio
+import json
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET, require_POST
+from . import (
+    aio, api, availability, jalali, menu, models, ordering, pooling,
+    ratings, scoping, search
+)
+from .cache import get_version
 
 # Create your views here.
+
+# The customer browse views are async, their database and cache work
+# runs in the pool of the aio madule while the event loop
+# keeps serving the other slow clients under ASGI
+
+# Search the free tables of a branch
+# the start and end are ISO formatted datetimes
+# and party is the number of people
+
+
+@aio.require_GET
+async def free_tables(request, branch_id):
+    try:
+        party_size = int(request.GET.get('party', 1))
+        start = parse_datetime(request.GET['start'])
+        end = parse_datetime(request.GET['end'])
+    except (KeyError, ValueError):
+        start = end = None
+
+    # the datetimes without an offset are in the local time zone
+    if start is not None and end is not None:
+        start, end = jalali.as_gregorian(start), jalali.as_gregorian(end)
+
+    if start is None or end is None or end <= start or party_size < 1:
+        return JsonResponse(
+            {'error': "بازه زمانی یا تعداد نفرات نادرست است"}, status=400
+        )
+
+    def search():
+        branch = get_object_or_404(models.Branch, pk=branch_id)
+        return availability.free_tables(branch, party_size, start, end)
+
+    tables = await aio.run(search)
+    return JsonResponse({'branch': branch_id, 'tables': tables})
+
+# Return the cached menu of a branch
+# its ETag is made from the menu version of the branch
+
+
+@aio.require_GET
+async def branch_menu(request, branch_id):
+    def build():
+        foods = menu.get_menu(branch_id)
+        return None if foods is None else {'branch': branch_id, 'foods': foods}
+
+    def respond():
+        return api.versioned_response(
+            request, (get_version('menu', branch_id),), build
+        )
+
+    return await aio.run(respond)
+
+# Return a branch with its contacts, location, menu and rating
+# the independent lookups run concurrently in the pool
+
+
+@aio.require_GET
+async def branch_overview(request, branch_id):
+    branch, foods, rating = await asyncio.gather(
+        aio.run(api.branches.get, {}, branch_id),
+        aio.run(menu.get_menu, branch_id),
+        aio.run(ratings.summary, branch_id),
+    )
+
+    if branch is None:
+        return JsonResponse({'error': "شعبه یافت نشد"}, status=404)
+
+    return JsonResponse({'branch': branch, 'foods': foods, 'rating': rating})
+
+# Return the food collections and their branches
+# the lists are seeked by the 'after' primary key
+# and 'fields' selects the returned fields
+
+
+@require_GET
+def collection_list(request):
+    return api.versioned_response(
+        request, api.list_versions('collections'),
+        lambda: api.collections.page(request.GET)
+    )
+
+
+@require_GET
+def collection_detail(request, collection_id):
+    return api.versioned_response(
+        request, api.list_versions('collections'),
+        lambda: api.collections.get(request.GET, collection_id)
+    )
+
+# Return the branches with their contacts and locations
+# the list can be filtered by the food collection
+
+
+@aio.require_GET
+async def branch_list(request):
+    def build():
+        filters = {}
+        if request.GET.get('collection'):
+            try:
+                filters['foodCollection'] = int(request.GET['collection'])
+            except ValueError:
+                raise ValidationError(
+                    "مجموعه غذایی نادرست است", code="مجموعه نامعتبر"
+                )
+        return api.branches.page(request.GET, **filters)
+
+    def respond():
+        return api.versioned_response(
+            request, api.list_versions('branches'), build
+        )
+
+    return await aio.run(respond)
+
+
+@require_GET
+def branch_detail(request, branch_id):
+    return api.versioned_response(
+        request, api.branch_versions(branch_id),
+        lambda: api.branches.get(request.GET, branch_id)
+    )
+
+# Return the tables of a branch and their capacity
+
+
+@require_GET
+def branch_tables(request, branch_id):
+    def build():
+        if not models.Branch.objects.filter(pk=branch_id).exists():
+            return None
+        return api.tables.page(request.GET, branch=branch_id)
+
+    return api.versioned_response(
+        request, api.branch_versions(branch_id), build
+    )
+
+# Search the food collections, branches and foods
+# q is the searched text and limit is the number of results of every kind
+
+
+@require_GET
+def catalog_search(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    return JsonResponse(search.search(request.GET.get('q', ''), limit))
+
+
+# Place the order of the basket of the logged in customer
+# the body is {"branch", "foods", "type", "table"} and the
+# Idempotency-Key header makes the retries return the same order
+
+
+@require_POST
+def place_order(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "ابتدا وارد شوید"}, status=401)
+
+    if request.user.user_type != 1:
+        return JsonResponse(
+            {'error': "فقط مشتریان می توانند سفارش ثبت کنند"}, status=403
+        )
+
+    key = request.META.get('HTTP_IDEMPOTENCY_KEY', '').strip()
+    if not key or len(key) > 100:
+        return JsonResponse(
+            {'error': "سرآیند Idempotency-Key الزامی است"}, status=400
+        )
+
+    try:
+        body = json.loads(request.body)
+        branch_id = int(body['branch'])
+        food_ids = [int(food_id) for food_id in body['foods']]
+        order_type = int(body['type'])
+        table_id = None if body.get('table') is None else int(body['table'])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': "بدنه درخواست نادرست است"}, status=400)
+
+    try:
+        order, created = ordering.place_order(
+            request.user.pk, key, branch_id, food_ids, order_type, table_id
+        )
+    except ValidationError as e:
+        status = 409 if e.code in (
+            ordering.KEY_CONFLICT, ordering.ORDER_DELETED
+        ) else 400
+        return JsonResponse({'error': " ".join(e.messages)}, status=status)
+
+    return JsonResponse(
+        ordering.serialize_order(order, food_ids if created else None),
+        status=201 if created else 200
+    )
+
+# Return the latest orders of a branch for its staff
+# since is an ISO formatted datetime and the orders are read
+# from the range of the branch in its composite index,
+# with since the oldest orders after it come first
+# so the next request may continue from the last one
+
+
+@require_GET
+def branch_orders(request, branch_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "ابتدا وارد شوید"}, status=401)
+
+    if not scoping.can_access_branch(request.user, branch_id):
+        return JsonResponse(
+            {'error': "دسترسی به این شعبه مجاز نیست"}, status=403
+        )
+
+    try:
+        limit = min(
+            max(int(request.GET.get('limit', api.PAGE_SIZE)), 1),
+            api.MAX_PAGE_SIZE
+        )
+    except ValueError:
+        limit = api.PAGE_SIZE
+
+    orders = scoping.scope(models.Order.objects.all(), request.user).filter(
+        branch=branch_id
+    )
+
+    if request.GET.get('since'):
+        since = parse_datetime(request.GET['since'])
+        if since is None:
+            return JsonResponse({'error': "زمان نادرست است"}, status=400)
+        since = timezone.localtime(jalali.as_gregorian(since))
+        orders = orders.filter(datetime__gte=since).order_by('datetime', 'pk')
+    else:
+        orders = orders.order_by('-datetime', '-pk')
+
+    orders = list(orders[:limit])
+
+    foods = {}
+    for order_id, food_id in models.Order.foods.through.objects.filter(
+        order_id__in=[order.pk for order in orders]
+    ).values_list('order_id', 'food_id'):
+        foods.setdefault(order_id, []).append(food_id)
+
+    return JsonResponse({
+        'branch': branch_id,
+        'orders': [
+            ordering.serialize_order(order, foods.get(order.pk, []))
+            for order in orders
+        ],
+    })
+
+# Return the database connection counters of this worker process
+# for the staff that watch the connection reuse
+
+
+@staff_member_required
+@require_GET
+def database_stats(request):
+    return JsonResponse(pooling.stats())